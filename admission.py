@@ -0,0 +1,220 @@
+"""
+Контроль допуска (admission control) для дорогих маршрутов.
+
+Маршруты разбиты на классы (auth — bcrypt, heavy — выборки администратора по всем
+пользователям). Для каждого класса действуют:
+- лимит одновременных запросов с ограниченной очередью ожидания (503 при переполнении);
+- token bucket на весь класс и, для auth, на каждый IP-адрес (429).
+Отклоненные запросы получают заголовок Retry-After и не ждут без ограничения.
+"""
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from dotenv import load_dotenv
+from fastapi import Depends, HTTPException, Request, status
+
+from dependencies import get_current_user
+from models import User, UserRole
+
+load_dotenv()
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() in ("1", "true", "yes")
+# Учитывать X-Forwarded-For (только за доверенным прокси)
+TRUST_FORWARDED_FOR = os.getenv("TRUST_FORWARDED_FOR", "false").lower() in ("1", "true", "yes")
+# Сколько IP-адресов хранить в таблице per-IP лимитов
+MAX_TRACKED_IPS = int(os.getenv("ADMISSION_MAX_TRACKED_IPS", "10000"))
+
+
+def _env_float(route_class: str, name: str, default: float) -> float:
+    return float(os.getenv(f"ADMISSION_{route_class.upper()}_{name}", str(default)))
+
+
+class TokenBucket:
+    """Token bucket: rate токенов в секунду, не более burst накопленных."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def try_acquire(self) -> float:
+        """Забирает токен. Возвращает 0, если успешно, иначе секунды до появления токена."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class RouteClassLimiter:
+    """Лимиты одного класса маршрутов и счетчики допуска."""
+
+    def __init__(
+        self,
+        name: str,
+        concurrency: int,
+        max_queue: int,
+        queue_timeout: float,
+        rate: float = 0,
+        burst: float = 0,
+        per_ip_rate: float = 0,
+        per_ip_burst: float = 0,
+    ):
+        self.name = name
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.per_ip_rate = per_ip_rate
+        self.per_ip_burst = per_ip_burst
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._bucket = TokenBucket(rate, burst) if rate > 0 else None
+        self._ip_buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.queued = 0
+        self.rejected_rate = 0
+        self.rejected_overload = 0
+
+    def _ip_bucket(self, ip: str) -> TokenBucket:
+        bucket = self._ip_buckets.get(ip)
+        if bucket is None:
+            bucket = TokenBucket(self.per_ip_rate, self.per_ip_burst)
+            self._ip_buckets[ip] = bucket
+            if len(self._ip_buckets) > MAX_TRACKED_IPS:
+                self._ip_buckets.popitem(last=False)
+        else:
+            self._ip_buckets.move_to_end(ip)
+        return bucket
+
+    def _reject(self, status_code: int, retry_after: float, detail: str) -> HTTPException:
+        return HTTPException(
+            status_code=status_code,
+            detail=detail,
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+
+    async def acquire(self, ip: Optional[str]) -> None:
+        # Сначала лимиты частоты: они дешевые и не занимают слот
+        if self.per_ip_rate > 0 and ip:
+            wait = self._ip_bucket(ip).try_acquire()
+            if wait:
+                self.rejected_rate += 1
+                raise self._reject(status.HTTP_429_TOO_MANY_REQUESTS, wait, "Слишком много запросов, повторите позже")
+        if self._bucket is not None:
+            wait = self._bucket.try_acquire()
+            if wait:
+                self.rejected_rate += 1
+                raise self._reject(status.HTTP_429_TOO_MANY_REQUESTS, wait, "Слишком много запросов, повторите позже")
+
+        if self._semaphore.locked():
+            if self.waiting >= self.max_queue:
+                self.rejected_overload += 1
+                raise self._reject(status.HTTP_503_SERVICE_UNAVAILABLE, self.queue_timeout, "Сервис перегружен, повторите позже")
+            self.waiting += 1
+            self.queued += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.rejected_overload += 1
+                raise self._reject(status.HTTP_503_SERVICE_UNAVAILABLE, self.queue_timeout, "Сервис перегружен, повторите позже")
+            finally:
+                self.waiting -= 1
+        else:
+            await self._semaphore.acquire()
+
+        self.in_flight += 1
+        self.admitted += 1
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._semaphore.release()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "concurrency": self.concurrency,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected_rate": self.rejected_rate,
+            "rejected_overload": self.rejected_overload,
+        }
+
+
+def _make_limiter(route_class: str, **defaults) -> RouteClassLimiter:
+    return RouteClassLimiter(
+        route_class,
+        concurrency=int(_env_float(route_class, "CONCURRENCY", defaults["concurrency"])),
+        max_queue=int(_env_float(route_class, "QUEUE", defaults["max_queue"])),
+        queue_timeout=_env_float(route_class, "QUEUE_TIMEOUT", defaults["queue_timeout"]),
+        rate=_env_float(route_class, "RATE", defaults.get("rate", 0)),
+        burst=_env_float(route_class, "BURST", defaults.get("burst", 0)),
+        per_ip_rate=_env_float(route_class, "PER_IP_RATE", defaults.get("per_ip_rate", 0)),
+        per_ip_burst=_env_float(route_class, "PER_IP_BURST", defaults.get("per_ip_burst", 0)),
+    )
+
+
+LIMITERS: Dict[str, RouteClassLimiter] = {
+    # login/register: bcrypt, ограничение по IP защищает и от перебора паролей
+    "auth": _make_limiter(
+        "auth", concurrency=4, max_queue=16, queue_timeout=2.0,
+        rate=50, burst=100, per_ip_rate=1, per_ip_burst=5,
+    ),
+    # Выборки администратора по всем пользователям (/stats, GET /tasks/)
+    "heavy": _make_limiter("heavy", concurrency=4, max_queue=8, queue_timeout=5.0),
+}
+
+
+def client_ip(request: Request) -> Optional[str]:
+    if TRUST_FORWARDED_FOR:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else None
+
+
+def admission(route_class: str):
+    """Зависимость FastAPI: допуск запроса по лимитам класса маршрутов."""
+    limiter = LIMITERS[route_class]
+
+    async def dependency(request: Request):
+        if not ADMISSION_ENABLED:
+            yield
+            return
+        await limiter.acquire(client_ip(request))
+        try:
+            yield
+        finally:
+            limiter.release()
+
+    return dependency
+
+
+def admin_scope_admission(route_class: str):
+    """Как admission(), но лимит применяется только к запросам администратора (выборка по всем пользователям)."""
+    limiter = LIMITERS[route_class]
+
+    async def dependency(request: Request, current_user: User = Depends(get_current_user)):
+        if not ADMISSION_ENABLED or current_user.role != UserRole.ADMIN:
+            yield
+            return
+        await limiter.acquire(client_ip(request))
+        try:
+            yield
+        finally:
+            limiter.release()
+
+    return dependency
+
+
+def admission_stats() -> Dict[str, Dict[str, int]]:
+    return {name: limiter.stats() for name, limiter in LIMITERS.items()}
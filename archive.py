@@ -0,0 +1,109 @@
+"""
+Перенос завершенных задач в архив (таблица tasks_archive).
+
+Задачи, завершенные больше ARCHIVE_AFTER_DAYS дней назад, переносятся пачками по
+ARCHIVE_BATCH строк на каждом шарде; каждая пачка — отдельная короткая транзакция,
+между пачками пауза ARCHIVE_PAUSE_SECONDS. В PostgreSQL пачка переносится одним
+запросом (DELETE ... RETURNING в CTE + INSERT ... SELECT), строки, заблокированные
+другими транзакциями, пропускаются (SKIP LOCKED) и переносятся следующим запуском.
+
+Рабочая таблица tasks остается небольшой: выборки незавершенных задач, пересчет
+срочности и статистика не читают старые завершенные задачи. Архив читается только
+по запросу (include_archived в /stats и /tasks/history).
+Задачи в корзине в архив не переносятся: их удаляет очистка корзины (trash.py).
+"""
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import delete, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import Task, TaskArchive
+from sharding import shard_router
+from app_logging import get_logger
+
+load_dotenv()
+log = get_logger(__name__)
+
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "30"))
+ARCHIVE_BATCH = int(os.getenv("ARCHIVE_BATCH", "5000"))
+ARCHIVE_PAUSE_SECONDS = float(os.getenv("ARCHIVE_PAUSE_SECONDS", "0.01"))
+
+# Общие колонки tasks и tasks_archive (archived_at заполняется сервером)
+ARCHIVE_COLUMNS = (
+    "id", "title", "description", "is_important", "is_urgent", "deadline_at",
+    "quadrant", "completed", "created_at", "completed_at", "user_id", "recurrence_id",
+)
+
+
+def _candidates(cutoff: datetime):
+    return (
+        select(Task.id)
+        .where(Task.completed == True, Task.completed_at < cutoff, Task.deleted_at.is_(None))
+        .order_by(Task.completed_at)
+        .limit(ARCHIVE_BATCH)
+    )
+
+
+async def _move_batch(session: AsyncSession, cutoff: datetime) -> int:
+    """Переносит одну пачку и фиксирует ее. Возвращает число перенесенных задач."""
+    if session.bind.dialect.name == "postgresql":
+        ids = _candidates(cutoff).with_for_update(skip_locked=True).scalar_subquery()
+        moved = (
+            delete(Task)
+            .where(Task.id.in_(ids))
+            .returning(*(getattr(Task, name) for name in ARCHIVE_COLUMNS))
+            .cte("moved")
+        )
+        result = await session.execute(
+            insert(TaskArchive).from_select(ARCHIVE_COLUMNS, select(*(moved.c[name] for name in ARCHIVE_COLUMNS)))
+        )
+        count = result.rowcount or 0
+    else:
+        # SQLite: DELETE ... RETURNING в CTE не поддерживается — копируем и удаляем в одной транзакции
+        ids = (await session.execute(_candidates(cutoff))).scalars().all()
+        count = len(ids)
+        if ids:
+            columns = [getattr(Task, name) for name in ARCHIVE_COLUMNS]
+            await session.execute(
+                insert(TaskArchive).from_select(ARCHIVE_COLUMNS, select(*columns).where(Task.id.in_(ids)))
+            )
+            await session.execute(delete(Task).where(Task.id.in_(ids)))
+    await session.commit()
+    return count
+
+
+async def archive_shard(session: AsyncSession, cutoff: datetime) -> int:
+    moved = 0
+    while True:
+        count = await _move_batch(session, cutoff)
+        moved += count
+        if count < ARCHIVE_BATCH:
+            return moved
+        # Даем пройти конкурирующим транзакциям
+        await asyncio.sleep(ARCHIVE_PAUSE_SECONDS)
+
+
+async def archive_completed_tasks(older_than_days: Optional[int] = None) -> Dict[str, Any]:
+    """Переносит в архив задачи, завершенные раньше older_than_days дней назад (на всех шардах)."""
+    days = ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days
+    cutoff = datetime.now(timezone.utc) - timedelta(days=days)
+    started = time.perf_counter()
+    moved = 0
+    for session_maker in shard_router.sessionmakers:
+        async with session_maker() as session:
+            moved += await archive_shard(session, cutoff)
+
+    duration = time.perf_counter() - started
+    report = {
+        "archived": moved,
+        "cutoff": cutoff.isoformat(),
+        "duration_seconds": round(duration, 3),
+    }
+    if moved:
+        log.info("Перенесено в архив задач: %s", moved, extra={"fields": report})
+    return report
@@ -0,0 +1,88 @@
+"""
+Размер и время кодирования ответа со списком задач в разных форматах.
+
+    python benchmarks/bench_formats.py --tasks 10000
+
+Для каждого формата (JSON, MessagePack, Arrow — если установлены) и сжатия (нет,
+gzip, zstd — если установлен) выводится размер тела и время кодирования + сжатия
+относительно JSON без сжатия. Записи — как в ответе GET /tasks/ (TaskResponse).
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import negotiation  # noqa: E402
+
+
+def make_tasks(n: int):
+    random.seed(42)
+    now = datetime.now(timezone.utc)
+    words = ["отчет", "встреча", "звонок", "ревью", "релиз", "план", "счет", "письмо"]
+    tasks = []
+    for i in range(n):
+        deadline = None if random.random() < 0.2 else now + timedelta(seconds=random.randint(-30 * 86400, 30 * 86400))
+        days = None if deadline is None else (deadline.date() - now.date()).days
+        tasks.append({
+            "title": " ".join(random.choices(words, k=3)),
+            "description": None if random.random() < 0.5 else " ".join(random.choices(words, k=12)),
+            "is_important": random.random() < 0.5,
+            "deadline_at": deadline,
+            "id": i + 1,
+            "quadrant": random.choice(["Q1", "Q2", "Q3", "Q4"]),
+            "completed": random.random() < 0.3,
+            "created_at": now - timedelta(seconds=random.randint(0, 90 * 86400)),
+            "days_to_deadline": days,
+            "status_message": None if days is None else ("overdue" if days < 0 else "on time"),
+        })
+    return tasks
+
+
+def measure(fn, repeat: int):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tasks", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    tasks = make_tasks(args.tasks)
+    media_types = negotiation.available_media_types()
+    encodings = [None] + list(reversed(negotiation.available_encodings()))
+    for name, module in (("msgpack", negotiation.msgpack), ("pyarrow", negotiation.pa), ("zstandard", negotiation.zstandard)):
+        if module is None:
+            print(f"{name} не установлен — соответствующий вариант пропущен")
+    # Порог сжатия не должен влиять на сравнение
+    negotiation.COMPRESSION_MIN_BYTES = 0
+
+    rows = []
+    for media_type in media_types:
+        for encoding in encodings:
+            seconds, (body, _) = measure(
+                lambda: negotiation.compress(negotiation.encode(tasks, media_type), encoding), args.repeat
+            )
+            rows.append((media_type.split("/")[-1], encoding or "-", len(body), seconds))
+
+    base_size, base_time = rows[0][2], rows[0][3]
+    print(f"\n{args.tasks} задач, лучшее из {args.repeat}")
+    print(f"{'формат':<28}{'сжатие':<8}{'байт':>12}{'размер':>9}{'время, мс':>12}{'время':>8}")
+    for fmt, encoding, size, seconds in rows:
+        print(
+            f"{fmt:<28}{encoding:<8}{size:>12}{size / base_size:>8.0%}"
+            f"{seconds * 1000:>12.1f}{seconds / base_time:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
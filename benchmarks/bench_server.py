@@ -0,0 +1,114 @@
+"""
+Сравнение пропускной способности: uvicorn по умолчанию против serve.py.
+
+    python benchmarks/bench_server.py --duration 15 --concurrency 64 --path /health
+
+Оба варианта запускаются по очереди как отдельные процессы с текущим окружением
+(.env, DATABASE_URL), нагрузка подается httpx-клиентом с заданным числом
+одновременных запросов. Выводятся запросы в секунду, p50/p99 задержки и ошибки.
+/health выполняет SELECT 1, поэтому в замер входит и пул соединений БД.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVER_STOP_TIMEOUT = 60
+
+CONFIGS = {
+    # Как в README: один процесс, asyncio + h11, access log включен
+    "uvicorn (по умолчанию)": [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", "{port}"],
+    "serve.py": [sys.executable, "serve.py"],
+}
+
+
+async def wait_ready(url: str, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(url)).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.5)
+    raise RuntimeError(f"Сервер не ответил за {timeout} секунд")
+
+
+async def load(url: str, duration: float, concurrency: int) -> dict:
+    latencies = []
+    errors = 0
+    stop_at = time.monotonic() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+        async def user() -> None:
+            nonlocal errors
+            while time.monotonic() < stop_at:
+                started = time.perf_counter()
+                try:
+                    response = await client.get(url)
+                    if response.status_code != 200:
+                        errors += 1
+                        continue
+                except httpx.HTTPError:
+                    errors += 1
+                    continue
+                latencies.append((time.perf_counter() - started) * 1000)
+
+        started = time.monotonic()
+        await asyncio.gather(*(user() for _ in range(concurrency)))
+        elapsed = time.monotonic() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies), 2) if latencies else None,
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1], 2) if latencies else None,
+    }
+
+
+def run_config(command: list, args) -> dict:
+    env = dict(os.environ, PORT=str(args.port), HOST="127.0.0.1", JOB_WORKERS="0")
+    command = [part.format(port=args.port) for part in command]
+    process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        base = f"http://127.0.0.1:{args.port}"
+        asyncio.run(wait_ready(base + "/health"))
+        # Прогрев: соединения пула и кеши
+        asyncio.run(load(base + args.path, 2, args.concurrency))
+        return asyncio.run(load(base + args.path, args.duration, args.concurrency))
+    finally:
+        process.terminate()
+        process.wait(timeout=SERVER_STOP_TIMEOUT)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=15)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--path", default="/health")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    results = {}
+    for name, command in CONFIGS.items():
+        print(f"→ {name}")
+        results[name] = run_config(command, args)
+        print(f"  {results[name]}")
+
+    print(f"\n{'Конфигурация':<26}{'RPS':>10}{'p50, мс':>10}{'p99, мс':>10}{'ошибок':>8}")
+    for name, r in results.items():
+        print(f"{name:<26}{r['rps']:>10}{r['p50_ms']:>10}{r['p99_ms']:>10}{r['errors']:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Поэлементный и пакетный расчет срочности, дней до дедлайна и квадрантов.
+
+    python benchmarks/bench_urgency.py --rows 1000000
+
+Сравниваются: цикл по задачам с calculate_urgency / calculate_days_until_deadline /
+determine_quadrant (каждый вызов берет datetime.now()) и calculate_deadline_fields_batch
+на чистом Python и с NumPy (если установлен).
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import utils  # noqa: E402
+
+
+def make_rows(n: int):
+    random.seed(42)
+    now = datetime.now(timezone.utc)
+    deadlines = [
+        None if random.random() < 0.2 else now + timedelta(seconds=random.randint(-30 * 86400, 30 * 86400))
+        for _ in range(n)
+    ]
+    important = [random.random() < 0.5 for _ in range(n)]
+    return deadlines, important
+
+
+def per_row(deadlines, important):
+    urgency = [utils.calculate_urgency(d) for d in deadlines]
+    days = [utils.calculate_days_until_deadline(d) for d in deadlines]
+    quadrants = [utils.determine_quadrant(i, u) for i, u in zip(important, urgency)]
+    return urgency, days, quadrants
+
+
+def batch(deadlines, important):
+    return utils.calculate_deadline_fields_batch(deadlines, important)
+
+
+def measure(fn, *args, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    deadlines, important = make_rows(args.rows)
+    numpy_module = utils.np
+
+    results = {"поэлементно": measure(per_row, deadlines, important, repeat=args.repeat)}
+    utils.np = None
+    results["пакетно (Python)"] = measure(batch, deadlines, important, repeat=args.repeat)
+    utils.np = numpy_module
+    if numpy_module is not None:
+        results["пакетно (NumPy)"] = measure(batch, deadlines, important, repeat=args.repeat)
+    else:
+        print("NumPy не установлен — вариант с NumPy пропущен")
+
+    # Результаты должны совпадать (опорное время одно, поэтому сравниваем пакетные варианты)
+    now = datetime.now(timezone.utc)
+    assert utils.calculate_urgency_batch(deadlines[:10000], now) == [utils.calculate_urgency(d, now) for d in deadlines[:10000]]
+
+    baseline = results["поэлементно"]
+    print(f"\n{args.rows} строк, лучшее из {args.repeat}")
+    for name, seconds in results.items():
+        print(f"{name:<20}{seconds:>10.3f} с{baseline / seconds:>10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
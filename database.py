@@ -1,8 +1,14 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
-from sqlalchemy.orm import DeclarativeBase 
-from typing import AsyncGenerator
+from datetime import datetime, timezone
+from sqlalchemy import DateTime, event, inspect, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncSession, async_sessionmaker
+from sqlalchemy.orm import DeclarativeBase, Session
+from sqlalchemy.sql.selectable import Select, CompoundSelect
+from sqlalchemy.types import TypeDecorator
+from typing import AsyncGenerator, Optional
 import os
 from dotenv import load_dotenv
+from app_logging import get_logger
 try:
     from models import Base, Task
 except ImportError:
@@ -10,26 +16,224 @@ except ImportError:
         pass
 
 load_dotenv()
+log = get_logger(__name__)
 
-DATABASE_URL = os.getenv("DATABASE_URL")
-
-engine = create_async_engine(
-    DATABASE_URL,
-    connect_args={"statement_cache_size": 0}
-)
-AsyncSessionLocal = async_sessionmaker(
-    bind=engine,
-    autoflush=False,
-    expire_on_commit=False
-)
+
+class UTCDateTime(TypeDecorator):
+    """
+    DateTime(timezone=True), всегда в UTC. SQLite не хранит смещение: без приведения
+    "10:00+03:00" записывалось бы как 10:00 и читалось как 10:00 UTC. Значения с
+    часовым поясом переводятся в UTC при записи, а прочитанным добавляется tzinfo=UTC;
+    значения без часового пояса считаются UTC (как в rollups._as_utc и utils).
+    """
+
+    impl = DateTime(timezone=True)
+    cache_ok = True
+
+    def process_bind_param(self, value: Optional[datetime], dialect) -> Optional[datetime]:
+        if value is None or not isinstance(value, datetime):
+            return value
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        value = value.astimezone(timezone.utc)
+        # SQLite записывает время без смещения — передаем его уже в UTC
+        return value.replace(tzinfo=None) if dialect.name == "sqlite" else value
+
+    def process_result_value(self, value: Optional[datetime], dialect) -> Optional[datetime]:
+        if value is None:
+            return None
+        if value.tzinfo is None:
+            return value.replace(tzinfo=timezone.utc)
+        return value.astimezone(timezone.utc)
+
+# Без DATABASE_URL приложение работает на встроенной SQLite (одноузловой режим)
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./todo.db")
+# Размер пула соединений на процесс; serve.py рассчитывает их так, чтобы
+# воркеры × (DB_POOL_SIZE + DB_MAX_OVERFLOW) не превышали лимит соединений БД
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+# SQLite: WAL — читатели не блокируют писателя; synchronous=NORMAL в WAL не теряет
+# целостность, только последние транзакции при сбое питания
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_FOREIGN_KEYS = os.getenv("SQLITE_FOREIGN_KEYS", "true").lower() in ("1", "true", "yes")
+# Соединения только для чтения; 0 — все запросы через одно соединение писателя
+SQLITE_READ_POOL_SIZE = int(os.getenv("SQLITE_READ_POOL_SIZE", "8"))
+
+
+def is_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+
+def _is_memory(url: str) -> bool:
+    return ":memory:" in url or "mode=memory" in url or url.rstrip("/").endswith("sqlite+aiosqlite:")
+
+
+def _sqlite_lower(value):
+    # Встроенный lower() SQLite меняет регистр только ASCII: ILIKE по кириллице не работал бы
+    return value.lower() if isinstance(value, str) else value
+
+
+def _install_sqlite_pragmas(async_engine: AsyncEngine, read_only: bool = False) -> None:
+    pragmas = [
+        f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}",
+        f"PRAGMA synchronous = {SQLITE_SYNCHRONOUS}",
+        f"PRAGMA cache_size = -{SQLITE_CACHE_SIZE_KB}",
+        f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}",
+        "PRAGMA temp_store = MEMORY",
+        f"PRAGMA foreign_keys = {'ON' if SQLITE_FOREIGN_KEYS else 'OFF'}",
+    ]
+    if not read_only:
+        # Режим журнала хранится в файле БД: достаточно установить его с соединения писателя
+        pragmas.insert(0, f"PRAGMA journal_mode = {SQLITE_JOURNAL_MODE}")
+    else:
+        pragmas.append("PRAGMA query_only = ON")
+
+    @event.listens_for(async_engine.sync_engine, "connect")
+    def on_connect(dbapi_connection, _record):
+        dbapi_connection.create_function("lower", 1, _sqlite_lower, deterministic=True)
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+        # pysqlite сам открывает транзакцию только перед DML, а SAVEPOINT без BEGIN
+        # становится внешней транзакцией: RELEASE фиксировал бы каждую операцию group
+        # commit отдельно. Транзакции открываются явно в on_begin (рецепт SQLAlchemy).
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(async_engine.sync_engine, "begin")
+    def on_begin(conn):
+        if conn.get_execution_options().get("isolation_level") != "AUTOCOMMIT":
+            conn.exec_driver_sql("BEGIN")
+
+
+def make_engine(url: str):
+    """
+    Создает async engine; statement_cache_size=0 нужен только asyncpg (pgbouncer/Supabase).
+    Для SQLite это engine писателя: одно соединение, поэтому записи процесса идут по
+    очереди в пуле, а не соревнуются за блокировку файла (SQLITE_BUSY).
+    """
+    if is_sqlite(url):
+        if _is_memory(url):
+            sqlite_engine = create_async_engine(url)
+        else:
+            sqlite_engine = create_async_engine(url, pool_size=1, max_overflow=0, pool_timeout=DB_POOL_TIMEOUT)
+        _install_sqlite_pragmas(sqlite_engine)
+        return sqlite_engine
+    connect_args = {"statement_cache_size": 0} if url.startswith("postgresql+asyncpg") else {}
+    return create_async_engine(
+        url,
+        connect_args=connect_args,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+    )
+
+
+def make_read_engine(url: str) -> Optional[AsyncEngine]:
+    """Engine читателей SQLite (WAL: параллельное чтение при идущей записи). Для других БД — None."""
+    if not is_sqlite(url) or _is_memory(url) or SQLITE_READ_POOL_SIZE <= 0:
+        return None
+    read_engine = create_async_engine(
+        url,
+        pool_size=SQLITE_READ_POOL_SIZE,
+        max_overflow=SQLITE_READ_POOL_SIZE,
+        pool_timeout=DB_POOL_TIMEOUT,
+    )
+    _install_sqlite_pragmas(read_engine, read_only=True)
+    return read_engine
+
+
+class SQLiteRoutingSession(Session):
+    """
+    Сессия SQLite с разделением чтения и записи: SELECT до первой записи в транзакции
+    идут через соединения читателей, запись и все запросы после нее — через соединение
+    писателя (видны собственные незафиксированные изменения).
+    """
+
+    def get_bind(self, mapper=None, *, clause=None, **kw):
+        read_bind = self.info.get("read_bind")
+        if read_bind is not None and not self.info.get("writing"):
+            if not self._flushing and isinstance(clause, (Select, CompoundSelect)):
+                return read_bind
+            self.info["writing"] = True
+        return super().get_bind(mapper, clause=clause, **kw)
+
+
+@event.listens_for(SQLiteRoutingSession, "after_commit")
+@event.listens_for(SQLiteRoutingSession, "after_rollback")
+def _end_write(session: Session) -> None:
+    session.info.pop("writing", None)
+
+
+def make_sessionmaker(async_engine: AsyncEngine, read_engine: Optional[AsyncEngine] = None) -> async_sessionmaker:
+    if read_engine is None:
+        return async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+    return async_sessionmaker(
+        bind=async_engine,
+        autoflush=False,
+        expire_on_commit=False,
+        sync_session_class=SQLiteRoutingSession,
+        info={"read_bind": read_engine.sync_engine},
+    )
+
+
+def dialect_insert(bind, table):
+    """
+    INSERT с ON CONFLICT (on_conflict_do_nothing / on_conflict_do_update) для диалекта
+    bind — сессии, соединения или engine (PostgreSQL или SQLite).
+    """
+    dialect = bind.bind.dialect if isinstance(bind, AsyncSession) else bind.dialect
+    if dialect.name == "sqlite":
+        return sqlite.insert(table)
+    return postgresql.insert(table)
+
+
+engine = make_engine(DATABASE_URL)
+read_engine = make_read_engine(DATABASE_URL)
+AsyncSessionLocal = make_sessionmaker(engine, read_engine)
+if is_sqlite(DATABASE_URL):
+    log.info("База данных: SQLite (%s)", DATABASE_URL)
 async def init_db():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
-    print("База данных инициализирована!")
+    log.info("База данных инициализирована!")
 async def drop_db():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.drop_all)
-    print("Все таблицы удалены!")
+    log.info("Все таблицы удалены!")
+async def dispose_engines() -> None:
+    await engine.dispose()
+    if read_engine is not None:
+        await read_engine.dispose()
+
+
+async def column_exists(conn, table: str, column: str) -> bool:
+    """Есть ли колонка в таблице (для миграций; работает в PostgreSQL и SQLite)."""
+    def check(sync_conn) -> bool:
+        inspector = inspect(sync_conn)
+        return inspector.has_table(table) and column in {c["name"] for c in inspector.get_columns(table)}
+    return await conn.run_sync(check)
+
+
+async def create_index(name: str, definition: str, target: Optional[AsyncEngine] = None, unique: bool = False) -> None:
+    """
+    CREATE [UNIQUE] INDEX IF NOT EXISTS <name> <definition>. В PostgreSQL — CONCURRENTLY (без
+    блокировки записи, вне транзакции), в SQLite — обычное создание.
+    """
+    target = target or engine
+    concurrently = "" if target.dialect.name == "sqlite" else "CONCURRENTLY "
+    kind = "UNIQUE INDEX" if unique else "INDEX"
+    async with target.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text(f"CREATE {kind} {concurrently}IF NOT EXISTS {name} {definition}"))
+
+
 async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
     async with AsyncSessionLocal() as session:
         yield session
\ No newline at end of file
@@ -3,9 +3,10 @@ from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from database import get_async_session
+from sharding import shard_router
 from models import User, UserRole
 from auth_utils import decode_access_token
-from typing import Optional
+from typing import AsyncGenerator, Optional
 # OAuth2 схема для получения токена из заголовка Authorization
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v3/auth/login")
 #Аутентификация
@@ -42,4 +43,31 @@ async def get_current_admin(
 			status_code=status.HTTP_403_FORBIDDEN,
 			detail="Недостаточно прав доступа"
 		)
-	return current_user
\ No newline at end of file
+	return current_user
+# Сессия шарда, на котором хранятся задачи текущего пользователя
+async def get_shard_session(
+	current_user: User = Depends(get_current_user),
+	db: AsyncSession = Depends(get_async_session)
+) -> AsyncGenerator[AsyncSession, None]:
+	shard = shard_router.shard_for_user(current_user.id)
+	if shard == 0:
+		# Основная база: используем уже открытую сессию запроса
+		yield db
+		return
+	# Копия пользователя на шарде (внешний ключ задач), если ее не создала регистрация
+	await shard_router.ensure_user(current_user)
+	async with shard_router.sessionmakers[shard]() as session:
+		yield session
+# Сессия шарда конкретной задачи: администратор может обращаться к задачам других пользователей
+async def get_task_shard_session(
+	task_id: int,
+	current_user: User = Depends(get_current_user),
+	db: AsyncSession = Depends(get_shard_session)
+) -> AsyncGenerator[AsyncSession, None]:
+	if current_user.role == UserRole.ADMIN and shard_router.enabled:
+		shard = await shard_router.find_task_shard(task_id)
+		if shard is not None and shard != shard_router.shard_for_user(current_user.id):
+			async with shard_router.sessionmakers[shard]() as session:
+				yield session
+			return
+	yield db
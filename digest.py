@@ -0,0 +1,258 @@
+"""
+Ежедневный дайджест дедлайнов: просроченные задачи и задачи со сроком в ближайшие
+DIGEST_DUE_SOON_DAYS дней.
+
+Сборка (build_digests) — один упорядоченный потоковый проход по незавершенным
+задачам с дедлайном на каждом шарде (ORDER BY user_id, deadline_at), группировка по
+user_id на лету и запись дайджестов в таблицу digest_outbox пачками по
+DIGEST_BATCH_SIZE. Память не зависит от числа задач, запросов — не по одному на
+пользователя. Повторная сборка за тот же день не создает дубликатов.
+
+Отправка (deliver_digests) отделена от сборки: ожидающие записи outbox передаются
+отправителю, выбранному в DIGEST_SENDER:
+- file — дописывает дайджесты в JSONL-файл DIGEST_FILE_PATH (для локальной проверки);
+- log — пишет дайджесты в лог приложения.
+Новый отправитель — подкласс DigestSender, зарегистрированный в SENDERS.
+"""
+import asyncio
+import json
+import os
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Type
+
+from dotenv import load_dotenv
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import AsyncSessionLocal, dialect_insert
+from models import DigestOutbox, DigestStatus, Task
+from sharding import shard_router
+from app_logging import get_logger
+
+load_dotenv()
+log = get_logger(__name__)
+
+# Час (UTC) ежедневной сборки дайджестов
+DIGEST_HOUR = int(os.getenv("DIGEST_HOUR", "7"))
+DIGEST_DUE_SOON_DAYS = int(os.getenv("DIGEST_DUE_SOON_DAYS", "3"))
+# Сколько задач каждого вида попадает в текст дайджеста (счетчики — по всем задачам)
+DIGEST_MAX_TASKS = int(os.getenv("DIGEST_MAX_TASKS", "20"))
+DIGEST_FETCH_SIZE = int(os.getenv("DIGEST_FETCH_SIZE", "2000"))
+DIGEST_BATCH_SIZE = int(os.getenv("DIGEST_BATCH_SIZE", "500"))
+DIGEST_SEND_BATCH_SIZE = int(os.getenv("DIGEST_SEND_BATCH_SIZE", "100"))
+DIGEST_MAX_ATTEMPTS = int(os.getenv("DIGEST_MAX_ATTEMPTS", "5"))
+DIGEST_SENDER = os.getenv("DIGEST_SENDER", "log")
+DIGEST_FILE_PATH = os.getenv("DIGEST_FILE_PATH", "digests.jsonl")
+
+
+def _as_utc(value: datetime) -> datetime:
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+def _new_digest(user_id: int, now: datetime) -> Dict[str, Any]:
+    return {
+        "user_id": user_id,
+        "digest_date": now.date(),
+        "payload": {"overdue_count": 0, "due_soon_count": 0, "overdue": [], "due_soon": []},
+        "status": DigestStatus.PENDING,
+    }
+
+
+def _add_task(digest: Dict[str, Any], row, now: datetime) -> None:
+    # В дайджест попадают первые DIGEST_MAX_TASKS задач каждого вида, поэтому память на пользователя ограничена
+    payload = digest["payload"]
+    deadline = _as_utc(row.deadline_at)
+    kind = "overdue" if deadline < now else "due_soon"
+    payload[f"{kind}_count"] += 1
+    if len(payload[kind]) < DIGEST_MAX_TASKS:
+        payload[kind].append({
+            "id": row.id,
+            "title": row.title,
+            "quadrant": row.quadrant,
+            "deadline_at": deadline.isoformat(),
+            "days_until_deadline": (deadline.date() - now.date()).days,
+        })
+
+
+async def _write_batch(outbox: AsyncSession, batch: List[Dict[str, Any]]) -> int:
+    if not batch:
+        return 0
+    result = await outbox.execute(
+        dialect_insert(outbox, DigestOutbox).values(batch).on_conflict_do_nothing().returning(DigestOutbox.id)
+    )
+    written = len(result.all())
+    await outbox.commit()
+    return written
+
+
+async def build_digests(now: Optional[datetime] = None) -> Dict[str, Any]:
+    """Собирает дайджесты всех пользователей за один проход по каждому шарду."""
+    now = now or datetime.now(timezone.utc)
+    horizon = now + timedelta(days=DIGEST_DUE_SOON_DAYS)
+    stmt = (
+        select(Task.user_id, Task.id, Task.title, Task.quadrant, Task.deadline_at)
+        .where(
+            Task.completed == False,
+            Task.deadline_at.is_not(None),
+            Task.deadline_at <= horizon,
+        )
+        .order_by(Task.user_id, Task.deadline_at, Task.id)
+        .execution_options(yield_per=DIGEST_FETCH_SIZE)
+    )
+
+    started = time.perf_counter()
+    scanned = users = written = 0
+    # Outbox — в основной базе, в отдельной сессии: чтение идет потоком, запись — пачками,
+    # каждая пачка фиксируется сразу и не держит соединение писателя весь проход
+    async with AsyncSessionLocal() as outbox:
+        for shard, session_maker in enumerate(shard_router.sessionmakers):
+            # SQLite без пула читателей: курсор чтения занимает единственное соединение,
+            # через которое идет и запись, — пачки шарда 0 записываются после закрытия курсора
+            deferred: List[List[Dict[str, Any]]] = []
+            async with session_maker() as db:
+                defer = shard == 0 and db.bind.dialect.name == "sqlite" and db.info.get("read_bind") is None
+                result = await db.stream(stmt)
+                batch: List[Dict[str, Any]] = []
+                digest: Optional[Dict[str, Any]] = None
+                async for row in result:
+                    scanned += 1
+                    # Строки отсортированы по user_id: смена пользователя закрывает его дайджест
+                    if digest is None or row.user_id != digest["user_id"]:
+                        if digest is not None:
+                            batch.append(digest)
+                            users += 1
+                            if len(batch) >= DIGEST_BATCH_SIZE:
+                                if defer:
+                                    deferred.append(batch)
+                                else:
+                                    written += await _write_batch(outbox, batch)
+                                batch = []
+                        digest = _new_digest(row.user_id, now)
+                    _add_task(digest, row, now)
+                if digest is not None:
+                    batch.append(digest)
+                    users += 1
+                if defer:
+                    deferred.append(batch)
+                else:
+                    written += await _write_batch(outbox, batch)
+            for pending in deferred:
+                written += await _write_batch(outbox, pending)
+
+    duration = time.perf_counter() - started
+    report = {
+        "digest_date": now.date().isoformat(),
+        "tasks_scanned": scanned,
+        "users": users,
+        "digests_written": written,
+        "duration_seconds": round(duration, 3),
+        "tasks_per_second": round(scanned / duration, 1) if duration > 0 else 0.0,
+    }
+    log.info("Дайджесты собраны: %s пользователей, %s задач", users, scanned, extra={"fields": report})
+    return report
+
+
+class DigestSender(ABC):
+    """Отправитель дайджестов. send получает пачку записей outbox и бросает исключение при ошибке."""
+
+    name = "base"
+
+    @abstractmethod
+    async def send(self, digests: List[Dict[str, Any]]) -> None:
+        ...
+
+
+class FileDigestSender(DigestSender):
+    """Дописывает дайджесты в JSONL-файл (локальная проверка без почты/пушей)."""
+
+    name = "file"
+
+    def __init__(self, path: str = DIGEST_FILE_PATH):
+        self.path = path
+
+    def _append(self, lines: List[str]) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write("".join(lines))
+
+    async def send(self, digests: List[Dict[str, Any]]) -> None:
+        lines = [json.dumps(d, ensure_ascii=False, default=str) + "\n" for d in digests]
+        # Запись в файл — блокирующая, выполняем вне event loop
+        await asyncio.to_thread(self._append, lines)
+
+
+class LogDigestSender(DigestSender):
+    name = "log"
+
+    async def send(self, digests: List[Dict[str, Any]]) -> None:
+        # Одна запись на пачку: однотипные сообщения ограничиваются по частоте (LOG_RATE_LIMIT)
+        log.info("Дайджестов в пачке: %s", len(digests), extra={"fields": {"digests": digests}})
+
+
+SENDERS: Dict[str, Type[DigestSender]] = {
+    FileDigestSender.name: FileDigestSender,
+    LogDigestSender.name: LogDigestSender,
+}
+
+
+def get_sender(name: str = DIGEST_SENDER) -> DigestSender:
+    if name not in SENDERS:
+        raise ValueError(f"Неизвестный отправитель дайджестов: {name}")
+    return SENDERS[name]()
+
+
+async def deliver_digests(sender: Optional[DigestSender] = None) -> Dict[str, Any]:
+    """Отправляет ожидающие дайджесты пачками; при ошибке пачка остается в outbox до DIGEST_MAX_ATTEMPTS попыток."""
+    sender = sender or get_sender()
+    started = time.perf_counter()
+    sent = failed = 0
+    last_id = 0
+    async with AsyncSessionLocal() as db:
+        while True:
+            result = await db.execute(
+                select(DigestOutbox)
+                .where(DigestOutbox.status == DigestStatus.PENDING, DigestOutbox.id > last_id)
+                .order_by(DigestOutbox.id)
+                .limit(DIGEST_SEND_BATCH_SIZE)
+                .with_for_update(skip_locked=True)
+            )
+            batch = result.scalars().all()
+            if not batch:
+                break
+            last_id = batch[-1].id
+            ids = [d.id for d in batch]
+            try:
+                await sender.send([
+                    {"id": d.id, "user_id": d.user_id, "digest_date": d.digest_date.isoformat(), **d.payload}
+                    for d in batch
+                ])
+            except Exception as e:
+                log.exception("Ошибка отправки %s дайджестов через %s", len(batch), sender.name)
+                for d in batch:
+                    d.attempts += 1
+                    d.last_error = str(e)[:1000]
+                    if d.attempts >= DIGEST_MAX_ATTEMPTS:
+                        d.status = DigestStatus.FAILED
+                        failed += 1
+                await db.commit()
+                continue
+            await db.execute(
+                update(DigestOutbox)
+                .where(DigestOutbox.id.in_(ids))
+                .values(status=DigestStatus.SENT, sent_at=datetime.now(timezone.utc), attempts=DigestOutbox.attempts + 1)
+            )
+            await db.commit()
+            sent += len(batch)
+
+    duration = time.perf_counter() - started
+    report = {
+        "sender": sender.name,
+        "sent": sent,
+        "failed": failed,
+        "duration_seconds": round(duration, 3),
+        "digests_per_second": round(sent / duration, 1) if duration > 0 else 0.0,
+    }
+    if sent or failed:
+        log.info("Дайджесты отправлены: %s", sent, extra={"fields": report})
+    return report
@@ -0,0 +1,272 @@
+"""
+Ключи идемпотентности (заголовок Idempotency-Key) для создающих запросов.
+
+Клиент, повторяющий запрос после обрыва сети, передает тот же Idempotency-Key.
+Первый запрос с ключом захватывает его (INSERT ... ON CONFLICT DO NOTHING в
+таблицу idempotency_keys основной базы), выполняется и сохраняет ответ. Повторы:
+- после завершения получают сохраненный ответ без обращения к таблице tasks
+  (заголовок Idempotent-Replayed: true);
+- пока первый запрос выполняется — ждут его завершения (до IDEMPOTENCY_WAIT_SECONDS,
+  затем 409 с Retry-After), а не выполняются второй раз;
+- с тем же ключом, но другим телом запроса — 422.
+Если первый запрос завершился ошибкой или был отменен, ключ освобождается и запрос
+можно повторить. Захват ключа — аренда на IDEMPOTENCY_LEASE_SECONDS, которую
+выполняющийся запрос продлевает: если процесс упал, не успев освободить ключ,
+после истечения аренды ключ захватывает повтор.
+Ключи живут IDEMPOTENCY_TTL_SECONDS и удаляются фоновым заданием.
+"""
+import asyncio
+import hashlib
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, Union
+
+from dotenv import load_dotenv
+from fastapi import Header, HTTPException, status
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from sqlalchemy import and_, delete, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import AsyncSessionLocal, dialect_insert
+from models import IdempotencyKey
+from app_logging import get_logger
+
+load_dotenv()
+log = get_logger(__name__)
+
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+# Сколько повтор ждет завершения первого запроса с тем же ключом
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "10"))
+# Интервал опроса таблицы, если первый запрос выполняется в другом процессе
+IDEMPOTENCY_POLL_INTERVAL = float(os.getenv("IDEMPOTENCY_POLL_INTERVAL", "0.1"))
+# Аренда захваченного ключа; продлевается каждую треть срока, пока запрос выполняется
+IDEMPOTENCY_LEASE_SECONDS = float(os.getenv("IDEMPOTENCY_LEASE_SECONDS", "30"))
+IDEMPOTENCY_PURGE_BATCH = int(os.getenv("IDEMPOTENCY_PURGE_BATCH", "1000"))
+
+REPLAY_HEADER = "Idempotent-Replayed"
+
+# Ожидающие повторы в этом процессе будятся сразу, без ожидания интервала опроса
+_events: Dict[Tuple[int, str], asyncio.Event] = {}
+
+
+def get_idempotency_key(
+    idempotency_key: Optional[str] = Header(
+        None,
+        alias="Idempotency-Key",
+        min_length=1,
+        max_length=255,
+        description="Ключ идемпотентности: повтор запроса с тем же ключом вернет сохраненный ответ",
+    ),
+) -> Optional[str]:
+    return idempotency_key
+
+
+def request_fingerprint(scope: str, body: Any) -> str:
+    """Отпечаток запроса: маршрут и тело, чтобы ключ нельзя было переиспользовать для другого запроса."""
+    raw = json.dumps([scope, body], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def _lease_expiry() -> datetime:
+    return datetime.now(timezone.utc) + timedelta(seconds=IDEMPOTENCY_LEASE_SECONDS)
+
+
+async def _claim(db: AsyncSession, user_id: int, key: str, fingerprint: str) -> bool:
+    expires_at = datetime.now(timezone.utc) + timedelta(seconds=IDEMPOTENCY_TTL_SECONDS)
+    result = await db.execute(
+        dialect_insert(db, IdempotencyKey)
+        .values(user_id=user_id, key=key, request_hash=fingerprint, expires_at=expires_at, locked_until=_lease_expiry())
+        .on_conflict_do_nothing()
+        .returning(IdempotencyKey.id)
+    )
+    claimed = result.scalar_one_or_none() is not None
+    if not claimed:
+        # Незавершенный ключ с истекшей арендой: процесс первого запроса упал — забираем ключ
+        now = datetime.now(timezone.utc)
+        result = await db.execute(
+            update(IdempotencyKey)
+            .where(
+                IdempotencyKey.user_id == user_id,
+                IdempotencyKey.key == key,
+                IdempotencyKey.request_hash == fingerprint,
+                IdempotencyKey.status_code.is_(None),
+                or_(
+                    IdempotencyKey.locked_until < now,
+                    # Ключи, захваченные до появления аренды
+                    and_(
+                        IdempotencyKey.locked_until.is_(None),
+                        IdempotencyKey.created_at < now - timedelta(seconds=IDEMPOTENCY_LEASE_SECONDS),
+                    ),
+                ),
+            )
+            .values(locked_until=_lease_expiry())
+            .returning(IdempotencyKey.id)
+        )
+        claimed = result.scalar_one_or_none() is not None
+        if claimed:
+            log.warning("Захвачен ключ идемпотентности с истекшей арендой", extra={"fields": {"user_id": user_id}})
+    await db.commit()
+    return claimed
+
+
+async def _renew_lease(user_id: int, key: str) -> None:
+    """Продлевает аренду ключа, пока выполняется запрос (отдельная сессия: сессия запроса занята)."""
+    while True:
+        await asyncio.sleep(IDEMPOTENCY_LEASE_SECONDS / 3)
+        try:
+            async with AsyncSessionLocal() as session:
+                await session.execute(
+                    update(IdempotencyKey)
+                    .where(
+                        IdempotencyKey.user_id == user_id,
+                        IdempotencyKey.key == key,
+                        IdempotencyKey.status_code.is_(None),
+                    )
+                    .values(locked_until=_lease_expiry())
+                )
+                await session.commit()
+        except Exception as e:
+            log.warning("Не удалось продлить аренду ключа идемпотентности: %s", e, extra={"fields": {"user_id": user_id}})
+
+
+async def _load(db: AsyncSession, user_id: int, key: str):
+    # Колонки, а не ORM-объект: при повторном чтении нужны свежие значения, а не identity map
+    result = await db.execute(
+        select(
+            IdempotencyKey.request_hash,
+            IdempotencyKey.status_code,
+            IdempotencyKey.response_body,
+        ).where(
+            IdempotencyKey.user_id == user_id,
+            IdempotencyKey.key == key,
+            IdempotencyKey.expires_at > datetime.now(timezone.utc),
+        )
+    )
+    row = result.first()
+    # Завершаем транзакцию, чтобы не держать соединение, пока ждем
+    await db.rollback()
+    return row
+
+
+async def _release(db: AsyncSession, user_id: int, key: str) -> None:
+    try:
+        await db.rollback()
+        await db.execute(
+            delete(IdempotencyKey).where(
+                IdempotencyKey.user_id == user_id,
+                IdempotencyKey.key == key,
+                IdempotencyKey.status_code.is_(None),
+            )
+        )
+        await db.commit()
+    except Exception as e:
+        # Ключ освободится сам, когда истечет аренда
+        log.warning("Не удалось освободить ключ идемпотентности: %s", e, extra={"fields": {"user_id": user_id}})
+
+
+def _replay(row) -> JSONResponse:
+    return JSONResponse(
+        status_code=row.status_code,
+        content=row.response_body,
+        headers={REPLAY_HEADER: "true"},
+    )
+
+
+async def run_idempotent(
+    db: AsyncSession,
+    user_id: int,
+    key: Optional[str],
+    fingerprint: str,
+    handler: Callable[[], Awaitable[BaseModel]],
+    status_code: int = status.HTTP_200_OK,
+) -> Union[BaseModel, JSONResponse]:
+    """
+    Выполняет handler не более одного раза для пары (пользователь, ключ).
+    db — сессия основной базы. Без ключа handler просто выполняется.
+    """
+    if not key:
+        return await handler()
+
+    deadline = asyncio.get_running_loop().time() + IDEMPOTENCY_WAIT_SECONDS
+    while True:
+        if await _claim(db, user_id, key, fingerprint):
+            break
+
+        row = await _load(db, user_id, key)
+        if row is None:
+            # Ключ истек (или первый запрос завершился ошибкой) — удаляем просроченную запись и пробуем снова
+            await db.execute(
+                delete(IdempotencyKey).where(
+                    IdempotencyKey.user_id == user_id,
+                    IdempotencyKey.key == key,
+                    IdempotencyKey.expires_at <= datetime.now(timezone.utc),
+                )
+            )
+            await db.commit()
+            continue
+        if row.request_hash != fingerprint:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Idempotency-Key уже использован для другого запроса",
+            )
+        if row.status_code is not None:
+            return _replay(row)
+
+        remaining = deadline - asyncio.get_running_loop().time()
+        if remaining <= 0:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Запрос с этим Idempotency-Key еще выполняется",
+                headers={"Retry-After": "1"},
+            )
+        event = _events.setdefault((user_id, key), asyncio.Event())
+        try:
+            await asyncio.wait_for(event.wait(), timeout=min(IDEMPOTENCY_POLL_INTERVAL, remaining))
+        except asyncio.TimeoutError:
+            pass
+
+    lease = asyncio.create_task(_renew_lease(user_id, key))
+    try:
+        response = await handler()
+    except BaseException:
+        # Ошибка и отмена запроса не сохраняются: освобождаем ключ, чтобы клиент мог повторить запрос.
+        # shield — освобождение доводится до конца и при отмене задачи запроса
+        await asyncio.shield(_release(db, user_id, key))
+        _wake(user_id, key)
+        raise
+    finally:
+        lease.cancel()
+
+    await db.execute(
+        update(IdempotencyKey)
+        .where(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key)
+        .values(status_code=status_code, response_body=response.model_dump(mode="json"))
+    )
+    await db.commit()
+    _wake(user_id, key)
+    return response
+
+
+def _wake(user_id: int, key: str) -> None:
+    event = _events.pop((user_id, key), None)
+    if event is not None:
+        event.set()
+
+
+async def purge_expired_keys(db: AsyncSession) -> int:
+    """Удаляет просроченные ключи пачками по IDEMPOTENCY_PURGE_BATCH. Возвращает число удаленных."""
+    total = 0
+    while True:
+        ids = (
+            select(IdempotencyKey.id)
+            .where(IdempotencyKey.expires_at <= datetime.now(timezone.utc))
+            .limit(IDEMPOTENCY_PURGE_BATCH)
+            .scalar_subquery()
+        )
+        result = await db.execute(delete(IdempotencyKey).where(IdempotencyKey.id.in_(ids)))
+        await db.commit()
+        total += result.rowcount or 0
+        if (result.rowcount or 0) < IDEMPOTENCY_PURGE_BATCH:
+            return total
@@ -0,0 +1,230 @@
+"""
+Потоковый импорт задач из CSV / NDJSON.
+
+Файл читается построчно пачками по IMPORT_BATCH_SIZE строк, каждая строка
+валидируется схемой TaskCreate, срочность и квадрант считаются сразу для всей
+пачки, а запись идет через PostgreSQL COPY (asyncpg). Для остальных драйверов
+используется многострочный INSERT.
+"""
+import csv
+import io
+import json
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import Task
+from schemas import TaskCreate
+from utils import calculate_urgency_batch, determine_quadrant_batch
+from rollups import record_created
+
+load_dotenv()
+
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "1000"))
+# Сколько ошибок по строкам максимум возвращать в отчете
+IMPORT_MAX_REPORTED_ERRORS = int(os.getenv("IMPORT_MAX_REPORTED_ERRORS", "1000"))
+
+SUPPORTED_FORMATS = ("csv", "ndjson")
+COPY_COLUMNS = (
+    "title",
+    "description",
+    "is_important",
+    "is_urgent",
+    "deadline_at",
+    "quadrant",
+    "completed",
+    "user_id",
+)
+
+# Результат разбора строки: (номер строки, данные или None, текст ошибки или None)
+ParsedRow = Tuple[int, Optional[Dict[str, Any]], Optional[str]]
+
+
+def detect_format(upload: UploadFile, requested: Optional[str] = None) -> Optional[str]:
+    """Определяет формат по параметру запроса, расширению файла или content-type."""
+    if requested:
+        return requested
+    filename = (upload.filename or "").lower()
+    content_type = (upload.content_type or "").lower()
+    if filename.endswith(".csv") or "csv" in content_type:
+        return "csv"
+    if filename.endswith((".ndjson", ".jsonl")) or "ndjson" in content_type:
+        return "ndjson"
+    return None
+
+
+def _iter_csv(text: io.TextIOBase) -> Iterator[ParsedRow]:
+    reader = csv.DictReader(text)
+    for row in reader:
+        # Пустые ячейки CSV трактуем как отсутствующие значения
+        data = {key: (value if value != "" else None) for key, value in row.items() if key}
+        yield reader.line_num, data, None
+
+
+def _iter_ndjson(text: io.TextIOBase) -> Iterator[ParsedRow]:
+    for line_num, line in enumerate(text, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            data = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield line_num, None, f"Некорректный JSON: {e.msg}"
+            continue
+        if not isinstance(data, dict):
+            yield line_num, None, "Ожидался JSON-объект"
+            continue
+        yield line_num, data, None
+
+
+def iter_rows(upload: UploadFile, fmt: str) -> Iterator[ParsedRow]:
+    """
+    Ленивый итератор по строкам загруженного файла (файл целиком в память не читается).
+    Файл не в UTF-8 — ошибка в последней строке итератора, остаток файла пропускается.
+    """
+    upload.file.seek(0)
+    text = io.TextIOWrapper(upload.file, encoding="utf-8-sig", newline="")
+    line_num = 0
+    try:
+        for row in (_iter_csv(text) if fmt == "csv" else _iter_ndjson(text)):
+            line_num = row[0]
+            yield row
+    except UnicodeDecodeError:
+        # Дальше файл не читается: обертка декодирует блоками, и после ошибки позиция в строках неизвестна
+        yield line_num + 1, None, "Файл не в кодировке UTF-8: строки начиная с этой не импортированы"
+    finally:
+        # Не закрываем файл UploadFile вместе с оберткой
+        text.detach()
+
+
+def _next_batch(rows: Iterator[ParsedRow], size: int) -> List[ParsedRow]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            break
+    return batch
+
+
+def _build_records(
+    batch: List[ParsedRow],
+    user_id: int,
+    errors: List[Dict[str, Any]],
+) -> Tuple[List[tuple], int]:
+    """Валидирует пачку и считает срочность/квадрант с общим опорным временем."""
+    now = datetime.now(timezone.utc)
+    valid = []
+    failed = 0
+    for line_num, data, error in batch:
+        if error is None:
+            try:
+                task = TaskCreate.model_validate(data)
+            except ValidationError as e:
+                error = "; ".join(
+                    f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors()
+                )
+        if error is not None:
+            failed += 1
+            if len(errors) < IMPORT_MAX_REPORTED_ERRORS:
+                errors.append({"row": line_num, "error": error})
+            continue
+
+        deadline_at = task.deadline_at
+        if deadline_at is not None and deadline_at.tzinfo is None:
+            deadline_at = deadline_at.replace(tzinfo=timezone.utc)
+        valid.append((task, deadline_at))
+
+    # Срочность и квадранты всей пачки — одним пакетным расчетом
+    urgency = calculate_urgency_batch([deadline_at for _, deadline_at in valid], now)
+    quadrants = determine_quadrant_batch([task.is_important for task, _ in valid], urgency)
+    records = [
+        (
+            task.title,
+            task.description,
+            task.is_important,
+            is_urgent,
+            deadline_at,
+            quadrant,
+            False,
+            user_id,
+        )
+        for (task, deadline_at), is_urgent, quadrant in zip(valid, urgency, quadrants)
+    ]
+    return records, failed
+
+
+async def _write_records(db: AsyncSession, records: List[tuple]) -> str:
+    """Записывает пачку через COPY (asyncpg) или многострочный INSERT."""
+    conn = await db.connection()
+    if conn.dialect.driver == "asyncpg":
+        raw = await conn.get_raw_connection()
+        await raw.driver_connection.copy_records_to_table(
+            Task.__tablename__,
+            records=records,
+            columns=COPY_COLUMNS,
+        )
+        return "copy"
+    await db.execute(
+        insert(Task),
+        [dict(zip(COPY_COLUMNS, record)) for record in records],
+    )
+    return "insert"
+
+
+async def import_tasks(
+    db: AsyncSession,
+    upload: UploadFile,
+    fmt: str,
+    user_id: int,
+    batch_size: int = IMPORT_BATCH_SIZE,
+    atomic: bool = False,
+) -> Dict[str, Any]:
+    """
+    Импортирует задачи пачками; каждая пачка фиксируется отдельной транзакцией.
+    atomic=True — весь файл в одной транзакции, COMMIT делает вызывающий: сбой
+    посередине не оставляет зафиксированных пачек (импорт с Idempotency-Key).
+    """
+    started = time.perf_counter()
+    rows = iter_rows(upload, fmt)
+    errors: List[Dict[str, Any]] = []
+    total = imported = failed = 0
+    method = None
+
+    try:
+        while True:
+            # Чтение и разбор файла — синхронные операции, выносим их из event loop
+            batch = await run_in_threadpool(_next_batch, rows, batch_size)
+            if not batch:
+                break
+            total += len(batch)
+            records, batch_failed = _build_records(batch, user_id, errors)
+            failed += batch_failed
+            if records:
+                method = await _write_records(db, records)
+                await record_created(db, user_id, count=len(records))
+                if not atomic:
+                    await db.commit()
+                imported += len(records)
+    finally:
+        # При ошибке отсоединяем обертку от файла сразу, пока UploadFile не закрыт
+        rows.close()
+
+    duration = time.perf_counter() - started
+    return {
+        "format": fmt,
+        "method": method,
+        "total_rows": total,
+        "imported": imported,
+        "failed": failed,
+        "errors": errors,
+        "duration_seconds": round(duration, 3),
+        "rows_per_second": round(imported / duration, 1) if duration > 0 else float(imported),
+    }
@@ -0,0 +1,104 @@
+"""
+Обработчики фоновых заданий (см. jobs.py).
+"""
+from typing import Any, Dict
+from pydantic_core import to_jsonable_python
+from sqlalchemy import select
+
+from models import Task
+from database import AsyncSessionLocal
+from sharding import shard_router
+from jobs import job_handler, enqueue
+from scheduler import update_task_urgency
+from idempotency import purge_expired_keys
+from recurrence import materialize_due
+from user_purge import purge_users as run_user_purge
+from digest import build_digests as run_digest_build, deliver_digests as run_digest_delivery
+from archive import archive_completed_tasks
+from rollups import rebuild_rollups as run_rollup_rebuild
+from trash import purge_trash as run_trash_purge
+
+
+@job_handler("recompute_urgency", admin_only=True)
+async def recompute_urgency(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Пересчет срочности и квадрантов незавершенных задач."""
+    return await update_task_urgency()
+
+
+@job_handler("export_tasks")
+async def export_tasks(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Выгрузка задач пользователя (или всех задач, если all=True и задание поставил админ)."""
+    stmt = select(Task).order_by(Task.id)
+    if not payload.get("all"):
+        stmt = stmt.where(Task.user_id == payload["user_id"])
+
+    async def fetch(session) -> list:
+        result = await session.execute(stmt)
+        return [
+            to_jsonable_python(task.to_dict())
+            for task in result.scalars()
+        ]
+
+    if payload.get("all"):
+        # Выгрузка по всем пользователям собирается со всех шардов
+        tasks = [task for part in await shard_router.scatter(fetch) for task in part]
+    else:
+        async with shard_router.sessionmaker_for_user(payload["user_id"])() as db:
+            tasks = await fetch(db)
+    return {"count": len(tasks), "tasks": tasks}
+
+
+@job_handler("purge_idempotency_keys", admin_only=True)
+async def purge_idempotency_keys(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Удаление просроченных ключей идемпотентности."""
+    async with AsyncSessionLocal() as db:
+        return {"deleted": await purge_expired_keys(db)}
+
+
+@job_handler("materialize_recurrences", admin_only=True)
+async def materialize_recurrences(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Создание вхождений повторяющихся задач, вошедших в окно срочности (на всех шардах)."""
+    created = 0
+    for session_maker in shard_router.sessionmakers:
+        async with session_maker() as db:
+            created += await materialize_due(db)
+    return {"created": created}
+
+
+@job_handler("purge_users", admin_only=True)
+async def purge_users(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Удаление пользователей: задачи удаляются пачками, затем сами пользователи."""
+    return await run_user_purge(payload.get("user_ids", []))
+
+
+@job_handler("build_digests", admin_only=True)
+async def build_digests(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Сборка ежедневных дайджестов дедлайнов в outbox; отправка ставится следующим заданием."""
+    report = await run_digest_build()
+    async with AsyncSessionLocal() as db:
+        await enqueue(db, "deliver_digests", unique=True)
+    return report
+
+
+@job_handler("deliver_digests", admin_only=True)
+async def deliver_digests(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Отправка ожидающих дайджестов из outbox."""
+    return await run_digest_delivery()
+
+
+@job_handler("archive_tasks", admin_only=True)
+async def archive_tasks(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Перенос давно завершенных задач в архив (older_than_days — по умолчанию ARCHIVE_AFTER_DAYS)."""
+    return await archive_completed_tasks(payload.get("older_than_days"))
+
+
+@job_handler("rebuild_rollups", admin_only=True)
+async def rebuild_rollups(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Пересчет счетчиков аналитики (task_rollups) по задачам и архиву."""
+    return await run_rollup_rebuild()
+
+
+@job_handler("purge_trash", admin_only=True)
+async def purge_trash(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Окончательное удаление задач из корзины (older_than_days — по умолчанию TRASH_RETENTION_DAYS)."""
+    return await run_trash_purge(payload.get("older_than_days"))
@@ -0,0 +1,313 @@
+"""
+Фоновые задания на базе таблицы jobs (без внешнего брокера).
+
+Задание ставится в очередь функцией enqueue(), воркеры пула забирают его через
+SELECT ... FOR UPDATE SKIP LOCKED, выполняют зарегистрированный обработчик и
+сохраняют результат. Неудачные задания повторяются с задержкой до max_attempts.
+
+Режимы пула (JOB_WORKER_MODE):
+- async   — обработчики выполняются корутинами в текущем event loop;
+- process — обработчики выполняются в ProcessPoolExecutor (тяжелые CPU-задачи).
+
+Отдельный процесс-воркер: python worker.py
+"""
+import asyncio
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import select, update, func, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import AsyncSessionLocal, engine, read_engine, dialect_insert, dispose_engines
+from models import Job, JobStatus
+from app_logging import get_logger, job_id_var
+
+load_dotenv()
+log = get_logger(__name__)
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_WORKER_MODE = os.getenv("JOB_WORKER_MODE", "async")
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+JOB_RETRY_DELAY_SECONDS = int(os.getenv("JOB_RETRY_DELAY_SECONDS", "30"))
+# Задание в статусе running дольше этого времени считается брошенным (воркер упал)
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "600"))
+
+JobHandler = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+# Реестр обработчиков: kind -> (функция, только для администратора)
+_HANDLERS: Dict[str, JobHandler] = {}
+_ADMIN_ONLY: Dict[str, bool] = {}
+
+
+def job_handler(kind: str, admin_only: bool = False):
+    """Декоратор регистрации обработчика задания."""
+    def decorator(func: JobHandler) -> JobHandler:
+        _HANDLERS[kind] = func
+        _ADMIN_ONLY[kind] = admin_only
+        return func
+    return decorator
+
+
+def is_known_kind(kind: str) -> bool:
+    return kind in _HANDLERS
+
+
+def is_admin_only(kind: str) -> bool:
+    return _ADMIN_ONLY.get(kind, True)
+
+
+async def enqueue(
+    db: AsyncSession,
+    kind: str,
+    payload: Optional[Dict[str, Any]] = None,
+    user_id: Optional[int] = None,
+    max_attempts: int = 3,
+    unique: bool = False,
+) -> Job:
+    """
+    Ставит задание в очередь. unique=True не создает дубликат, если такое задание уже
+    ждет или выполняется: уникальный частичный индекс uq_jobs_unique_kind_active и
+    INSERT ... ON CONFLICT DO NOTHING делают проверку атомарной между процессами.
+    """
+    values = dict(
+        kind=kind,
+        payload=payload or {},
+        status=JobStatus.QUEUED,
+        attempts=0,
+        max_attempts=max_attempts,
+        user_id=user_id,
+    )
+    if unique:
+        result = await db.execute(
+            dialect_insert(db, Job).values(**values, unique_kind=kind).on_conflict_do_nothing().returning(Job)
+        )
+        job = result.scalar_one_or_none()
+        if job is None:
+            result = await db.execute(
+                select(Job).where(
+                    (Job.unique_kind == kind) & (Job.status.in_([JobStatus.QUEUED, JobStatus.RUNNING]))
+                ).limit(1)
+            )
+            job = result.scalar_one_or_none()
+            await db.commit()
+            return job
+    else:
+        job = Job(**values)
+        db.add(job)
+    await db.commit()
+    worker_pool.wake()
+    return job
+
+
+async def queue_depth(db: AsyncSession) -> Dict[str, int]:
+    """Количество заданий по статусам."""
+    result = await db.execute(select(Job.status, func.count(Job.id)).group_by(Job.status))
+    depth = {s.value: 0 for s in JobStatus}
+    for status, count in result.all():
+        depth[status.value] = count
+    return depth
+
+
+async def _claim_next() -> Optional[Job]:
+    """Забирает одно готовое к выполнению задание (или брошенное упавшим воркером)."""
+    now = datetime.now(timezone.utc)
+    lease_cutoff = now - timedelta(seconds=JOB_LEASE_SECONDS)
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(Job)
+            .where(or_(
+                (Job.status == JobStatus.QUEUED) & (Job.run_after <= now),
+                (Job.status == JobStatus.RUNNING) & (Job.started_at < lease_cutoff),
+            ))
+            .order_by(Job.id)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        )
+        job = result.scalar_one_or_none()
+        if job is None:
+            return None
+        # Условный UPDATE защищает от двойного захвата там, где SKIP LOCKED не поддерживается
+        claimed = await db.execute(
+            update(Job)
+            .where((Job.id == job.id) & (Job.status == job.status) & (Job.attempts == job.attempts))
+            .values(status=JobStatus.RUNNING, attempts=Job.attempts + 1, started_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        if claimed.rowcount != 1:
+            return None
+        job.status = JobStatus.RUNNING
+        job.attempts += 1
+        job.started_at = now
+        return job
+
+
+async def _finish(job_id: int, result: Any = None, error: Optional[str] = None) -> bool:
+    """Сохраняет итог выполнения. Возвращает True, если задание будет повторено."""
+    now = datetime.now(timezone.utc)
+    async with AsyncSessionLocal() as db:
+        job = await db.get(Job, job_id)
+        if job is None:
+            return False
+        retry = False
+        if error is None:
+            job.status = JobStatus.SUCCEEDED
+            job.result = result
+            job.last_error = None
+            job.finished_at = now
+        elif job.attempts < job.max_attempts:
+            job.status = JobStatus.QUEUED
+            job.last_error = error
+            job.run_after = now + timedelta(seconds=JOB_RETRY_DELAY_SECONDS * job.attempts)
+            retry = True
+        else:
+            job.status = JobStatus.FAILED
+            job.last_error = error
+            job.finished_at = now
+        await db.commit()
+        return retry
+
+
+def _init_process() -> None:
+    # Соединения пула, унаследованные от родителя при fork, использовать нельзя
+    engine.sync_engine.dispose(close=False)
+    if read_engine is not None:
+        read_engine.sync_engine.dispose(close=False)
+    import job_handlers  # noqa: F401  регистрация обработчиков при spawn
+
+
+def _run_in_process(kind: str, payload: Dict[str, Any]) -> Any:
+    async def run():
+        try:
+            return await _HANDLERS[kind](payload)
+        finally:
+            await dispose_engines()
+    return asyncio.run(run())
+
+
+class JobWorkerPool:
+    """Пул воркеров, разбирающих очередь заданий."""
+
+    def __init__(
+        self,
+        workers: int = JOB_WORKERS,
+        mode: str = JOB_WORKER_MODE,
+        poll_interval: float = JOB_POLL_INTERVAL,
+    ):
+        if mode not in ("async", "process"):
+            raise ValueError("JOB_WORKER_MODE должен быть async или process")
+        self.workers = workers
+        self.mode = mode
+        self.poll_interval = poll_interval
+        self._tasks: list = []
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+        self._started_at: Optional[float] = None
+        self.succeeded = 0
+        self.failed = 0
+        self.retried = 0
+        self.running = 0
+
+    def start(self) -> None:
+        if self.workers <= 0 or self._tasks:
+            return
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._started_at = time.monotonic()
+        if self.mode == "process":
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_process)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        log.info(
+            "Пул фоновых заданий запущен: %s воркеров, режим %s", self.workers, self.mode,
+            extra={"fields": {"workers": self.workers, "mode": self.mode}},
+        )
+
+    async def stop(self) -> None:
+        self._stopping = True
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def wake(self) -> None:
+        """Будит простаивающих воркеров (задание поставлено в этом же процессе)."""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _execute(self, job: Job) -> Any:
+        handler = _HANDLERS.get(job.kind)
+        if handler is None:
+            raise LookupError(f"Неизвестный тип задания: {job.kind}")
+        if self._executor is not None:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, _run_in_process, job.kind, job.payload or {})
+        return await handler(job.payload or {})
+
+    async def _worker(self) -> None:
+        while not self._stopping:
+            try:
+                job = await _claim_next()
+            except Exception as e:
+                log.exception("Ошибка при выборке задания: %s", e)
+                job = None
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            self.running += 1
+            token = job_id_var.set(job.id)
+            started = time.monotonic()
+            try:
+                result = await self._execute(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                retry = await _finish(job.id, error=f"{type(e).__name__}: {e}")
+                log.warning(
+                    "Задание %s завершилось ошибкой", job.kind, exc_info=True,
+                    extra={"fields": {"kind": job.kind, "attempt": job.attempts, "retry": retry}},
+                )
+                if retry:
+                    self.retried += 1
+                else:
+                    self.failed += 1
+            else:
+                await _finish(job.id, result=result)
+                self.succeeded += 1
+                log.info(
+                    "Задание %s выполнено", job.kind,
+                    extra={"fields": {"kind": job.kind, "duration_ms": round((time.monotonic() - started) * 1000, 1)}},
+                )
+            finally:
+                self.running -= 1
+                job_id_var.reset(token)
+
+    def stats(self) -> Dict[str, Any]:
+        uptime = time.monotonic() - self._started_at if self._started_at else 0.0
+        return {
+            "workers": self.workers if self._tasks else 0,
+            "mode": self.mode,
+            "running": self.running,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "retried": self.retried,
+            "uptime_seconds": round(uptime, 1),
+            "jobs_per_second": round(self.succeeded / uptime, 3) if uptime > 0 else 0.0,
+        }
+
+
+# Пул текущего процесса (запускается в lifespan приложения)
+worker_pool = JobWorkerPool()
+
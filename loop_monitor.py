@@ -0,0 +1,141 @@
+"""
+Мониторинг задержки event loop и поиск блокирующих вызовов.
+
+Корутина-пульс засыпает на LOOP_LAG_INTERVAL и измеряет, насколько позже она
+проснулась (задержка планирования). Отдельный поток-сторож проверяет, как давно
+был последний пульс: если дольше LOOP_BLOCK_THRESHOLD, значит loop занят
+синхронной работой, и сторож снимает стек потока event loop прямо во время
+блокировки (sys._current_frames) и пишет его в лог.
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from typing import Any, Dict, Optional
+
+from dotenv import load_dotenv
+
+from app_logging import get_logger
+
+load_dotenv()
+log = get_logger(__name__)
+
+LOOP_MONITOR_ENABLED = os.getenv("LOOP_MONITOR_ENABLED", "true").lower() in ("1", "true", "yes")
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.1"))
+LOOP_BLOCK_THRESHOLD = float(os.getenv("LOOP_BLOCK_THRESHOLD", "0.1"))
+# Не чаще одного стека за это время, чтобы не засорять лог при длительной перегрузке
+LOOP_STACK_COOLDOWN = float(os.getenv("LOOP_STACK_COOLDOWN", "10"))
+
+# Границы гистограммы задержек, мс
+LAG_BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000)
+
+
+class LoopLagMonitor:
+    """Измеряет задержку event loop и ловит стеки блокирующего кода."""
+
+    def __init__(
+        self,
+        interval: float = LOOP_LAG_INTERVAL,
+        threshold: float = LOOP_BLOCK_THRESHOLD,
+        cooldown: float = LOOP_STACK_COOLDOWN,
+    ):
+        self.interval = interval
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._loop_thread_id: Optional[int] = None
+        self._last_tick = 0.0
+        self._stall_reported = False
+        self._last_stack_at = 0.0
+        self.samples = 0
+        self.last_lag_ms = 0.0
+        self.max_lag_ms = 0.0
+        self.total_lag_ms = 0.0
+        self.stalls = 0
+        self.histogram = {f"le_{b}ms": 0 for b in LAG_BUCKETS_MS}
+        self.histogram["inf"] = 0
+        self.last_stall: Optional[Dict[str, Any]] = None
+
+    def start(self) -> None:
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._last_tick = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._pulse())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def _record(self, lag_ms: float) -> None:
+        self.samples += 1
+        self.last_lag_ms = lag_ms
+        self.total_lag_ms += lag_ms
+        self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+        for bound in LAG_BUCKETS_MS:
+            if lag_ms <= bound:
+                self.histogram[f"le_{bound}ms"] += 1
+                break
+        else:
+            self.histogram["inf"] += 1
+
+    async def _pulse(self) -> None:
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._record(max(0.0, (now - started - self.interval) * 1000))
+            self._last_tick = now
+            self._stall_reported = False
+
+    def _watch(self) -> None:
+        check_every = max(self.threshold / 2, 0.01)
+        while not self._stop.wait(check_every):
+            blocked_for = time.monotonic() - self._last_tick - self.interval
+            if blocked_for < self.threshold or self._stall_reported:
+                continue
+            # Одна блокировка — один отчет
+            self._stall_reported = True
+            self.stalls += 1
+            now = time.monotonic()
+            if now - self._last_stack_at < self.cooldown:
+                continue
+            self._last_stack_at = now
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else ""
+            self.last_stall = {
+                "blocked_ms": round(blocked_for * 1000, 1),
+                "detected_at": time.time(),
+                "stack": stack,
+            }
+            log.warning(
+                "Event loop заблокирован дольше порога",
+                extra={"fields": {"blocked_ms": self.last_stall["blocked_ms"], "stack": stack}},
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "interval_ms": self.interval * 1000,
+            "threshold_ms": self.threshold * 1000,
+            "samples": self.samples,
+            "last_lag_ms": round(self.last_lag_ms, 2),
+            "avg_lag_ms": round(self.total_lag_ms / self.samples, 2) if self.samples else 0.0,
+            "max_lag_ms": round(self.max_lag_ms, 2),
+            "stalls": self.stalls,
+            "histogram": dict(self.histogram),
+            "last_stall": self.last_stall,
+        }
+
+
+# Монитор текущего процесса (запускается в lifespan приложения)
+loop_monitor = LoopLagMonitor()
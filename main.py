@@ -1,27 +1,44 @@
+import asyncio
 from fastapi import FastAPI, Depends
 from contextlib import asynccontextmanager
 from database import init_db, get_async_session
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, text
-from routers import tasks, stats, auth, admin
-from scheduler import start_scheduler
+from routers import tasks, stats, auth, admin, recurrences, dashboard, jobs as jobs_router
+from scheduler import lead_scheduler
+from jobs import worker_pool
+from sharding import shard_router
+from profiling import PROFILING_ENABLED, ProfilingMiddleware
+from loop_monitor import LOOP_MONITOR_ENABLED, loop_monitor
+from app_logging import get_logger, RequestContextMiddleware
+import job_handlers  # noqa: F401  регистрация обработчиков фоновых заданий
+
+log = get_logger(__name__)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Код ДО yield выполняется при ЗАПУСКЕ
-    print(" Запуск приложения...")
-    print(" Инициализация базы данных...")
+    log.info("Запуск приложения...")
+    # Мониторинг задержки event loop (поиск блокирующих вызовов)
+    if LOOP_MONITOR_ENABLED:
+        loop_monitor.start()
+    log.info("Инициализация базы данных...")
     # Создаем таблицы (если их нет)
     await init_db()
-    # Запускаем планировщик задач (обновление срочности)
-    try:
-        start_scheduler()
-    except Exception as e:
-        print(f"Не удалось запустить планировщик: {e}")
-    print(" Приложение готово к работе!")
+    # Дополнительные шарды (SHARD_DATABASE_URLS)
+    await shard_router.init_shards()
+    # Планировщик задач (обновление срочности и др.) — только в одном из воркеров
+    scheduler_task = asyncio.create_task(lead_scheduler())
+    # Запускаем пул фоновых заданий (JOB_WORKERS=0 — задания выполняет worker.py)
+    worker_pool.start()
+    log.info("Приложение готово к работе!")
     yield # Здесь приложение работает
     # Код ПОСЛЕ yield выполняется при ОСТАНОВКЕ
-    print(" Остановка приложения...")
+    log.info("Остановка приложения...")
+    scheduler_task.cancel()
+    await asyncio.gather(scheduler_task, return_exceptions=True)
+    await worker_pool.stop()
+    await loop_monitor.stop()
 app = FastAPI(
     title="ToDo лист API",
     description="API для управления задачами с использованием матрицы Эйзенхауэра",
@@ -32,16 +49,27 @@ app = FastAPI(
     lifespan=lifespan # Подключаем lifespan
 )
 
+# Профилирование запросов по требованию; при выключенном флаге middleware не подключается
+if PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
+# id запроса для логов (X-Request-ID); добавляется последним, чтобы быть внешним слоем
+app.add_middleware(RequestContextMiddleware)
 
 app.include_router(tasks.router, prefix="/api/v3") # подключение роутера к приложению
 app.include_router(stats.router, prefix="/api/v3") # подключение роутера к приложению
 app.include_router(auth.router, prefix="/api/v3")  # роутер аутентификации
+app.include_router(jobs_router.router, prefix="/api/v3")  # фоновые задания
+app.include_router(recurrences.router, prefix="/api/v3")  # повторяющиеся задачи
+app.include_router(dashboard.router, prefix="/api/v3")  # главный экран одним запросом
 
 # Backwards-compatible v2 endpoints (needed by consumers expecting /api/v2)
 app.include_router(tasks.router, prefix="/api/v2")
 app.include_router(stats.router, prefix="/api/v2")
 app.include_router(auth.router, prefix="/api/v2")
 app.include_router(admin.router, prefix="/api/v2")
+app.include_router(jobs_router.router, prefix="/api/v2")
+app.include_router(recurrences.router, prefix="/api/v2")
+app.include_router(dashboard.router, prefix="/api/v2")
 
 
 @app.get("/")
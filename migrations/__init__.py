@@ -0,0 +1,14 @@
+"""
+Версионные миграции схемы БД.
+
+    python -m migrations                 # применить все новые версии на всех базах
+    python -m migrations --target 4      # применить версии до 0004 включительно
+    python -m migrations status          # примененные и ожидающие версии
+
+Версия — модуль migrations/versions/NNNN_<описание>.py с функцией
+`async def upgrade(ctx: MigrationContext)`; номер берется из имени файла.
+Операции ctx (см. runner.py) не блокируют работу приложения.
+"""
+from .runner import MigrationContext, load_migrations, status, upgrade
+
+__all__ = ["MigrationContext", "load_migrations", "status", "upgrade"]
@@ -0,0 +1,36 @@
+"""
+Запуск миграций: python -m migrations [status] [--target N]
+"""
+import argparse
+import asyncio
+
+from database import dispose_engines
+from .runner import status, upgrade
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m migrations")
+    parser.add_argument("command", nargs="?", choices=("upgrade", "status"), default="upgrade")
+    parser.add_argument("--target", type=int, default=None, help="применить версии до этой включительно")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "status":
+            for row in await status():
+                state = f"применена {row['applied_at']}" if row["applied_at"] is not None else "ожидает"
+                print(f"шард {row['shard']}  {row['name']:<32} {state}")
+            return
+
+        for shard, done in (await upgrade(args.target)).items():
+            if done:
+                for name in done:
+                    print(f"✓ шард {shard}: {name}")
+            else:
+                print(f"✓ шард {shard}: схема актуальна")
+        print("\n✓ Миграции применены")
+    finally:
+        await dispose_engines()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
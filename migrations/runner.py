@@ -0,0 +1,323 @@
+"""
+Применение версий схемы (migrations/versions/NNNN_*.py) на всех базах (шардах).
+
+Примененные версии хранятся в таблице schema_migrations каждой базы; версия
+записывается после успешного upgrade(ctx), поэтому прерванная миграция повторяется
+целиком — шаги версий идемпотентны (IF NOT EXISTS, проверка колонок).
+
+Чтобы миграция не останавливала работу приложения:
+- индексы строятся CREATE INDEX CONCURRENTLY вне транзакции (PostgreSQL); недостроенный
+  (INVALID) индекс после сбоя удаляется и строится заново;
+- DDL выполняется с lock_timeout = MIGRATION_LOCK_TIMEOUT_MS: ALTER не ждет в очереди
+  за долгой транзакцией, блокируя всех за собой, а повторяется до MIGRATION_DDL_RETRIES раз;
+- новые колонки добавляются без DEFAULT (без переписывания таблицы), а заполняются
+  пачками по MIGRATION_BATCH_SIZE строк, каждая пачка — короткая транзакция, между
+  пачками пауза MIGRATION_BATCH_PAUSE_SECONDS.
+Одновременный запуск двух раннеров исключается advisory lock (PostgreSQL).
+"""
+import asyncio
+import importlib
+import os
+import pkgutil
+import time
+from types import ModuleType
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import BigInteger, Column, DateTime, Integer, MetaData, String, Table, func, inspect, select, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.types import TypeEngine
+
+from database import Base, column_exists, create_index
+from sharding import shard_router
+from app_logging import get_logger
+from . import versions
+
+load_dotenv()
+log = get_logger(__name__)
+
+MIGRATION_BATCH_SIZE = int(os.getenv("MIGRATION_BATCH_SIZE", "1000"))
+MIGRATION_BATCH_PAUSE_SECONDS = float(os.getenv("MIGRATION_BATCH_PAUSE_SECONDS", "0.05"))
+MIGRATION_LOCK_TIMEOUT_MS = int(os.getenv("MIGRATION_LOCK_TIMEOUT_MS", "3000"))
+MIGRATION_DDL_RETRIES = int(os.getenv("MIGRATION_DDL_RETRIES", "5"))
+# Ключ pg_advisory_lock раннера
+ADVISORY_LOCK_KEY = 7_310_049
+
+# Таблица учета версий — вне Base.metadata: init_db ее не создает
+schema_migrations = Table(
+    "schema_migrations",
+    MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("name", String(200), nullable=False),
+    Column("applied_at", DateTime(timezone=True), server_default=func.now(), nullable=False),
+    Column("duration_ms", Integer, nullable=False),
+)
+
+# Значения, запомненные миграцией при первом запуске (см. MigrationContext.remember)
+schema_migration_marks = Table(
+    "schema_migration_marks",
+    MetaData(),
+    Column("name", String(200), primary_key=True),
+    Column("value", BigInteger, nullable=False),
+)
+
+
+def _is_lock_timeout(error: DBAPIError) -> bool:
+    code = getattr(error.orig, "sqlstate", None) or getattr(error.orig, "pgcode", None)
+    return code == "55P03" or "lock timeout" in str(error.orig).lower()
+
+
+class MigrationContext:
+    """Операции со схемой, безопасные для работающего приложения. Передается в upgrade(ctx)."""
+
+    def __init__(self, engine: AsyncEngine, shard: int):
+        self.engine = engine
+        self.shard = shard
+
+    @property
+    def dialect(self) -> str:
+        return self.engine.dialect.name
+
+    async def table_exists(self, table: str) -> bool:
+        async with self.engine.connect() as conn:
+            return await conn.run_sync(lambda sync_conn: inspect(sync_conn).has_table(table))
+
+    async def column_exists(self, table: str, column: str) -> bool:
+        async with self.engine.connect() as conn:
+            return await column_exists(conn, table, column)
+
+    async def index_definition(self, name: str) -> Optional[str]:
+        async with self.engine.connect() as conn:
+            if self.dialect == "sqlite":
+                query = "SELECT sql FROM sqlite_master WHERE type = 'index' AND name = :name"
+            else:
+                query = "SELECT indexdef FROM pg_indexes WHERE indexname = :name"
+            return (await conn.execute(text(query), {"name": name})).scalar()
+
+    async def scalar(self, sql: str, params: Optional[Dict[str, Any]] = None) -> Any:
+        async with self.engine.connect() as conn:
+            return (await conn.execute(text(sql), params or {})).scalar()
+
+    async def remember(self, name: str, value: int) -> None:
+        """
+        Сохраняет значение (например, наибольший id до изменения схемы): прерванная
+        миграция при повторе получит его через recall, а не вычислит заново.
+        """
+        async with self.engine.begin() as conn:
+            await conn.run_sync(schema_migration_marks.create, checkfirst=True)
+            await conn.execute(schema_migration_marks.delete().where(schema_migration_marks.c.name == name))
+            await conn.execute(schema_migration_marks.insert().values(name=name, value=value))
+
+    async def recall(self, name: str) -> Optional[int]:
+        """Значение, сохраненное remember; None — не сохранялось."""
+        async with self.engine.begin() as conn:
+            await conn.run_sync(schema_migration_marks.create, checkfirst=True)
+            return (await conn.execute(
+                select(schema_migration_marks.c.value).where(schema_migration_marks.c.name == name)
+            )).scalar()
+
+    async def execute(self, sql: str, params: Optional[Dict[str, Any]] = None) -> None:
+        """DDL в отдельной транзакции с lock_timeout; при таймауте блокировки — повтор."""
+        for attempt in range(1, MIGRATION_DDL_RETRIES + 1):
+            try:
+                async with self.engine.begin() as conn:
+                    if self.dialect == "postgresql":
+                        await conn.execute(text(f"SET LOCAL lock_timeout = {MIGRATION_LOCK_TIMEOUT_MS}"))
+                    await conn.execute(text(sql), params or {})
+                return
+            except DBAPIError as e:
+                if attempt == MIGRATION_DDL_RETRIES or not _is_lock_timeout(e):
+                    raise
+                log.warning(
+                    "Таблица занята, повтор DDL (%s/%s)", attempt, MIGRATION_DDL_RETRIES,
+                    extra={"fields": {"shard": self.shard, "sql": sql}},
+                )
+                await asyncio.sleep(attempt)
+
+    async def create_tables(self, *models: Any) -> List[str]:
+        """Создает таблицы моделей, которых еще нет. Возвращает имена созданных."""
+        created = [model.__tablename__ for model in models if not await self.table_exists(model.__tablename__)]
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all, tables=[model.__table__ for model in models])
+        return created
+
+    async def add_column(self, table: str, column: str, type_: TypeEngine, extra: str = "") -> bool:
+        """ALTER TABLE ADD COLUMN без DEFAULT (таблица не переписывается). False — колонка уже есть."""
+        if await self.column_exists(table, column):
+            return False
+        ddl_type = type_.compile(dialect=self.engine.dialect)
+        await self.execute(f"ALTER TABLE {table} ADD COLUMN {column} {ddl_type} {extra}".rstrip())
+        return True
+
+    async def create_index(self, name: str, definition: str, unique: bool = False) -> None:
+        """CREATE [UNIQUE] INDEX CONCURRENTLY IF NOT EXISTS; недостроенный после сбоя индекс пересоздается."""
+        if self.dialect == "postgresql":
+            async with self.engine.connect() as conn:
+                invalid = (await conn.execute(text(
+                    "SELECT NOT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                    "WHERE c.relname = :name"
+                ), {"name": name})).scalar()
+            if invalid:
+                await self.drop_index(name)
+        await create_index(name, definition, self.engine, unique=unique)
+
+    async def drop_index(self, name: str) -> None:
+        concurrently = "" if self.dialect == "sqlite" else "CONCURRENTLY "
+        async with self.engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            await conn.execute(text(f"DROP INDEX {concurrently}IF EXISTS {name}"))
+
+    async def rebuild_index(self, name: str, definition: str) -> None:
+        """
+        Заменяет индекс новым определением. В PostgreSQL новый индекс строится рядом
+        со старым, затем подменяется: выборки не остаются без индекса.
+        """
+        if self.dialect == "sqlite":
+            await self.drop_index(name)
+            await self.create_index(name, definition)
+            return
+        await self.create_index(f"{name}_new", definition)
+        await self.drop_index(name)
+        await self.execute(f"ALTER INDEX {name}_new RENAME TO {name}")
+
+    async def backfill(self, table: str, assignments: str, condition: str, params: Optional[Dict[str, Any]] = None) -> int:
+        """
+        UPDATE table SET assignments WHERE condition — пачками по MIGRATION_BATCH_SIZE строк.
+        После обновления строка не должна подходить под condition (иначе цикл не закончится).
+        """
+        sql = text(
+            f"UPDATE {table} SET {assignments} WHERE id IN "
+            f"(SELECT id FROM {table} WHERE {condition} ORDER BY id LIMIT :batch_size)"
+        )
+        total = 0
+        started = time.perf_counter()
+        while True:
+            async with self.engine.begin() as conn:
+                result = await conn.execute(sql, {**(params or {}), "batch_size": MIGRATION_BATCH_SIZE})
+            count = result.rowcount or 0
+            total += count
+            if count < MIGRATION_BATCH_SIZE:
+                break
+            log.info(
+                "Заполнение %s: %s строк", table, total,
+                extra={"fields": {"shard": self.shard, "table": table, "rows": total}},
+            )
+            # Даем пройти запросам приложения
+            await asyncio.sleep(MIGRATION_BATCH_PAUSE_SECONDS)
+        log.info(
+            "Заполнение %s завершено: %s строк", table, total,
+            extra={"fields": {"shard": self.shard, "rows": total, "duration_seconds": round(time.perf_counter() - started, 3)}},
+        )
+        return total
+
+
+def version_of(module: ModuleType) -> int:
+    return int(module.__name__.rsplit(".", 1)[-1].split("_", 1)[0])
+
+
+def name_of(module: ModuleType) -> str:
+    return module.__name__.rsplit(".", 1)[-1]
+
+
+def load_migrations() -> List[ModuleType]:
+    """Модули versions/NNNN_*.py по возрастанию версии."""
+    modules = [
+        importlib.import_module(f"{versions.__name__}.{info.name}")
+        for info in pkgutil.iter_modules(versions.__path__)
+        if info.name[:4].isdigit()
+    ]
+    modules.sort(key=version_of)
+    seen = [version_of(module) for module in modules]
+    if len(seen) != len(set(seen)):
+        raise RuntimeError(f"Повторяющиеся номера версий миграций: {seen}")
+    return modules
+
+
+async def applied_versions(engine: AsyncEngine) -> Dict[int, Any]:
+    async with engine.begin() as conn:
+        await conn.run_sync(schema_migrations.create, checkfirst=True)
+        rows = (await conn.execute(select(schema_migrations))).all()
+    return {row.version: row for row in rows}
+
+
+async def _acquire_lock(engine: AsyncEngine):
+    """Advisory lock на время миграции (PostgreSQL). Возвращает соединение, держащее блокировку."""
+    if engine.dialect.name != "postgresql":
+        return None
+    conn = await engine.connect()
+    conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+    locked = (await conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": ADVISORY_LOCK_KEY})).scalar()
+    if not locked:
+        await conn.close()
+        raise RuntimeError("Миграции уже выполняются другим процессом")
+    return conn
+
+
+async def _release_lock(conn) -> None:
+    # Блокировка сессионная: без unlock она осталась бы на соединении в пуле
+    await conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": ADVISORY_LOCK_KEY})
+    await conn.close()
+
+
+async def _apply(module: ModuleType, ctx: MigrationContext) -> None:
+    version = version_of(module)
+    log.info("Миграция %s", name_of(module), extra={"fields": {"shard": ctx.shard, "version": version}})
+    started = time.perf_counter()
+    await module.upgrade(ctx)
+    duration_ms = int((time.perf_counter() - started) * 1000)
+    async with ctx.engine.begin() as conn:
+        await conn.execute(schema_migrations.insert().values(
+            version=version, name=name_of(module), duration_ms=duration_ms,
+        ))
+    log.info(
+        "Миграция %s применена", name_of(module),
+        extra={"fields": {"shard": ctx.shard, "version": version, "duration_ms": duration_ms}},
+    )
+
+
+async def upgrade(target: Optional[int] = None) -> Dict[int, List[str]]:
+    """
+    Применяет миграции (до target включительно) на всех базах: основной и шардах
+    (SHARD_DATABASE_URLS). Версия применяется на всех базах до перехода к следующей:
+    миграции, переносящие данные между шардами, видят везде схему своей версии.
+    Возвращает примененные версии по шардам.
+    """
+    engines = shard_router.engines
+    locks = []
+    try:
+        for engine in engines:
+            locks.append(await _acquire_lock(engine))
+        applied = [await applied_versions(engine) for engine in engines]
+        contexts = [MigrationContext(engine, shard) for shard, engine in enumerate(engines)]
+        done: Dict[int, List[str]] = {ctx.shard: [] for ctx in contexts}
+        for module in load_migrations():
+            version = version_of(module)
+            if target is not None and version > target:
+                break
+            for ctx in contexts:
+                if version not in applied[ctx.shard]:
+                    await _apply(module, ctx)
+                    done[ctx.shard].append(name_of(module))
+        return done
+    finally:
+        for lock in locks:
+            if lock is not None:
+                await _release_lock(lock)
+
+
+async def status() -> List[Dict[str, Any]]:
+    """Версии и их состояние на каждой базе."""
+    modules = load_migrations()
+    report = []
+    for shard, engine in enumerate(shard_router.engines):
+        applied = await applied_versions(engine)
+        for module in modules:
+            row = applied.get(version_of(module))
+            report.append({
+                "shard": shard,
+                "version": version_of(module),
+                "name": name_of(module),
+                "applied_at": row.applied_at if row is not None else None,
+            })
+    return report
@@ -0,0 +1,9 @@
+"""Исходные таблицы (создаются только отсутствующие)."""
+from database import Base
+from migrations.runner import MigrationContext
+
+
+async def upgrade(ctx: MigrationContext) -> None:
+    # Как init_db при старте приложения: существующие таблицы не меняются
+    async with ctx.engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
@@ -0,0 +1,26 @@
+"""
+Колонка tasks.deadline_at; задачам, существовавшим до миграции, — дедлайн через 7 дней.
+
+Заполняются только задачи с id не больше наибольшего id на момент добавления колонки
+(запоминается до ALTER): задачи, созданные после, могут законно не иметь дедлайна.
+Прерванная миграция при повторе продолжает заполнение с тем же порогом. Если колонка
+уже была (новая база — ее создает 0001), порога нет и заполнять нечего.
+"""
+from sqlalchemy import DateTime
+
+from migrations.runner import MigrationContext
+
+LAST_TASK_ID_MARK = "0002_add_deadline.last_task_id"
+
+
+async def upgrade(ctx: MigrationContext) -> None:
+    # Раньше: ADD COLUMN ... DEFAULT (NOW() + 7 days) NOT NULL — переписывание всей таблицы
+    # под эксклюзивной блокировкой. Теперь колонка добавляется мгновенно, а заполняется пачками.
+    if not await ctx.column_exists("tasks", "deadline_at"):
+        await ctx.remember(LAST_TASK_ID_MARK, await ctx.scalar("SELECT COALESCE(MAX(id), 0) FROM tasks"))
+        await ctx.add_column("tasks", "deadline_at", DateTime(timezone=True))
+    last_id = await ctx.recall(LAST_TASK_ID_MARK)
+    if last_id is None:
+        return
+    interval = "datetime('now', '+7 days')" if ctx.dialect == "sqlite" else "NOW() + INTERVAL '7 days'"
+    await ctx.backfill("tasks", f"deadline_at = {interval}", "deadline_at IS NULL AND id <= :last_id", {"last_id": last_id})
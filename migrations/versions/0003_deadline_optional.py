@@ -0,0 +1,16 @@
+"""Дедлайн необязателен: tasks.deadline_at допускает NULL."""
+from sqlalchemy import inspect
+
+from migrations.runner import MigrationContext
+
+
+async def upgrade(ctx: MigrationContext) -> None:
+    if ctx.dialect == "sqlite":
+        # В SQLite колонка добавляется сразу nullable (0002)
+        return
+    async with ctx.engine.connect() as conn:
+        columns = await conn.run_sync(lambda sync_conn: inspect(sync_conn).get_columns("tasks"))
+    if next(c for c in columns if c["name"] == "deadline_at")["nullable"]:
+        return
+    # DROP NOT NULL меняет только метаданные, таблица не сканируется
+    await ctx.execute("ALTER TABLE tasks ALTER COLUMN deadline_at DROP NOT NULL")
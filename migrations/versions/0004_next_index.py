@@ -0,0 +1,6 @@
+"""Индекс ix_tasks_user_next для /tasks/next."""
+from migrations.runner import MigrationContext
+
+
+async def upgrade(ctx: MigrationContext) -> None:
+    await ctx.create_index("ix_tasks_user_next", "ON tasks (user_id, completed, quadrant, deadline_at, id)")
@@ -0,0 +1,15 @@
+"""Повторяющиеся задачи: таблица task_recurrences и колонка tasks.recurrence_id."""
+from sqlalchemy import Integer
+
+from models import TaskRecurrence
+from migrations.runner import MigrationContext
+
+
+async def upgrade(ctx: MigrationContext) -> None:
+    await ctx.create_tables(TaskRecurrence)
+    # Колонка без значения по умолчанию: ALTER не переписывает таблицу
+    await ctx.add_column(
+        "tasks", "recurrence_id", Integer(),
+        "REFERENCES task_recurrences(id) ON DELETE SET NULL",
+    )
+    await ctx.create_index("ix_tasks_recurrence_id", "ON tasks (recurrence_id)")
@@ -0,0 +1,8 @@
+"""Архив завершенных задач: таблица tasks_archive и индекс кандидатов на перенос."""
+from models import TaskArchive
+from migrations.runner import MigrationContext
+
+
+async def upgrade(ctx: MigrationContext) -> None:
+    await ctx.create_tables(TaskArchive)
+    await ctx.create_index("ix_tasks_archivable", "ON tasks (completed_at) WHERE completed")
@@ -0,0 +1,19 @@
+"""Счетчики для /stats/analytics: таблица task_rollups и начальное заполнение."""
+from sqlalchemy import select
+
+from database import make_sessionmaker
+from models import Task, TaskRollup
+from rollups import rebuild_shard
+from migrations.runner import MigrationContext
+
+
+async def upgrade(ctx: MigrationContext) -> None:
+    await ctx.create_tables(TaskRollup)
+    async with make_sessionmaker(ctx.engine)() as session:
+        # Таблица могла быть создана пустой (0001 или init_db) — заполняем, если есть задачи
+        has_rollups = (await session.execute(select(TaskRollup.user_id).limit(1))).first() is not None
+        has_tasks = (await session.execute(
+            select(Task.id).limit(1).execution_options(include_deleted=True)
+        )).first() is not None
+        if has_tasks and not has_rollups:
+            await rebuild_shard(session)
@@ -0,0 +1,12 @@
+"""Составные индексы для фильтров и сортировки GET /tasks/."""
+from migrations.runner import MigrationContext
+
+INDEXES = {
+    "ix_tasks_user_deadline": "ON tasks (user_id, deadline_at, id)",
+    "ix_tasks_user_created": "ON tasks (user_id, created_at, id)",
+}
+
+
+async def upgrade(ctx: MigrationContext) -> None:
+    for name, definition in INDEXES.items():
+        await ctx.create_index(name, definition)
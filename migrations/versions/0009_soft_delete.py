@@ -0,0 +1,21 @@
+"""Корзина: колонка tasks.deleted_at и частичные индексы без удаленных задач."""
+from sqlalchemy import DateTime
+
+from migrations.runner import MigrationContext
+
+# Индексы выборок пересоздаются частичными: строки корзины в них не попадают
+PARTIAL_INDEXES = {
+    "ix_tasks_user_next": "ON tasks (user_id, completed, quadrant, deadline_at, id) WHERE deleted_at IS NULL",
+    "ix_tasks_user_deadline": "ON tasks (user_id, deadline_at, id) WHERE deleted_at IS NULL",
+    "ix_tasks_user_created": "ON tasks (user_id, created_at, id) WHERE deleted_at IS NULL",
+    "ix_tasks_archivable": "ON tasks (completed_at) WHERE completed AND deleted_at IS NULL",
+}
+
+
+async def upgrade(ctx: MigrationContext) -> None:
+    await ctx.add_column("tasks", "deleted_at", DateTime(timezone=True))
+    for name, definition in PARTIAL_INDEXES.items():
+        current = await ctx.index_definition(name)
+        if current is None or "deleted_at" not in current:
+            await ctx.rebuild_index(name, definition)
+    await ctx.create_index("ix_tasks_trash", "ON tasks (user_id, deleted_at) WHERE deleted_at IS NOT NULL")
@@ -0,0 +1,14 @@
+"""Индексы выборок по квадранту и по статусу с дедлайном (без задач в корзине)."""
+from migrations.runner import MigrationContext
+
+INDEXES = {
+    # GET /tasks/quadrant/{quadrant}, фильтр quadrant= в GET /tasks/
+    "ix_tasks_user_quadrant": "ON tasks (user_id, quadrant) WHERE deleted_at IS NULL",
+    # GET /tasks/status/{status}, /stats/timing, /stats/deadlines
+    "ix_tasks_user_completed_deadline": "ON tasks (user_id, completed, deadline_at) WHERE deleted_at IS NULL",
+}
+
+
+async def upgrade(ctx: MigrationContext) -> None:
+    for name, definition in INDEXES.items():
+        await ctx.create_index(name, definition)
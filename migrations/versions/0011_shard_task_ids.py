@@ -0,0 +1,82 @@
+"""
+Уникальные во всех шардах id задач (см. sharding.py).
+
+PostgreSQL: последовательность tasks_id_seq шарда k получает шаг SHARD_ID_STRIDE и
+следующее значение k+1 (по модулю шага) выше наибольшего id на всех шардах —
+последовательность не сдвигается назад и не выдает id, занятые на другом шарде.
+
+SQLite: таблица tasks пересоздается с AUTOINCREMENT (иначе id удаленных задач
+выдаются повторно), а значение в sqlite_sequence поднимается до начала диапазона
+шарда k * SQLITE_SHARD_ID_SPAN. Задачи шарда k > 0, созданные до миграции,
+получают id из своего диапазона (id + k * SQLITE_SHARD_ID_SPAN).
+"""
+from sqlalchemy import func, select, text
+
+from models import Task, TaskArchive
+from sharding import SHARD_ID_STRIDE, SQLITE_SHARD_ID_SPAN, shard_router
+from migrations.runner import MigrationContext
+
+
+async def _max_task_id(engine) -> int:
+    """Наибольший выданный id задачи на шарде (включая архив и саму последовательность)."""
+    async with engine.connect() as conn:
+        values = [
+            (await conn.execute(select(func.max(Task.id)))).scalar() or 0,
+            (await conn.execute(select(func.max(TaskArchive.id)))).scalar() or 0,
+        ]
+        if engine.dialect.name == "postgresql":
+            row = (await conn.execute(text(
+                "SELECT last_value, is_called FROM tasks_id_seq"
+            ))).first()
+            values.append(row.last_value if row.is_called else row.last_value - 1)
+    return max(values)
+
+
+async def _stride_sequence(ctx: MigrationContext) -> None:
+    used = max([await _max_task_id(engine) for engine in shard_router.engines])
+    # Наименьшее значение > used, сравнимое с shard + 1 по модулю шага
+    next_id = used + 1 + ((ctx.shard + 1 - (used + 1)) % SHARD_ID_STRIDE)
+    await ctx.execute(f"ALTER SEQUENCE tasks_id_seq INCREMENT BY {SHARD_ID_STRIDE}")
+    await ctx.execute("SELECT setval('tasks_id_seq', :value, false)", {"value": next_id})
+
+
+async def _sqlite_autoincrement(ctx: MigrationContext) -> None:
+    offset = ctx.shard * SQLITE_SHARD_ID_SPAN
+    columns = ", ".join(column.name for column in Task.__table__.columns)
+    async with ctx.engine.begin() as conn:
+        # engine.begin() открывает транзакцию явно (см. database._install_sqlite_pragmas):
+        # перенумерация и пересоздание таблицы — одна транзакция, прерванная миграция не оставит полутаблицу
+        await conn.execute(text("UPDATE tasks SET id = id + :offset WHERE id < :offset"), {"offset": offset})
+        await conn.execute(text("UPDATE tasks_archive SET id = id + :offset WHERE id < :offset"), {"offset": offset})
+        await conn.execute(text(
+            "UPDATE task_recurrences SET current_task_id = current_task_id + :offset WHERE current_task_id < :offset"
+        ), {"offset": offset})
+
+        table_sql = (await conn.execute(text(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'tasks'"
+        ))).scalar()
+        if "AUTOINCREMENT" not in table_sql.upper():
+            indexes = (await conn.execute(text(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'tasks' AND sql IS NOT NULL"
+            ))).scalars().all()
+            for name in indexes:
+                await conn.execute(text(f"DROP INDEX {name}"))
+            await conn.execute(text("ALTER TABLE tasks RENAME TO tasks_old"))
+            await conn.run_sync(Task.__table__.create)
+            await conn.execute(text(f"INSERT INTO tasks ({columns}) SELECT {columns} FROM tasks_old"))
+            await conn.execute(text("DROP TABLE tasks_old"))
+
+        # Следующий id: выше начала диапазона шарда и выше id архивированных задач
+        floor = max(offset, (await conn.execute(select(func.max(TaskArchive.id)))).scalar() or 0)
+        updated = await conn.execute(
+            text("UPDATE sqlite_sequence SET seq = MAX(seq, :floor) WHERE name = 'tasks'"), {"floor": floor}
+        )
+        if not updated.rowcount:
+            await conn.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES ('tasks', :floor)"), {"floor": floor})
+
+
+async def upgrade(ctx: MigrationContext) -> None:
+    if ctx.dialect == "postgresql":
+        await _stride_sequence(ctx)
+    else:
+        await _sqlite_autoincrement(ctx)
@@ -0,0 +1,128 @@
+"""
+Пользователи и их задачи на своих шардах (см. sharding.py).
+
+Применяется к каждому шарду s и "забирает" на него то, что относится к
+пользователям с user_id % N == s:
+- копии строк пользователей с основной базы (до миграции копии создавались только
+  при регистрации, а пользователи, существовавшие до SHARD_DATABASE_URLS, их не имели);
+- правила повторения, задачи, архив и дневные счетчики с других шардов.
+
+Перенос идет по одному пользователю: все его строки вставляются на шард s одной
+транзакцией, затем удаляются с исходного шарда. Повторный запуск после сбоя не
+создает дубликатов: задачи и архив переносятся с теми же id (уникальны во всех
+шардах после 0011), счетчики — по ключу (user_id, day), а правило повторения,
+уже перенесенное ранее, находится по (user_id, created_at, title, dtstart).
+id правил повторения на шардах свои, поэтому recurrence_id задач переназначается.
+"""
+from typing import Dict, List
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from database import dialect_insert
+from models import Task, TaskArchive, TaskRecurrence, TaskRollup, User
+from sharding import shard_router, shard_user_row
+from migrations.runner import MIGRATION_BATCH_SIZE, MigrationContext
+from app_logging import get_logger
+
+log = get_logger(__name__)
+
+# Таблицы с данными пользователя, кроме правил повторения (у них id переназначаются)
+USER_TABLES = (Task.__table__, TaskArchive.__table__, TaskRollup.__table__)
+
+
+async def _copy_users(ctx: MigrationContext) -> int:
+    """Копирует строки пользователей шарда с основной базы (пачками по id)."""
+    count, last_id = shard_router.count, 0
+    copied = 0
+    while True:
+        async with shard_router.engines[0].connect() as conn:
+            users = (await conn.execute(
+                select(User.__table__)
+                .where(User.id > last_id, User.id % count == ctx.shard)
+                .order_by(User.id)
+                .limit(MIGRATION_BATCH_SIZE)
+            )).all()
+        if not users:
+            return copied
+        async with ctx.engine.begin() as conn:
+            await conn.execute(
+                dialect_insert(conn, User.__table__).values([shard_user_row(user) for user in users]).on_conflict_do_nothing()
+            )
+        copied += len(users)
+        last_id = users[-1].id
+
+
+async def _misplaced_users(conn: AsyncConnection, shard: int) -> List[int]:
+    """Пользователи шарда shard, у которых есть данные на шарде conn."""
+    count = shard_router.count
+    user_ids = set()
+    for table in (TaskRecurrence.__table__, *USER_TABLES):
+        rows = await conn.execute(select(table.c.user_id).where(table.c.user_id % count == shard).distinct())
+        user_ids.update(rows.scalars())
+    return sorted(user_ids)
+
+
+async def _insert(conn: AsyncConnection, table, rows: List[dict]) -> None:
+    for start in range(0, len(rows), MIGRATION_BATCH_SIZE):
+        await conn.execute(dialect_insert(conn, table).values(rows[start:start + MIGRATION_BATCH_SIZE]).on_conflict_do_nothing())
+
+
+async def _move_user(source, target, user_id: int) -> None:
+    async with source.connect() as conn:
+        recurrences = (await conn.execute(
+            select(TaskRecurrence.__table__).where(TaskRecurrence.user_id == user_id)
+        )).mappings().all()
+        data = {
+            table: [dict(row) for row in (await conn.execute(
+                select(table).where(table.c.user_id == user_id)
+            )).mappings()]
+            for table in USER_TABLES
+        }
+
+    async with target.begin() as conn:
+        recurrence_ids: Dict[int, int] = {}
+        for recurrence in recurrences:
+            row = {key: value for key, value in recurrence.items() if key != "id"}
+            existing = (await conn.execute(select(TaskRecurrence.id).where(
+                TaskRecurrence.user_id == user_id,
+                TaskRecurrence.created_at == row["created_at"],
+                TaskRecurrence.title == row["title"],
+                TaskRecurrence.dtstart == row["dtstart"],
+            ))).scalar()
+            if existing is None:
+                existing = (await conn.execute(
+                    TaskRecurrence.__table__.insert().values(row).returning(TaskRecurrence.id)
+                )).scalar()
+            recurrence_ids[recurrence["id"]] = existing
+        for table, rows in data.items():
+            if "recurrence_id" in table.c:
+                for row in rows:
+                    row["recurrence_id"] = recurrence_ids.get(row["recurrence_id"])
+            await _insert(conn, table, rows)
+
+    async with source.begin() as conn:
+        # Сначала задачи: удаление правила иначе обнулило бы их recurrence_id
+        for table in USER_TABLES:
+            await conn.execute(delete(table).where(table.c.user_id == user_id))
+        await conn.execute(delete(TaskRecurrence).where(TaskRecurrence.user_id == user_id))
+
+
+async def upgrade(ctx: MigrationContext) -> None:
+    if not shard_router.enabled:
+        return
+    if ctx.shard != 0:
+        copied = await _copy_users(ctx)
+        log.info("Пользователи скопированы на шард", extra={"fields": {"shard": ctx.shard, "users": copied}})
+    for source_shard, source in enumerate(shard_router.engines):
+        if source_shard == ctx.shard:
+            continue
+        async with source.connect() as conn:
+            user_ids = await _misplaced_users(conn, ctx.shard)
+        for user_id in user_ids:
+            await _move_user(source, ctx.engine, user_id)
+        if user_ids:
+            log.info(
+                "Задачи перенесены с шарда %s на шард %s", source_shard, ctx.shard,
+                extra={"fields": {"shard": ctx.shard, "source_shard": source_shard, "users": len(user_ids)}},
+            )
@@ -0,0 +1,11 @@
+"""Аренда ключей идемпотентности: колонка idempotency_keys.locked_until."""
+from sqlalchemy import DateTime
+
+from models import IdempotencyKey
+from migrations.runner import MigrationContext
+
+
+async def upgrade(ctx: MigrationContext) -> None:
+    await ctx.create_tables(IdempotencyKey)
+    # NULL у ключей, захваченных до миграции: срок аренды считается от created_at
+    await ctx.add_column("idempotency_keys", "locked_until", DateTime(timezone=True))
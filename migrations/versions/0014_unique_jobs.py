@@ -0,0 +1,14 @@
+"""Атомарная уникальность заданий планировщика: колонка jobs.unique_kind и уникальный частичный индекс."""
+from sqlalchemy import String
+
+from migrations.runner import MigrationContext
+
+
+async def upgrade(ctx: MigrationContext) -> None:
+    # Существующие задания остаются с NULL: индекс строится без конфликтов с уже стоящими дубликатами
+    await ctx.add_column("jobs", "unique_kind", String(50))
+    await ctx.create_index(
+        "uq_jobs_unique_kind_active",
+        "ON jobs (unique_kind) WHERE status IN ('QUEUED', 'RUNNING')",
+        unique=True,
+    )
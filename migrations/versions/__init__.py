@@ -0,0 +1 @@
+"""Версии схемы: NNNN_<описание>.py, применяются по возрастанию номера."""
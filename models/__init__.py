@@ -1,4 +1,10 @@
 from .task import Task
 from .user import User, UserRole
+from .job import Job, JobStatus
+from .idempotency import IdempotencyKey
+from .recurrence import TaskRecurrence
+from .digest import DigestOutbox, DigestStatus
+from .archive import TaskArchive
+from .rollup import TaskRollup
 from database import Base
-__all__ = ["Base", "Task", "User", "UserRole"]
+__all__ = ["Base", "Task", "User", "UserRole", "Job", "JobStatus", "IdempotencyKey", "TaskRecurrence", "DigestOutbox", "DigestStatus", "TaskArchive", "TaskRollup"]
@@ -0,0 +1,78 @@
+from sqlalchemy import Column, Integer, String, Boolean, Text, ForeignKey, Index
+from sqlalchemy.sql import func
+from database import Base, UTCDateTime
+
+
+class TaskArchive(Base):
+    """
+    Архив завершенных задач. Колонки повторяют tasks: задачи переносятся с теми же id,
+    поэтому ссылки на задачу (например, в выгрузках) остаются действительными.
+    """
+    __tablename__ = "tasks_archive"
+
+    id = Column(
+        Integer,
+        primary_key=True,
+        autoincrement=False,
+    )
+    title = Column(
+        Text,
+        nullable=False,
+    )
+    description = Column(
+        Text,
+        nullable=True,
+    )
+    is_important = Column(
+        Boolean,
+        nullable=False,
+        default=False,
+    )
+    is_urgent = Column(
+        Boolean,
+        nullable=False,
+        default=False,
+    )
+    deadline_at = Column(
+        UTCDateTime,
+        nullable=True,
+    )
+    quadrant = Column(
+        String(2),
+        nullable=False,
+    )
+    completed = Column(
+        Boolean,
+        nullable=False,
+        default=True,
+    )
+    created_at = Column(
+        UTCDateTime,
+        nullable=False,
+    )
+    completed_at = Column(
+        UTCDateTime,
+        nullable=True,
+    )
+    user_id = Column(
+        Integer,
+        ForeignKey("users.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    recurrence_id = Column(
+        Integer,              # Без внешнего ключа: история остается после удаления правила
+        nullable=True,
+    )
+    archived_at = Column(
+        UTCDateTime,
+        server_default=func.now(),
+        nullable=False,
+    )
+
+    __table_args__ = (
+        # История пользователя: последние завершенные задачи
+        Index("ix_tasks_archive_user_completed", "user_id", "completed_at"),
+    )
+
+    def __repr__(self) -> str:
+        return f"<TaskArchive(id={self.id}, title='{self.title}', completed_at='{self.completed_at}')>"
@@ -0,0 +1,66 @@
+from sqlalchemy import Column, Integer, Date, Text, ForeignKey, JSON, Index, UniqueConstraint, Enum as SQLEnum
+from sqlalchemy.sql import func
+from database import Base, UTCDateTime
+import enum
+
+
+class DigestStatus(enum.Enum):
+    PENDING = "pending"
+    SENT = "sent"
+    FAILED = "failed"
+
+
+class DigestOutbox(Base):
+    """Готовые ежедневные дайджесты дедлайнов, ожидающие отправки (transactional outbox)."""
+    __tablename__ = "digest_outbox"
+
+    id = Column(
+        Integer,
+        primary_key=True,
+        autoincrement=True,
+    )
+    user_id = Column(
+        Integer,
+        ForeignKey("users.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    digest_date = Column(
+        Date,                 # Один дайджест на пользователя в день
+        nullable=False,
+    )
+    payload = Column(
+        JSON,
+        nullable=False,
+    )
+    status = Column(
+        SQLEnum(DigestStatus),
+        nullable=False,
+        default=DigestStatus.PENDING,
+    )
+    attempts = Column(
+        Integer,
+        nullable=False,
+        default=0,
+    )
+    last_error = Column(
+        Text,
+        nullable=True,
+    )
+    created_at = Column(
+        UTCDateTime,
+        server_default=func.now(),
+        nullable=False,
+    )
+    sent_at = Column(
+        UTCDateTime,
+        nullable=True,
+    )
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "digest_date", name="uq_digest_outbox_user_date"),
+        # Выборка отправителя: ожидающие отправки по порядку
+        Index("ix_digest_outbox_status_id", "status", "id"),
+    )
+
+    def __repr__(self) -> str:
+        return f"<DigestOutbox(id={self.id}, user_id={self.user_id}, date={self.digest_date}, status='{self.status.value}')>"
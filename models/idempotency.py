@@ -0,0 +1,55 @@
+from sqlalchemy import Column, Integer, String, ForeignKey, JSON, UniqueConstraint
+from sqlalchemy.sql import func
+from database import Base, UTCDateTime
+
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+
+    id = Column(
+        Integer,
+        primary_key=True,
+        autoincrement=True,
+    )
+    user_id = Column(
+        Integer,
+        ForeignKey("users.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    key = Column(
+        String(255),          # Значение заголовка Idempotency-Key
+        nullable=False,
+    )
+    request_hash = Column(
+        String(64),           # Отпечаток запроса: тот же ключ с другим телом — ошибка
+        nullable=False,
+    )
+    status_code = Column(
+        Integer,
+        nullable=True,        # NULL — запрос еще выполняется
+    )
+    response_body = Column(
+        JSON,
+        nullable=True,
+    )
+    locked_until = Column(
+        UTCDateTime,  # Срок захвата: после него незавершенный ключ захватывает повтор
+        nullable=True,
+    )
+    created_at = Column(
+        UTCDateTime,
+        server_default=func.now(),
+        nullable=False,
+    )
+    expires_at = Column(
+        UTCDateTime,
+        nullable=False,
+        index=True,
+    )
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "key", name="uq_idempotency_user_key"),
+    )
+
+    def __repr__(self) -> str:
+        return f"<IdempotencyKey(user_id={self.user_id}, key='{self.key}', status={self.status_code})>"
@@ -0,0 +1,96 @@
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, JSON, Index, Enum as SQLEnum, text
+from sqlalchemy.sql import func
+from database import Base, UTCDateTime
+import enum
+
+
+class JobStatus(enum.Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+class Job(Base):
+    __tablename__ = "jobs"
+
+    id = Column(
+        Integer,
+        primary_key=True,
+        index=True,
+        autoincrement=True,
+    )
+    kind = Column(
+        String(50),           # Тип задания (имя обработчика)
+        nullable=False,
+    )
+    payload = Column(
+        JSON,
+        nullable=True,
+    )
+    result = Column(
+        JSON,
+        nullable=True,
+    )
+    status = Column(
+        SQLEnum(JobStatus),
+        nullable=False,
+        default=JobStatus.QUEUED,
+    )
+    attempts = Column(
+        Integer,
+        nullable=False,
+        default=0,
+    )
+    max_attempts = Column(
+        Integer,
+        nullable=False,
+        default=3,
+    )
+    last_error = Column(
+        Text,
+        nullable=True,
+    )
+    user_id = Column(
+        Integer,
+        ForeignKey("users.id", ondelete="CASCADE"),
+        nullable=True,        # Системные задания (планировщик) без владельца
+        index=True,
+    )
+    created_at = Column(
+        UTCDateTime,
+        server_default=func.now(),
+        nullable=False,
+    )
+    run_after = Column(
+        UTCDateTime,  # Не запускать раньше (отложенный повтор)
+        server_default=func.now(),
+        nullable=False,
+    )
+    started_at = Column(
+        UTCDateTime,
+        nullable=True,
+    )
+    finished_at = Column(
+        UTCDateTime,
+        nullable=True,
+    )
+    unique_kind = Column(
+        String(50),           # = kind для заданий, которые не должны дублироваться в очереди (enqueue(unique=True))
+        nullable=True,
+    )
+
+    # Индекс для выборки очередного задания воркером
+    __table_args__ = (
+        Index("ix_jobs_status_run_after", "status", "run_after"),
+        # Не больше одного ждущего или выполняющегося задания каждого unique_kind
+        Index(
+            "uq_jobs_unique_kind_active", "unique_kind",
+            unique=True,
+            postgresql_where=text("status IN ('QUEUED', 'RUNNING')"),
+            sqlite_where=text("status IN ('QUEUED', 'RUNNING')"),
+        ),
+    )
+
+    def __repr__(self) -> str:
+        return f"<Job(id={self.id}, kind='{self.kind}', status='{self.status.value}')>"
@@ -0,0 +1,84 @@
+from sqlalchemy import Column, Integer, String, Boolean, Text, ForeignKey, Index
+from sqlalchemy.sql import func
+from database import Base, UTCDateTime
+
+
+class TaskRecurrence(Base):
+    """
+    Правило повторения задачи. В таблице tasks хранится только текущее вхождение:
+    следующее создается при завершении предыдущего или при входе в окно срочности.
+    """
+    __tablename__ = "task_recurrences"
+
+    id = Column(
+        Integer,
+        primary_key=True,
+        autoincrement=True,
+    )
+    user_id = Column(
+        Integer,
+        ForeignKey("users.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+    # Шаблон задачи для каждого вхождения
+    title = Column(
+        Text,
+        nullable=False,
+    )
+    description = Column(
+        Text,
+        nullable=True,
+    )
+    is_important = Column(
+        Boolean,
+        nullable=False,
+        default=False,
+    )
+    frequency = Column(
+        String(10),           # daily, weekly, monthly или rrule
+        nullable=False,
+    )
+    interval = Column(
+        Integer,
+        nullable=False,
+        default=1,
+    )
+    rrule = Column(
+        Text,                 # Правило RFC 5545 (RRULE) для frequency=rrule
+        nullable=True,
+    )
+    dtstart = Column(
+        UTCDateTime,  # Дедлайн первого вхождения
+        nullable=False,
+    )
+    until = Column(
+        UTCDateTime,
+        nullable=True,
+    )
+    next_occurrence_at = Column(
+        UTCDateTime,  # Дедлайн следующего еще не созданного вхождения (NULL — вхождений больше нет)
+        nullable=True,
+    )
+    current_task_id = Column(
+        Integer,              # Последнее созданное вхождение
+        nullable=True,
+    )
+    active = Column(
+        Boolean,
+        nullable=False,
+        default=True,
+    )
+    created_at = Column(
+        UTCDateTime,
+        server_default=func.now(),
+        nullable=False,
+    )
+
+    __table_args__ = (
+        # Выборка планировщика: активные правила, чье следующее вхождение вошло в окно срочности
+        Index("ix_task_recurrences_due", "active", "next_occurrence_at"),
+    )
+
+    def __repr__(self) -> str:
+        return f"<TaskRecurrence(id={self.id}, frequency='{self.frequency}', next='{self.next_occurrence_at}')>"
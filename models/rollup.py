@@ -0,0 +1,49 @@
+from sqlalchemy import Column, Integer, Date, ForeignKey, Index
+from database import Base
+
+
+class TaskRollup(Base):
+    """
+    Дневные счетчики задач пользователя (инкрементальная агрегация для /stats/analytics).
+    Строка обновляется в той же транзакции, что и задача; недели и месяцы
+    собираются из дней при запросе.
+    """
+    __tablename__ = "task_rollups"
+
+    user_id = Column(
+        Integer,
+        ForeignKey("users.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    day = Column(
+        Date,                 # День (UTC)
+        primary_key=True,
+    )
+    created = Column(
+        Integer,
+        nullable=False,
+        default=0,
+    )
+    completed = Column(
+        Integer,
+        nullable=False,
+        default=0,
+    )
+    completed_on_time = Column(
+        Integer,              # Завершены не позже дедлайна
+        nullable=False,
+        default=0,
+    )
+    completed_late = Column(
+        Integer,              # Завершены после дедлайна
+        nullable=False,
+        default=0,
+    )
+
+    __table_args__ = (
+        # Глобальная аналитика: диапазон дней по всем пользователям
+        Index("ix_task_rollups_day", "day"),
+    )
+
+    def __repr__(self) -> str:
+        return f"<TaskRollup(user_id={self.user_id}, day='{self.day}', created={self.created}, completed={self.completed})>"
@@ -1,7 +1,7 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Boolean, Text, ForeignKey, Index, event, text
+from sqlalchemy.orm import ORMExecuteState, Session, relationship, with_loader_criteria
 from sqlalchemy.sql import func
-from database import Base
+from database import Base, UTCDateTime
 
 class Task(Base):
     __tablename__ = "tasks"
@@ -36,7 +36,7 @@ class Task(Base):
     )
 
     deadline_at = Column(
-        DateTime(timezone=True),
+        UTCDateTime,
         nullable=True
     )
     
@@ -52,13 +52,13 @@ class Task(Base):
     )
     
     created_at = Column(
-        DateTime(timezone=True),
+        UTCDateTime,
         server_default=func.now(),
         nullable=False
     )
     
     completed_at = Column(
-        DateTime(timezone=True),
+        UTCDateTime,
         nullable=True
     )
     user_id = Column(
@@ -67,7 +67,65 @@ class Task(Base):
         nullable=False,
         index=True
     )
+    recurrence_id = Column(
+        Integer,
+        ForeignKey("task_recurrences.id", ondelete="SET NULL"),
+        nullable=True,
+        index=True
+    )
+    deleted_at = Column(
+        UTCDateTime,   # Время перемещения в корзину; NULL — задача не удалена
+        nullable=True
+    )
     owner = relationship("User", back_populates="tasks")
+
+    # Индексы выборок — частичные (WHERE deleted_at IS NULL): строки корзины в них не попадают,
+    # а условие, которое добавляется ко всем SELECT (см. _skip_deleted), совпадает с условием индекса
+    __table_args__ = (
+        # Порядок "что делать дальше" (/tasks/next): чтение по индексу, стоимость ~ K
+        Index(
+            "ix_tasks_user_next", "user_id", "completed", "quadrant", "deadline_at", "id",
+            postgresql_where=text("deleted_at IS NULL"),
+            sqlite_where=text("deleted_at IS NULL"),
+        ),
+        # GET /tasks/: фильтр и сортировка по дедлайну или дате создания (task_query.py)
+        Index(
+            "ix_tasks_user_deadline", "user_id", "deadline_at", "id",
+            postgresql_where=text("deleted_at IS NULL"),
+            sqlite_where=text("deleted_at IS NULL"),
+        ),
+        Index(
+            "ix_tasks_user_created", "user_id", "created_at", "id",
+            postgresql_where=text("deleted_at IS NULL"),
+            sqlite_where=text("deleted_at IS NULL"),
+        ),
+        # Выборки по квадранту и по статусу с дедлайном (/tasks/quadrant, /tasks/status, /stats)
+        Index(
+            "ix_tasks_user_quadrant", "user_id", "quadrant",
+            postgresql_where=text("deleted_at IS NULL"),
+            sqlite_where=text("deleted_at IS NULL"),
+        ),
+        Index(
+            "ix_tasks_user_completed_deadline", "user_id", "completed", "deadline_at",
+            postgresql_where=text("deleted_at IS NULL"),
+            sqlite_where=text("deleted_at IS NULL"),
+        ),
+        # Кандидаты на перенос в архив (archive.py): только завершенные задачи
+        Index(
+            "ix_tasks_archivable", "completed_at",
+            postgresql_where=text("completed AND deleted_at IS NULL"),
+            sqlite_where=text("completed AND deleted_at IS NULL"),
+        ),
+        # Корзина пользователя и очистка корзины (trash.py): только удаленные задачи
+        Index(
+            "ix_tasks_trash", "user_id", "deleted_at",
+            postgresql_where=text("deleted_at IS NOT NULL"),
+            sqlite_where=text("deleted_at IS NOT NULL"),
+        ),
+        # SQLite: AUTOINCREMENT не выдает повторно id удаленных и архивированных задач,
+        # а начальное значение задает диапазон id шарда (см. sharding.py)
+        {"sqlite_autoincrement": True},
+    )
     def __repr__(self) -> str:
         return f"<Task(id={self.id}, title='{self.title}', quadrant='{self.quadrant}')>"
     
@@ -83,5 +141,25 @@ class Task(Base):
             "completed": self.completed,
             "created_at": self.created_at,
             "completed_at": self.completed_at,
-            "user_id": self.user_id
-        }
\ No newline at end of file
+            "user_id": self.user_id,
+            "recurrence_id": self.recurrence_id,
+            "deleted_at": self.deleted_at
+        }
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _skip_deleted(execute_state: ORMExecuteState) -> None:
+    """
+    Задачи в корзине не видны SELECT-запросам ORM (выборки, счетчики, session.get):
+    к каждому запросу, где участвует Task, добавляется deleted_at IS NULL.
+    Корзина и восстановление читают удаленные задачи с execution_options(include_deleted=True).
+    """
+    if (
+        execute_state.is_select
+        and not execute_state.is_column_load
+        and not execute_state.is_relationship_load
+        and not execute_state.execution_options.get("include_deleted", False)
+    ):
+        execute_state.statement = execute_state.statement.options(
+            with_loader_criteria(Task, Task.deleted_at.is_(None), include_aliases=True)
+        )
\ No newline at end of file
@@ -45,6 +45,7 @@ class User(Base):
         "Task",
         back_populates="owner",        # Обратная связь
         cascade="all, delete-orphan",  # При удалении пользователя удаляются его задачи
+        passive_deletes=True,          # ...средствами БД (ON DELETE CASCADE), без загрузки задач в сессию
     )
 
     def __repr__(self) -> str:
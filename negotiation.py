@@ -0,0 +1,189 @@
+"""
+Согласование формата ответа (Accept) и сжатия (Accept-Encoding) для списков задач
+и результатов выгрузки.
+
+Форматы:
+- application/json — по умолчанию;
+- application/msgpack (или application/x-msgpack) — MessagePack, нужен `pip install msgpack`;
+- application/vnd.apache.arrow.stream — Arrow IPC stream, колонки вместо повторяющихся
+  ключей, нужен `pip install pyarrow`. Только для списков записей.
+
+Сжатие: zstd (`pip install zstandard`) или gzip, если клиент их принимает и тело
+больше COMPRESSION_MIN_BYTES. Форматы без установленной библиотеки не предлагаются.
+Большие ответы кодируются и сжимаются в пуле потоков, чтобы не занимать event loop.
+"""
+import gzip
+import json
+import os
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from fastapi import HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+
+try:
+    import msgpack
+except ImportError:  # msgpack не установлен — ответ только в JSON/Arrow
+    msgpack = None
+
+try:
+    import pyarrow as pa
+except ImportError:  # pyarrow не установлен — Arrow недоступен
+    pa = None
+
+try:
+    import zstandard
+except ImportError:  # zstandard не установлен — сжатие только gzip
+    zstandard = None
+
+load_dotenv()
+
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+ZSTD_LEVEL = int(os.getenv("ZSTD_LEVEL", "3"))
+# Начиная с этого числа записей кодирование выполняется в пуле потоков
+NEGOTIATION_THREAD_MIN_ITEMS = int(os.getenv("NEGOTIATION_THREAD_MIN_ITEMS", "1000"))
+
+MEDIA_JSON = "application/json"
+MEDIA_MSGPACK = "application/msgpack"
+MEDIA_ARROW = "application/vnd.apache.arrow.stream"
+MEDIA_ALIASES = {"application/x-msgpack": MEDIA_MSGPACK}
+
+
+def available_media_types() -> List[str]:
+    types = [MEDIA_JSON]
+    if msgpack is not None:
+        types.append(MEDIA_MSGPACK)
+    if pa is not None:
+        types.append(MEDIA_ARROW)
+    return types
+
+
+def available_encodings() -> List[str]:
+    # Порядок — предпочтение сервера при равном q
+    return (["zstd"] if zstandard is not None else []) + ["gzip"]
+
+
+def _parse_header(value: Optional[str]) -> List[Tuple[str, float]]:
+    """Значения заголовка Accept/Accept-Encoding с q, по убыванию q (порядок при равных q сохраняется)."""
+    items = []
+    for part in (value or "").split(","):
+        name, _, params = part.strip().partition(";")
+        if not name:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, val = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(val)
+                except ValueError:
+                    q = 0.0
+        items.append((name.strip().lower(), q))
+    return sorted(items, key=lambda item: -item[1])
+
+
+def choose_media_type(accept: Optional[str], records: bool = True) -> str:
+    """Лучший поддерживаемый формат из Accept. Нет подходящего — 406."""
+    supported = [m for m in available_media_types() if records or m != MEDIA_ARROW]
+    parsed = _parse_header(accept)
+    if not parsed:
+        return MEDIA_JSON
+    for name, q in parsed:
+        if q <= 0:
+            continue
+        name = MEDIA_ALIASES.get(name, name)
+        if name in ("*/*", "application/*"):
+            return MEDIA_JSON
+        if name in supported:
+            return name
+    raise HTTPException(
+        status_code=406,
+        detail=f"Неподдерживаемый формат ответа. Доступны: {', '.join(supported)}",
+    )
+
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Сжатие из Accept-Encoding: zstd или gzip; None — без сжатия."""
+    accepted = {name: q for name, q in _parse_header(accept_encoding)}
+    best, best_q = None, 0.0
+    for encoding in available_encodings():
+        q = accepted.get(encoding, accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Тип {type(value).__name__} не сериализуется")
+
+
+def _arrow_table(content: List[Dict[str, Any]]) -> "pa.Table":
+    """
+    Записи -> колонки; типы колонок выводятся из значений. Даты в записях — строки
+    ISO 8601 (как в JSON-ответе), поэтому колонки *_at приводятся к timestamp:
+    с часовым поясом (UTC), а если в строках его нет — без пояса.
+    """
+    table = pa.Table.from_pylist(content)
+    for i, field in enumerate(table.schema):
+        if not field.name.endswith("_at") or not pa.types.is_string(field.type):
+            continue
+        for target in (pa.timestamp("us", tz="UTC"), pa.timestamp("us")):
+            try:
+                table = table.set_column(i, field.name, table.column(i).cast(target))
+                break
+            except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+                continue
+    return table
+
+
+def encode(content: Any, media_type: str) -> bytes:
+    if media_type == MEDIA_MSGPACK:
+        return msgpack.packb(content, default=_default, use_bin_type=True)
+    if media_type == MEDIA_ARROW:
+        table = _arrow_table(content)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+def compress(body: bytes, encoding: Optional[str]) -> Tuple[bytes, Optional[str]]:
+    if encoding is None or len(body) < COMPRESSION_MIN_BYTES:
+        return body, None
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body), "zstd"
+    return gzip.compress(body, compresslevel=GZIP_LEVEL), "gzip"
+
+
+def _encode_and_compress(content: Any, media_type: str, encoding: Optional[str]) -> Tuple[bytes, Optional[str]]:
+    return compress(encode(content, media_type), encoding)
+
+
+async def negotiated_response(
+    request: Request,
+    content: Any,
+    status_code: int = 200,
+    records: bool = True,
+) -> Response:
+    """
+    Ответ в формате и со сжатием, выбранными по заголовкам запроса.
+    content — JSON-совместимые данные (даты — строками, как в model_dump(mode="json"),
+    допускаются и объекты datetime); records=True — это список
+    словарей с одинаковыми ключами (тогда доступен Arrow).
+    """
+    media_type = choose_media_type(request.headers.get("accept"), records=records)
+    encoding = choose_encoding(request.headers.get("accept-encoding"))
+    if isinstance(content, list) and len(content) >= NEGOTIATION_THREAD_MIN_ITEMS:
+        body, applied = await run_in_threadpool(_encode_and_compress, content, media_type, encoding)
+    else:
+        body, applied = _encode_and_compress(content, media_type, encoding)
+
+    headers: Dict[str, str] = {"Vary": "Accept, Accept-Encoding"}
+    if applied is not None:
+        headers["Content-Encoding"] = applied
+    return Response(content=body, status_code=status_code, media_type=media_type, headers=headers)
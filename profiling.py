@@ -0,0 +1,186 @@
+"""
+Профилирование отдельных запросов по требованию (cProfile).
+
+Запрос профилируется, если:
+- администратор передал заголовок X-Profile: 1 (роль берется из JWT, без запроса к БД);
+- или запрос попал в случайную выборку PROFILE_SAMPLE_RATE.
+
+Профили сохраняются в PROFILE_DIR как кольцевой буфер из PROFILE_MAX_FILES файлов
+и доступны администратору через /admin/profiles. Middleware подключается только
+при PROFILING_ENABLED=true, поэтому в выключенном состоянии ничего не стоит.
+
+Профилировщик включается только на шагах корутины самого запроса (_ProfiledCoroutine),
+поэтому другие запросы, выполняющиеся в том же event loop, в профиль не попадают.
+Ограничение: не профилируется код в других потоках и задачах — хеширование паролей
+в пуле PASSWORD_HASH_WORKERS, run_in_threadpool, задачи asyncio.gather/create_task.
+Их время видно в профиле только как ожидание (общая длительность запроса больше
+суммы профилированных вызовов).
+"""
+import cProfile
+import io
+import os
+import pstats
+import random
+import re
+import time
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+from fastapi.concurrency import run_in_threadpool
+
+from auth_utils import decode_access_token
+from app_logging import get_logger
+
+load_dotenv()
+log = get_logger(__name__)
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() in ("1", "true", "yes")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "50"))
+PROFILE_HEADER = b"x-profile"
+
+_PROFILE_NAME_RE = re.compile(r"^[0-9]+_[A-Z]+_[A-Za-z0-9_.-]*_[0-9]+ms\.prof$")
+
+
+def _is_admin_request(headers: Dict[bytes, bytes]) -> bool:
+    auth = headers.get(b"authorization", b"").decode("latin-1")
+    if not auth.lower().startswith("bearer "):
+        return False
+    payload = decode_access_token(auth[7:])
+    return bool(payload) and payload.get("role") == "admin"
+
+
+def _profile_name(method: str, path: str, duration_ms: int) -> str:
+    safe_path = re.sub(r"[^A-Za-z0-9.-]+", "_", path).strip("_")[:80]
+    return f"{time.time_ns() // 1_000_000}_{method}_{safe_path}_{duration_ms}ms.prof"
+
+
+def _trim_ring_buffer() -> None:
+    files = sorted(f for f in os.listdir(PROFILE_DIR) if _PROFILE_NAME_RE.match(f))
+    for name in files[:max(0, len(files) - PROFILE_MAX_FILES)]:
+        try:
+            os.remove(os.path.join(PROFILE_DIR, name))
+        except OSError:
+            pass
+
+
+def _save_profile(profiler: cProfile.Profile, name: str) -> None:
+    # Запись файла и очистка каталога — блокирующий ввод-вывод, выполняется в пуле потоков
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        profiler.dump_stats(os.path.join(PROFILE_DIR, name))
+        _trim_ring_buffer()
+    except OSError as e:
+        log.warning("Не удалось сохранить профиль %s: %s", name, e)
+
+
+class _ProfiledCoroutine:
+    """
+    Awaitable-обертка: профилировщик включен, только пока выполняется очередной шаг
+    обернутой корутины, и выключается, когда она уступает event loop другим задачам.
+    """
+
+    def __init__(self, coro, profiler: cProfile.Profile):
+        self.coro = coro
+        self.profiler = profiler
+
+    def __await__(self):
+        steps = self.coro.__await__()
+        value, error = None, None
+        while True:
+            self.profiler.enable()
+            try:
+                yielded = steps.throw(error) if error is not None else steps.send(value)
+            except StopIteration as stop:
+                return stop.value
+            finally:
+                self.profiler.disable()
+            try:
+                value, error = (yield yielded), None
+            except BaseException as e:
+                # Отмена и исключения, брошенные в задачу, передаются корутине
+                value, error = None, e
+
+
+class ProfilingMiddleware:
+    """ASGI middleware: профилирует запрос целиком, от первого байта до ответа."""
+
+    def __init__(self, app):
+        self.app = app
+        # Одновременно профилируем один запрос: профилирование замедляет его в разы
+        self._busy = False
+
+    def _should_profile(self, scope) -> bool:
+        if scope["type"] != "http" or self._busy:
+            return False
+        headers = dict(scope.get("headers") or [])
+        if headers.get(PROFILE_HEADER) in (b"1", b"true") and _is_admin_request(headers):
+            return True
+        return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+    async def __call__(self, scope, receive, send):
+        if not self._should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        self._busy = True
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        name_holder: List[str] = []
+
+        async def send_with_header(message):
+            if message["type"] == "http.response.start":
+                duration_ms = int((time.perf_counter() - started) * 1000)
+                name = _profile_name(scope["method"], scope["path"], duration_ms)
+                name_holder.append(name)
+                headers = list(message.get("headers") or [])
+                headers.append((b"x-profile-id", name.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await _ProfiledCoroutine(self.app(scope, receive, send_with_header), profiler)
+        finally:
+            self._busy = False
+            name = name_holder[0] if name_holder else _profile_name(
+                scope["method"], scope["path"], int((time.perf_counter() - started) * 1000)
+            )
+            await run_in_threadpool(_save_profile, profiler, name)
+
+
+def list_profiles() -> List[Dict[str, Any]]:
+    """Список сохраненных профилей, новые первыми."""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    profiles = []
+    for name in sorted(os.listdir(PROFILE_DIR), reverse=True):
+        if not _PROFILE_NAME_RE.match(name):
+            continue
+        timestamp_ms, method, rest = name.split("_", 2)
+        path, duration = rest.rsplit("_", 1)
+        profiles.append({
+            "name": name,
+            "method": method,
+            "path": "/" + path.replace("_", "/"),
+            "duration_ms": int(duration[:-len("ms.prof")]),
+            "created_at_ms": int(timestamp_ms),
+            "size_bytes": os.path.getsize(os.path.join(PROFILE_DIR, name)),
+        })
+    return profiles
+
+
+def profile_path(name: str) -> Optional[str]:
+    """Путь к файлу профиля или None (имя проверяется, чтобы не выйти за PROFILE_DIR)."""
+    if not _PROFILE_NAME_RE.match(name):
+        return None
+    path = os.path.join(PROFILE_DIR, name)
+    return path if os.path.isfile(path) else None
+
+
+def profile_summary(path: str, limit: int = 50) -> str:
+    """Текстовая сводка pstats, отсортированная по cumulative time."""
+    out = io.StringIO()
+    stats = pstats.Stats(path, stream=out)
+    stats.strip_dirs().sort_stats("cumulative").print_stats(limit)
+    return out.getvalue()
@@ -0,0 +1,229 @@
+"""
+Повторяющиеся задачи с ленивым созданием вхождений.
+
+Правило (TaskRecurrence) хранит шаблон задачи и дедлайн следующего вхождения.
+В таблицу tasks попадает только одно открытое вхождение на правило: следующее
+создается, когда предыдущее завершено (или удалено окончательно) и дедлайн следующего
+вошел в окно срочности (URGENCY_WINDOW_DAYS, как в calculate_urgency). Вхождение в
+корзине остается открытым: правило приостанавливается до восстановления или очистки
+корзины, и восстановленная задача не дублируется новым вхождением. Поэтому число строк
+и стоимость пересчета срочности пропорциональны текущей работе, а не длине
+расписания. Вхождения за произвольный период вычисляются на лету (expand_occurrences).
+
+Частоты daily/weekly/monthly считаются без зависимостей; произвольное правило
+RRULE требует python-dateutil.
+"""
+import calendar
+from datetime import datetime, timedelta, timezone
+from typing import Iterator, List, Optional
+
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import Task, TaskRecurrence
+from utils import calculate_urgency, determine_quadrant
+from rollups import record_created
+
+try:
+    from dateutil.rrule import rrulestr
+except ImportError:  # python-dateutil не установлен — доступны только daily/weekly/monthly
+    rrulestr = None
+
+FREQUENCIES = ("daily", "weekly", "monthly", "rrule")
+# Окно срочности из calculate_urgency: вхождение создается не раньше чем за столько дней до дедлайна
+URGENCY_WINDOW_DAYS = 3
+# Ограничение на число вхождений в одном ответе expand_occurrences
+MAX_EXPANDED_OCCURRENCES = 1000
+
+
+def as_utc(value: datetime) -> datetime:
+    # Значения без tzinfo (SQLite) считаем UTC, как и в utils.calculate_urgency
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def _add_months(value: datetime, months: int) -> datetime:
+    month_index = value.month - 1 + months
+    year = value.year + month_index // 12
+    month = month_index % 12 + 1
+    # 31-е число в коротком месяце переносится на последний день месяца
+    day = min(value.day, calendar.monthrange(year, month)[1])
+    return value.replace(year=year, month=month, day=day)
+
+
+def validate_rule(frequency: str, interval: int, rrule: Optional[str], dtstart: datetime) -> None:
+    """Проверяет правило. Бросает ValueError с описанием ошибки."""
+    if frequency not in FREQUENCIES:
+        raise ValueError(f"Неизвестная частота: {frequency}")
+    if interval < 1:
+        raise ValueError("Интервал должен быть не меньше 1")
+    if frequency == "rrule":
+        if not rrule:
+            raise ValueError("Для frequency=rrule нужно передать rrule")
+        if rrulestr is None:
+            raise ValueError("Правила RRULE недоступны: установите python-dateutil")
+        try:
+            rrulestr(rrule, dtstart=as_utc(dtstart))
+        except (ValueError, TypeError) as e:
+            raise ValueError(f"Некорректное правило RRULE: {e}")
+
+
+def iter_occurrences(rec: TaskRecurrence, after: datetime, inclusive: bool = True) -> Iterator[datetime]:
+    """Дедлайны вхождений правила начиная с after (по возрастанию, с учетом until)."""
+    dtstart = as_utc(rec.dtstart)
+    after = as_utc(after)
+    until = as_utc(rec.until) if rec.until is not None else None
+
+    if rec.frequency == "rrule":
+        if rrulestr is None:
+            return
+        rule = rrulestr(rec.rrule, dtstart=dtstart)
+        occurrence = rule.after(after, inc=inclusive)
+        while occurrence is not None:
+            occurrence = as_utc(occurrence)
+            if until is not None and occurrence > until:
+                return
+            yield occurrence
+            occurrence = rule.after(occurrence, inc=False)
+        return
+
+    interval = rec.interval or 1
+    if rec.frequency == "monthly":
+        # Номер первого вхождения не раньше after — по разнице месяцев, без перебора с начала
+        months = (after.year - dtstart.year) * 12 + after.month - dtstart.month
+        n = max(0, months // interval - 1)
+        step = lambda k: _add_months(dtstart, k * interval)  # noqa: E731
+    else:
+        delta = timedelta(days=interval) if rec.frequency == "daily" else timedelta(weeks=interval)
+        n = max(0, (after - dtstart) // delta)
+        step = lambda k: dtstart + k * delta  # noqa: E731
+
+    while True:
+        occurrence = step(n)
+        n += 1
+        if occurrence < after or (occurrence == after and not inclusive):
+            continue
+        if until is not None and occurrence > until:
+            return
+        yield occurrence
+
+
+def next_occurrence(rec: TaskRecurrence, after: datetime, inclusive: bool = False) -> Optional[datetime]:
+    return next(iter_occurrences(rec, after, inclusive=inclusive), None)
+
+
+def expand_occurrences(
+    rec: TaskRecurrence,
+    start: datetime,
+    end: datetime,
+    limit: int = MAX_EXPANDED_OCCURRENCES,
+) -> List[datetime]:
+    """Вхождения правила в интервале [start, end], вычисленные на лету (в БД не записываются)."""
+    start = max(as_utc(start), as_utc(rec.dtstart))
+    end = as_utc(end)
+    result = []
+    for occurrence in iter_occurrences(rec, start):
+        if occurrence > end or len(result) >= limit:
+            break
+        result.append(occurrence)
+    return result
+
+
+def _materialize(db: AsyncSession, rec: TaskRecurrence, now: datetime) -> Optional[Task]:
+    deadline = as_utc(rec.next_occurrence_at)
+    if deadline < now:
+        # Пропущенные вхождения (дедлайн уже прошел) не создаются задним числом
+        deadline = next_occurrence(rec, now, inclusive=True)
+        if deadline is None:
+            rec.next_occurrence_at = None
+            return None
+    is_urgent = calculate_urgency(deadline, now)
+    task = Task(
+        title=rec.title,
+        description=rec.description,
+        is_important=rec.is_important,
+        is_urgent=is_urgent,
+        deadline_at=deadline,
+        quadrant=determine_quadrant(rec.is_important, is_urgent),
+        completed=False,
+        user_id=rec.user_id,
+        recurrence_id=rec.id,
+    )
+    db.add(task)
+    rec.next_occurrence_at = next_occurrence(rec, deadline)
+    return task
+
+
+async def materialize_if_due(db: AsyncSession, rec: TaskRecurrence, now: Optional[datetime] = None) -> Optional[Task]:
+    """
+    Создает следующее вхождение, если открытого вхождения нет и дедлайн вошел в окно срочности.
+    Изменения не фиксируются: COMMIT делает вызывающий.
+    """
+    now = now or datetime.now(timezone.utc)
+    if not rec.active or rec.next_occurrence_at is None:
+        return None
+    if as_utc(rec.next_occurrence_at) > now + timedelta(days=URGENCY_WINDOW_DAYS):
+        return None
+    if rec.current_task_id is not None:
+        result = await db.execute(
+            select(Task.id)
+            .where(Task.id == rec.current_task_id, Task.completed == False)
+            .execution_options(include_deleted=True)
+        )
+        if result.first() is not None:
+            return None
+    task = _materialize(db, rec, now)
+    if task is not None:
+        await db.flush()
+        rec.current_task_id = task.id
+        await record_created(db, rec.user_id, now)
+    return task
+
+
+async def on_task_completed(db: AsyncSession, task: Task) -> Optional[Task]:
+    """Вызывается при завершении задачи: для повторяющейся задачи создает следующее вхождение."""
+    if task.recurrence_id is None:
+        return None
+    rec = await db.get(TaskRecurrence, task.recurrence_id)
+    if rec is None:
+        return None
+    # Сессии создаются с autoflush=False: завершение должно попасть в БД до проверки открытого вхождения
+    await db.flush()
+    return await materialize_if_due(db, rec)
+
+
+async def materialize_due(db: AsyncSession, batch_size: int = 500) -> int:
+    """
+    Создает вхождения, вошедшие в окно срочности, на одном шарде.
+    Выбираются только правила без открытого вхождения (индекс ix_task_recurrences_due);
+    открытое вхождение в корзине тоже учитывается (include_deleted).
+    """
+    now = datetime.now(timezone.utc)
+    horizon = now + timedelta(days=URGENCY_WINDOW_DAYS)
+    created = 0
+    last_id = 0
+    while True:
+        result = await db.execute(
+            select(TaskRecurrence)
+            .outerjoin(Task, Task.id == TaskRecurrence.current_task_id)
+            .where(
+                TaskRecurrence.active == True,
+                TaskRecurrence.next_occurrence_at <= horizon,
+                TaskRecurrence.id > last_id,
+                or_(Task.id.is_(None), Task.completed == True),
+            )
+            .order_by(TaskRecurrence.id)
+            .limit(batch_size)
+            .execution_options(include_deleted=True)
+        )
+        recurrences = result.scalars().all()
+        if not recurrences:
+            return created
+        for rec in recurrences:
+            task = _materialize(db, rec, now)
+            if task is not None:
+                await db.flush()
+                rec.current_task_id = task.id
+                await record_created(db, rec.user_id, now)
+                created += 1
+        await db.commit()
+        last_id = recurrences[-1].id
@@ -0,0 +1,163 @@
+"""
+Инкрементальные счетчики для аналитики по времени (таблица task_rollups).
+
+На каждый (user_id, день UTC) — одна строка: создано, завершено, завершено в срок,
+завершено с опозданием. Строка обновляется одним UPSERT в той же транзакции, что и
+задача (создание, импорт, завершение, вхождение повторяющейся задачи), и лежит на
+шарде пользователя. /stats/analytics читает только эти строки: стоимость запроса
+зависит от длины периода, а не от числа задач. Недели (с понедельника) и месяцы
+собираются из дней при запросе.
+
+Счетчики — журнал событий: удаление задачи и перенос в архив их не уменьшают.
+rebuild_rollups пересчитывает их заново по tasks и tasks_archive (начальное
+заполнение или исправление после ручных правок БД).
+"""
+import os
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import dialect_insert
+from models import Task, TaskArchive, TaskRollup
+from sharding import shard_router
+from app_logging import get_logger
+
+load_dotenv()
+log = get_logger(__name__)
+
+GRANULARITIES = ("day", "week", "month")
+METRICS = ("created", "completed", "completed_on_time", "completed_late")
+ROLLUP_REBUILD_FETCH_SIZE = int(os.getenv("ROLLUP_REBUILD_FETCH_SIZE", "5000"))
+ROLLUP_REBUILD_BATCH = int(os.getenv("ROLLUP_REBUILD_BATCH", "1000"))
+
+
+def _as_utc(value: datetime) -> datetime:
+    # Значения без tzinfo (SQLite, datetime.now()) считаем UTC
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def _day(value: Optional[datetime]) -> date:
+    return _as_utc(value or datetime.now(timezone.utc)).date()
+
+
+def completion_deltas(completed_at: Optional[datetime], deadline_at: Optional[datetime], sign: int = 1) -> Dict[str, int]:
+    """Приращения счетчиков для завершения задачи (sign=-1 — отмена завершения)."""
+    deltas = {"completed": sign}
+    if completed_at is not None and deadline_at is not None:
+        kind = "completed_on_time" if _as_utc(completed_at) <= _as_utc(deadline_at) else "completed_late"
+        deltas[kind] = sign
+    return deltas
+
+
+def _upsert(db: AsyncSession, rows: List[Dict[str, Any]]):
+    stmt = dialect_insert(db, TaskRollup).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=[TaskRollup.user_id, TaskRollup.day],
+        set_={name: getattr(TaskRollup, name) + getattr(stmt.excluded, name) for name in METRICS},
+    )
+
+
+async def bump(db: AsyncSession, user_id: int, day: date, **deltas: int) -> None:
+    """Прибавляет deltas к счетчикам дня. Изменения не фиксируются: COMMIT делает вызывающий."""
+    row = {"user_id": user_id, "day": day, **{name: deltas.get(name, 0) for name in METRICS}}
+    await db.execute(_upsert(db, [row]))
+
+
+async def record_created(db: AsyncSession, user_id: int, at: Optional[datetime] = None, count: int = 1) -> None:
+    await bump(db, user_id, _day(at), created=count)
+
+
+async def record_completed(db: AsyncSession, task: Task, sign: int = 1) -> None:
+    """Учитывает завершение задачи (sign=-1 — отмену) в дне task.completed_at."""
+    await bump(db, task.user_id, _day(task.completed_at), **completion_deltas(task.completed_at, task.deadline_at, sign))
+
+
+# ЧТЕНИЕ
+
+def bucket_start(day: date, granularity: str) -> date:
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    return day
+
+
+def _next_bucket(start: date, granularity: str) -> date:
+    if granularity == "week":
+        return start + timedelta(weeks=1)
+    if granularity == "month":
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+def iter_buckets(start: date, end: date, granularity: str) -> Iterator[date]:
+    current = bucket_start(start, granularity)
+    while current <= end:
+        yield current
+        current = _next_bucket(current, granularity)
+
+
+def range_statement(start: date, end: date, user_id: Optional[int] = None):
+    """Суммы счетчиков по дням периода (user_id=None — по всем пользователям)."""
+    stmt = (
+        select(TaskRollup.day, *(func.sum(getattr(TaskRollup, name)).label(name) for name in METRICS))
+        .where(TaskRollup.day >= start, TaskRollup.day <= end)
+        .group_by(TaskRollup.day)
+    )
+    if user_id is not None:
+        stmt = stmt.where(TaskRollup.user_id == user_id)
+    return stmt
+
+
+def fold_buckets(rows: Iterable[Any], start: date, end: date, granularity: str) -> List[Dict[str, Any]]:
+    """Собирает дневные суммы (в т.ч. с разных шардов) в корзины; пустые корзины — нули."""
+    buckets = {b: {"bucket_start": b, **{name: 0 for name in METRICS}} for b in iter_buckets(start, end, granularity)}
+    for row in rows:
+        bucket = buckets[bucket_start(row.day, granularity)]
+        for name in METRICS:
+            bucket[name] += getattr(row, name) or 0
+    return list(buckets.values())
+
+
+# ПЕРЕСЧЕТ
+
+async def rebuild_shard(session: AsyncSession) -> int:
+    """Пересчитывает счетчики одного шарда и фиксирует их. Возвращает число строк."""
+    counters: Dict[tuple, Dict[str, int]] = defaultdict(lambda: dict.fromkeys(METRICS, 0))
+    for model in (Task, TaskArchive):
+        # Задачи в корзине учитываются: удаление счетчики не уменьшает
+        stmt = select(
+            model.user_id, model.created_at, model.completed, model.completed_at, model.deadline_at
+        ).execution_options(yield_per=ROLLUP_REBUILD_FETCH_SIZE, include_deleted=True)
+        result = await session.stream(stmt)
+        async for row in result:
+            counters[(row.user_id, _day(row.created_at))]["created"] += 1
+            if row.completed and row.completed_at is not None:
+                done = counters[(row.user_id, _day(row.completed_at))]
+                for name, delta in completion_deltas(row.completed_at, row.deadline_at).items():
+                    done[name] += delta
+
+    rows = [{"user_id": user_id, "day": day, **values} for (user_id, day), values in counters.items()]
+    # Замена счетчиков шарда — одной транзакцией: читатели видят либо старые, либо новые значения
+    await session.execute(delete(TaskRollup))
+    for i in range(0, len(rows), ROLLUP_REBUILD_BATCH):
+        await session.execute(_upsert(session, rows[i:i + ROLLUP_REBUILD_BATCH]))
+    await session.commit()
+    return len(rows)
+
+
+async def rebuild_rollups() -> Dict[str, Any]:
+    """Пересчитывает task_rollups по tasks и tasks_archive на всех шардах."""
+    started = time.perf_counter()
+    rows = 0
+    for session_maker in shard_router.sessionmakers:
+        async with session_maker() as session:
+            rows += await rebuild_shard(session)
+    report = {"rows": rows, "duration_seconds": round(time.perf_counter() - started, 3)}
+    log.info("Счетчики аналитики пересчитаны: %s строк", rows, extra={"fields": report})
+    return report
@@ -1,11 +1,27 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, status
+from fastapi.responses import FileResponse, PlainTextResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func
-from typing import List, Dict
+from typing import Any, List, Dict, Optional
 
-from database import get_async_session
-from models import User, Task
+from database import get_async_session, dialect_insert
+from models import User, Task, UserRole
+from schemas_auth import UserCreate, UserResponse, BulkUsersResponse
+from auth_utils import get_password_hashes
 from dependencies import get_current_admin
+from admission import admission_stats
+from sharding import shard_router
+import profiling
+from loop_monitor import loop_monitor
+from app_logging import logging_stats
+from write_coalescer import group_commit_stats
+from idempotency import get_idempotency_key, request_fingerprint, run_idempotent
+from schemas import JobResponse
+from routers.jobs import job_to_response
+import jobs
+
+# Максимальный размер пачки при массовом создании пользователей
+MAX_BULK_USERS = 1000
 
 router = APIRouter(
     prefix="/admin",
@@ -19,26 +35,188 @@ async def list_users_with_task_counts(
     _admin: User = Depends(get_current_admin),
 ):
     """Возвращает список всех пользователей с количеством их задач."""
-    stmt = select(
-        User.id,
-        User.nickname,
-        User.email,
-        func.count(Task.id).label("task_count")
-    ).select_from(User).join(Task, Task.user_id == User.id, isouter=True).group_by(User.id)
-
-    result = await db.execute(stmt)
+    # Пользователи хранятся в основной базе, задачи — на шардах: считаем на всех шардах и объединяем
+    result = await db.execute(select(User.id, User.nickname, User.email))
     rows = result.all()
 
+    async def count_tasks(session: AsyncSession):
+        counts = await session.execute(
+            select(Task.user_id, func.count(Task.id)).group_by(Task.user_id)
+        )
+        return counts.all()
+
+    task_counts: Dict[int, int] = {}
+    for part in await shard_router.scatter(count_tasks):
+        for user_id, count in part:
+            task_counts[user_id] = task_counts.get(user_id, 0) + count
+
     users = []
     for row in rows:
-        # row may be RowMapping or tuple
-        try:
-            uid = row.id
-            nickname = row.nickname
-            email = row.email
-            count = row.task_count
-        except Exception:
-            uid, nickname, email, count = row
-        users.append({"id": uid, "nickname": nickname, "email": email, "task_count": count})
+        users.append({
+            "id": row.id,
+            "nickname": row.nickname,
+            "email": row.email,
+            "task_count": task_counts.get(row.id, 0),
+        })
 
     return users
+
+
+@router.get("/admission", response_model=Dict[str, Dict[str, int]])
+async def get_admission_stats(
+    _admin: User = Depends(get_current_admin),
+):
+    """Счетчики контроля допуска по классам маршрутов: допущено, в очереди, отклонено."""
+    return admission_stats()
+
+
+@router.post("/users/bulk", response_model=BulkUsersResponse, status_code=status.HTTP_201_CREATED)
+async def bulk_create_users(
+    users_data: List[UserCreate] = Body(..., max_length=MAX_BULK_USERS),
+    db: AsyncSession = Depends(get_async_session),
+    admin: User = Depends(get_current_admin),
+    idempotency_key: Optional[str] = Depends(get_idempotency_key),
+):
+    """
+    Массовое создание пользователей одним INSERT ... ON CONFLICT DO NOTHING.
+    Пароли хешируются параллельно; занятые email/никнеймы возвращаются в conflicts.
+    С заголовком Idempotency-Key повтор вернет первый ответ без повторного хеширования.
+    """
+    if not users_data:
+        return BulkUsersResponse()
+
+    async def create() -> BulkUsersResponse:
+        # Повтор email или никнейма внутри пачки — конфликт: в INSERT идет только первая строка
+        unique_users, conflicts = [], []
+        seen_emails, seen_nicknames = set(), set()
+        for u in users_data:
+            if u.email in seen_emails or u.nickname in seen_nicknames:
+                conflicts.append({"nickname": u.nickname, "email": u.email})
+                continue
+            seen_emails.add(u.email)
+            seen_nicknames.add(u.nickname)
+            unique_users.append(u)
+
+        hashes = await get_password_hashes([u.password for u in unique_users])
+        rows = [
+            {
+                "nickname": u.nickname,
+                "email": u.email,
+                "hashed_password": hashed,
+                "role": UserRole.USER,
+            }
+            for u, hashed in zip(unique_users, hashes)
+        ]
+        result = await db.execute(
+            dialect_insert(db, User).values(rows).on_conflict_do_nothing().returning(User)
+        )
+        created = result.scalars().all()
+        await db.commit()
+        await shard_router.ensure_users(created)
+
+        created_pairs = {(u.email, u.nickname) for u in created}
+        conflicts += [
+            {"nickname": u.nickname, "email": u.email}
+            for u in unique_users if (u.email, u.nickname) not in created_pairs
+        ]
+        return BulkUsersResponse(
+            created=[UserResponse.model_validate(u) for u in created],
+            conflicts=conflicts,
+        )
+
+    # Пароли в отпечаток не входят
+    return await run_idempotent(
+        db,
+        admin.id,
+        idempotency_key,
+        request_fingerprint("POST /admin/users/bulk", [[u.nickname, u.email] for u in users_data]),
+        create,
+        status_code=status.HTTP_201_CREATED,
+    )
+
+
+async def enqueue_user_purge(db: AsyncSession, admin: User, user_ids: List[int]) -> JobResponse:
+    if admin.id in user_ids:
+        raise HTTPException(status_code=400, detail="Нельзя удалить собственную учетную запись")
+    job = await jobs.enqueue(db, "purge_users", {"user_ids": user_ids}, user_id=admin.id)
+    return job_to_response(job)
+
+
+@router.delete("/users/{user_id}", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def delete_user(
+    user_id: int,
+    db: AsyncSession = Depends(get_async_session),
+    admin: User = Depends(get_current_admin),
+):
+    """
+    Удаляет пользователя вместе с задачами в фоновом задании: задачи удаляются пачками,
+    без загрузки в память. Статус — GET /jobs/{id}.
+    """
+    result = await db.execute(select(User.id).where(User.id == user_id))
+    if result.first() is None:
+        raise HTTPException(status_code=404, detail="Пользователь не найден")
+    return await enqueue_user_purge(db, admin, [user_id])
+
+
+@router.post("/users/bulk-delete", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def bulk_delete_users(
+    user_ids: List[int] = Body(..., min_length=1, max_length=MAX_BULK_USERS),
+    db: AsyncSession = Depends(get_async_session),
+    admin: User = Depends(get_current_admin),
+):
+    """Массовое удаление пользователей одним фоновым заданием. Несуществующие id пропускаются."""
+    result = await db.execute(select(User.id).where(User.id.in_(set(user_ids))))
+    existing = sorted(row.id for row in result.all())
+    if not existing:
+        raise HTTPException(status_code=404, detail="Пользователи не найдены")
+    return await enqueue_user_purge(db, admin, existing)
+
+
+@router.get("/loop-lag", response_model=Dict[str, Any])
+async def get_loop_lag(
+    _admin: User = Depends(get_current_admin),
+):
+    """Задержка event loop: последняя/средняя/максимальная, гистограмма и стек последней блокировки."""
+    return loop_monitor.stats()
+
+
+@router.get("/logging", response_model=Dict[str, int])
+async def get_logging_stats(
+    _admin: User = Depends(get_current_admin),
+):
+    """Состояние очереди логов: ожидают записи, отброшено при переполнении, подавлено лимитом частоты."""
+    return logging_stats()
+
+
+@router.get("/group-commit", response_model=Dict[str, Any])
+async def get_group_commit_stats(
+    _admin: User = Depends(get_current_admin),
+):
+    """Групповая фиксация: размер пачек, добавленная задержка и частота COMMIT по базам."""
+    return group_commit_stats()
+
+
+@router.get("/profiles", response_model=List[Dict[str, Any]])
+async def list_request_profiles(
+    _admin: User = Depends(get_current_admin),
+):
+    """
+    Список сохраненных профилей запросов (заголовок X-Profile: 1 или выборка PROFILE_SAMPLE_RATE).
+    В профиль входит только код корутины запроса: хеширование паролей и другие вызовы
+    в пулах потоков видны лишь как ожидание.
+    """
+    return profiling.list_profiles()
+
+
+@router.get("/profiles/{name}")
+async def download_request_profile(
+    name: str,
+    format: str = Query("prof", pattern="^(prof|text)$", description="prof — файл pstats, text — текстовая сводка"),
+    _admin: User = Depends(get_current_admin),
+):
+    path = profiling.profile_path(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Профиль не найден")
+    if format == "text":
+        return PlainTextResponse(profiling.profile_summary(path))
+    return FileResponse(path, media_type="application/octet-stream", filename=name)
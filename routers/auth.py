@@ -3,12 +3,14 @@ from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
-from database import get_async_session
+from database import get_async_session, dialect_insert
 from models import User, UserRole
 from schemas_auth import UserCreate, UserResponse, Token
-from auth_utils import verify_password, get_password_hash, create_access_token
+from auth_utils import verify_password_async, get_password_hash_async, create_access_token
 from dependencies import get_current_user
 from schemas_auth import ChangePassword
+from admission import admission
+from sharding import shard_router
 
 router = APIRouter(
     prefix="/auth",
@@ -16,51 +18,56 @@ router = APIRouter(
 )
 
 
+EMAIL_TAKEN = "Пользователь с таким email уже существует"
+NICKNAME_TAKEN = "Пользователь с таким никнеймом уже существует"
+
+
+async def conflict_detail(db: AsyncSession, email: str) -> str:
+    """Определяет, какое уникальное поле оказалось занято (только на пути ошибки)."""
+    result = await db.execute(select(User.id).where(User.email == email))
+    return EMAIL_TAKEN if result.first() else NICKNAME_TAKEN
+
+
 @router.post(
     "/register",
     response_model=UserResponse,
     status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(admission("auth"))],
 )
 async def register(
     user_data: UserCreate,
     db: AsyncSession = Depends(get_async_session),
 ):
-    # Проверяем, не занят ли email
+    # Один INSERT ... ON CONFLICT DO NOTHING RETURNING вместо двух SELECT + INSERT + refresh.
+    # Уникальность email/nickname гарантирует БД, поэтому гонка параллельных регистраций исключена
+    hashed_password = await get_password_hash_async(user_data.password)
     result = await db.execute(
-        select(User).where(User.email == user_data.email)
-    )
-    if result.scalar_one_or_none():
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Пользователь с таким email уже существует",
+        dialect_insert(db, User)
+        .values(
+            nickname=user_data.nickname,
+            email=user_data.email,
+            hashed_password=hashed_password,
+            role=UserRole.USER,  # По умолчанию обычный пользователь
         )
-
-    # Проверяем, не занят ли nickname
-    result = await db.execute(
-        select(User).where(User.nickname == user_data.nickname)
+        .on_conflict_do_nothing()
+        .returning(User)
     )
-    if result.scalar_one_or_none():
+    new_user = result.scalar_one_or_none()
+
+    if new_user is None:
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Пользователь с таким никнеймом уже существует",
+            detail=await conflict_detail(db, user_data.email),
         )
 
-    # Создаем нового пользователя
-    new_user = User(
-        nickname=user_data.nickname,
-        email=user_data.email,
-        hashed_password=get_password_hash(user_data.password),
-        role=UserRole.USER,  # По умолчанию обычный пользователь
-    )
-
-    db.add(new_user)
     await db.commit()
-    await db.refresh(new_user)
-
+    # Копия строки пользователя на его шарде (нужна для внешнего ключа задач)
+    await shard_router.ensure_users([new_user])
     return new_user
 
 
-@router.post("/login", response_model=Token)
+@router.post("/login", response_model=Token, dependencies=[Depends(admission("auth"))])
 async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: AsyncSession = Depends(get_async_session),
@@ -72,7 +79,7 @@ async def login(
     user = result.scalar_one_or_none()
 
     # Проверяем пользователя и пароль
-    if not user or not verify_password(
+    if not user or not await verify_password_async(
         form_data.password, user.hashed_password
     ):
         raise HTTPException(
@@ -103,11 +110,11 @@ async def change_password(
     current_user: User = Depends(get_current_user),
 ):
     # Проверяем старый пароль
-    if not verify_password(data.old_password, current_user.hashed_password):
+    if not await verify_password_async(data.old_password, current_user.hashed_password):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Неверный текущий пароль")
 
     # Обновляем пароль
-    current_user.hashed_password = get_password_hash(data.new_password)
+    current_user.hashed_password = await get_password_hash_async(data.new_password)
     db.add(current_user)
     await db.commit()
     await db.refresh(current_user)
@@ -0,0 +1,106 @@
+import asyncio
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func, case
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+from models import Task, User
+from schemas import DashboardResponse, TaskResponse, TimingStatsResponse
+from dependencies import get_current_user
+from sharding import shard_router
+from routers.tasks import tasks_to_responses
+
+router = APIRouter(
+    prefix="/dashboard",
+    tags=["dashboard"],
+)
+
+
+def aggregate_statement(user_id: int, now: datetime):
+    """Все счетчики главного экрана одним проходом по задачам пользователя (вместо /stats и /stats/timing)."""
+    def count_if(condition):
+        return func.sum(case((condition, 1), else_=0))
+
+    pending = Task.completed == False
+    return select(
+        func.count(Task.id).label("total"),
+        count_if(Task.quadrant == "Q1").label("q1"),
+        count_if(Task.quadrant == "Q2").label("q2"),
+        count_if(Task.quadrant == "Q3").label("q3"),
+        count_if(Task.quadrant == "Q4").label("q4"),
+        count_if(Task.completed == True).label("completed"),
+        count_if(pending).label("pending"),
+        count_if((Task.completed == True) & (Task.completed_at <= Task.deadline_at)).label("completed_on_time"),
+        count_if((Task.completed == True) & (Task.completed_at > Task.deadline_at)).label("completed_late"),
+        count_if(pending & (Task.deadline_at != None) & (Task.deadline_at > now)).label("on_plan_pending"),
+        count_if(pending & (Task.deadline_at != None) & (Task.deadline_at <= now)).label("overdue_pending"),
+    ).where(Task.user_id == user_id)
+
+
+@router.get("/", response_model=DashboardResponse)
+async def get_dashboard(
+    limit: int = Query(20, ge=1, le=100, description="Размер страницы задач"),
+    offset: int = Query(0, ge=0, description="Смещение страницы задач"),
+    deadline_days: int = Query(7, ge=1, le=90, description="Горизонт ближайших дедлайнов, дней"),
+    deadline_limit: int = Query(10, ge=1, le=50, description="Количество ближайших дедлайнов"),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Данные главного экрана за один запрос: страница задач, счетчики по квадрантам,
+    статусам и срокам, ближайшие дедлайны. Вместо пяти-шести запросов — три, и они
+    выполняются параллельно в отдельных сессиях шарда пользователя.
+    """
+    now = datetime.now(timezone.utc)
+    session_maker = shard_router.sessionmaker_for_user(current_user.id)
+
+    async def run(fn):
+        async with session_maker() as session:
+            return await fn(session)
+
+    async def counters(session: AsyncSession):
+        result = await session.execute(aggregate_statement(current_user.id, now))
+        return result.one()
+
+    async def page(session: AsyncSession) -> List[TaskResponse]:
+        result = await session.execute(
+            select(Task)
+            .where(Task.user_id == current_user.id)
+            .order_by(Task.id.desc())
+            .limit(limit)
+            .offset(offset)
+        )
+        return tasks_to_responses(result.scalars().all())
+
+    async def upcoming(session: AsyncSession) -> List[TaskResponse]:
+        # Читает индекс ix_tasks_user_completed_deadline (user_id, completed, deadline_at)
+        result = await session.execute(
+            select(Task)
+            .where(
+                Task.user_id == current_user.id,
+                Task.completed == False,
+                Task.deadline_at >= now,
+                Task.deadline_at <= now + timedelta(days=deadline_days),
+            )
+            .order_by(Task.deadline_at, Task.id)
+            .limit(deadline_limit)
+        )
+        return tasks_to_responses(result.scalars().all())
+
+    row, tasks, deadlines = await asyncio.gather(run(counters), run(page), run(upcoming))
+
+    return DashboardResponse(
+        tasks=tasks,
+        total_tasks=row.total or 0,
+        limit=limit,
+        offset=offset,
+        by_quadrant={"Q1": row.q1 or 0, "Q2": row.q2 or 0, "Q3": row.q3 or 0, "Q4": row.q4 or 0},
+        by_status={"completed": row.completed or 0, "pending": row.pending or 0},
+        timing=TimingStatsResponse(
+            completed_on_time=row.completed_on_time or 0,
+            completed_late=row.completed_late or 0,
+            on_plan_pending=row.on_plan_pending or 0,
+            overtime_pending=row.overdue_pending or 0,
+        ),
+        upcoming_deadlines=deadlines,
+    )
@@ -0,0 +1,110 @@
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from typing import Dict, Any
+
+from database import get_async_session
+from models import User, UserRole, Job, JobStatus
+from schemas import JobCreate, JobResponse
+from dependencies import get_current_user, get_current_admin
+import jobs
+from negotiation import negotiated_response
+
+router = APIRouter(
+    prefix="/jobs",
+    tags=["jobs"],
+)
+
+
+def job_to_response(job: Job) -> JobResponse:
+    return JobResponse(
+        id=job.id,
+        kind=job.kind,
+        status=job.status.value,
+        attempts=job.attempts,
+        max_attempts=job.max_attempts,
+        last_error=job.last_error,
+        result=job.result,
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at,
+    )
+
+
+@router.post("/", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def create_job(
+    job_data: JobCreate,
+    db: AsyncSession = Depends(get_async_session),
+    current_user: User = Depends(get_current_user),
+):
+    """Ставит задание в очередь; выполнение идет в пуле воркеров вне запроса."""
+    if not jobs.is_known_kind(job_data.kind):
+        raise HTTPException(status_code=400, detail="Неизвестный тип задания")
+
+    is_admin = current_user.role == UserRole.ADMIN
+    if jobs.is_admin_only(job_data.kind) and not is_admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Недостаточно прав доступа")
+
+    payload = dict(job_data.payload)
+    # Обычный пользователь работает только со своими данными
+    payload["user_id"] = current_user.id
+    if not is_admin:
+        payload.pop("all", None)
+
+    job = await jobs.enqueue(db, job_data.kind, payload, user_id=current_user.id)
+    return job_to_response(job)
+
+
+@router.get("/stats", response_model=Dict[str, Any])
+async def get_jobs_stats(
+    db: AsyncSession = Depends(get_async_session),
+    _admin: User = Depends(get_current_admin),
+):
+    """Глубина очереди по статусам и пропускная способность воркеров этого процесса."""
+    return {
+        "queue": await jobs.queue_depth(db),
+        "workers": jobs.worker_pool.stats(),
+    }
+
+
+async def get_visible_job(db: AsyncSession, job_id: int, current_user: User) -> Job:
+    result = await db.execute(select(Job).where(Job.id == job_id))
+    job = result.scalar_one_or_none()
+
+    if not job:
+        raise HTTPException(status_code=404, detail="Задание не найдено")
+
+    if current_user.role != UserRole.ADMIN and job.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Задание не найдено")
+
+    return job
+
+
+@router.get("/{job_id}", response_model=JobResponse)
+async def get_job(
+    job_id: int,
+    db: AsyncSession = Depends(get_async_session),
+    current_user: User = Depends(get_current_user),
+):
+    return job_to_response(await get_visible_job(db, job_id, current_user))
+
+
+@router.get("/{job_id}/result")
+async def get_job_result(
+    job_id: int,
+    request: Request,
+    db: AsyncSession = Depends(get_async_session),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Результат выполненного задания в формате по Accept (JSON, MessagePack, Arrow) со
+    сжатием по Accept-Encoding. Для выгрузки (export_tasks) возвращается список задач.
+    """
+    job = await get_visible_job(db, job_id, current_user)
+    if job.status != JobStatus.SUCCEEDED:
+        raise HTTPException(status_code=409, detail="Задание еще не выполнено")
+
+    result = job.result or {}
+    if isinstance(result.get("tasks"), list):
+        return await negotiated_response(request, result["tasks"])
+    return await negotiated_response(request, result, records=False)
@@ -0,0 +1,165 @@
+from fastapi import APIRouter, HTTPException, Depends, Query, status
+
+from typing import Dict, List, Tuple
+from datetime import datetime, timedelta
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update
+
+from schemas import RecurrenceCreate, RecurrenceResponse, OccurrenceResponse
+from models import Task, TaskRecurrence, User
+from dependencies import get_current_user, get_shard_session
+from recurrence import expand_occurrences, materialize_if_due, next_occurrence, validate_rule, as_utc
+
+# Максимальная длина периода для развертывания вхождений
+MAX_OCCURRENCE_RANGE_DAYS = 366
+
+router = APIRouter(
+    prefix="/recurrences",
+    tags=["recurrences"],
+    responses={404: {"description": "Recurrence not found"}},
+)
+
+
+async def get_user_recurrence(db: AsyncSession, recurrence_id: int, current_user: User) -> TaskRecurrence:
+    rec = await db.get(TaskRecurrence, recurrence_id)
+    if rec is None or rec.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Правило повторения не найдено")
+    return rec
+
+
+# POST - СОЗДАНИЕ ПОВТОРЯЮЩЕЙСЯ ЗАДАЧИ
+@router.post("/", response_model=RecurrenceResponse, status_code=status.HTTP_201_CREATED)
+async def create_recurrence(
+    data: RecurrenceCreate,
+    db: AsyncSession = Depends(get_shard_session),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Создает правило повторения. Задача создается только для ближайшего вхождения,
+    и только когда оно входит в окно срочности; остальные вычисляются на лету.
+    """
+    try:
+        validate_rule(data.frequency, data.interval, data.rrule, data.dtstart)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    rec = TaskRecurrence(
+        user_id=current_user.id,
+        title=data.title,
+        description=data.description,
+        is_important=data.is_important,
+        frequency=data.frequency,
+        interval=data.interval,
+        rrule=data.rrule if data.frequency == "rrule" else None,
+        dtstart=data.dtstart,
+        until=data.until,
+        active=True,
+    )
+    rec.next_occurrence_at = next_occurrence(rec, data.dtstart, inclusive=True)
+    if rec.next_occurrence_at is None:
+        raise HTTPException(status_code=400, detail="Правило не дает ни одного вхождения")
+
+    db.add(rec)
+    await db.flush()
+    await materialize_if_due(db, rec)
+    await db.commit()
+    return rec
+
+
+# GET ПРАВИЛА ПОВТОРЕНИЯ ТЕКУЩЕГО ПОЛЬЗОВАТЕЛЯ
+@router.get("/", response_model=List[RecurrenceResponse])
+async def get_recurrences(
+    db: AsyncSession = Depends(get_shard_session),
+    current_user: User = Depends(get_current_user),
+):
+    result = await db.execute(
+        select(TaskRecurrence)
+        .where(TaskRecurrence.user_id == current_user.id)
+        .order_by(TaskRecurrence.id)
+    )
+    return result.scalars().all()
+
+
+# GET ВХОЖДЕНИЯ ЗА ПЕРИОД (вычисляются на лету)
+@router.get("/occurrences", response_model=List[OccurrenceResponse])
+async def get_occurrences(
+    start: datetime = Query(..., description="Начало периода"),
+    end: datetime = Query(..., description="Конец периода"),
+    db: AsyncSession = Depends(get_shard_session),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Вхождения всех активных правил пользователя за период. Еще не созданные вхождения
+    в БД не записываются; для уже созданных возвращаются id задачи и статус.
+    """
+    start, end = as_utc(start), as_utc(end)
+    if end < start:
+        raise HTTPException(status_code=400, detail="Конец периода раньше начала")
+    if end - start > timedelta(days=MAX_OCCURRENCE_RANGE_DAYS):
+        raise HTTPException(status_code=400, detail=f"Период не должен превышать {MAX_OCCURRENCE_RANGE_DAYS} дней")
+
+    result = await db.execute(
+        select(TaskRecurrence).where(
+            TaskRecurrence.user_id == current_user.id,
+            TaskRecurrence.active == True,
+        )
+    )
+    recurrences = {rec.id: rec for rec in result.scalars().all()}
+
+    # Уже созданные вхождения за период — по индексу tasks.recurrence_id
+    result = await db.execute(
+        select(Task.id, Task.recurrence_id, Task.deadline_at, Task.completed).where(
+            Task.user_id == current_user.id,
+            Task.recurrence_id.is_not(None),
+            Task.deadline_at >= start,
+            Task.deadline_at <= end,
+        )
+    )
+    materialized: Dict[Tuple[int, datetime], tuple] = {
+        (row.recurrence_id, as_utc(row.deadline_at)): row for row in result.all()
+    }
+
+    occurrences = []
+    for rec in recurrences.values():
+        for deadline in expand_occurrences(rec, start, end):
+            row = materialized.pop((rec.id, deadline), None)
+            occurrences.append(OccurrenceResponse(
+                recurrence_id=rec.id,
+                title=rec.title,
+                is_important=rec.is_important,
+                deadline_at=deadline,
+                task_id=row.id if row else None,
+                completed=row.completed if row else False,
+            ))
+    occurrences.sort(key=lambda o: (o.deadline_at, o.recurrence_id))
+    return occurrences
+
+
+# GET ПРАВИЛО ПО ID
+@router.get("/{recurrence_id}", response_model=RecurrenceResponse)
+async def get_recurrence(
+    recurrence_id: int,
+    db: AsyncSession = Depends(get_shard_session),
+    current_user: User = Depends(get_current_user),
+):
+    return await get_user_recurrence(db, recurrence_id, current_user)
+
+
+# DELETE - УДАЛЕНИЕ ПРАВИЛА (созданные задачи остаются)
+@router.delete("/{recurrence_id}", status_code=status.HTTP_200_OK)
+async def delete_recurrence(
+    recurrence_id: int,
+    db: AsyncSession = Depends(get_shard_session),
+    current_user: User = Depends(get_current_user),
+):
+    rec = await get_user_recurrence(db, recurrence_id, current_user)
+    # Дублирует ON DELETE SET NULL на случай SQLITE_FOREIGN_KEYS=false: без него задачи
+    # ссылались бы на удаленное правило, а SQLite может выдать его id новому правилу
+    await db.execute(update(Task).where(Task.recurrence_id == rec.id).values(recurrence_id=None))
+    await db.delete(rec)
+    await db.commit()
+
+    return {
+        "message": "Правило повторения удалено",
+        "id": recurrence_id
+    }
@@ -1,71 +1,122 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func, case
-from typing import List, Dict, Any
-from datetime import datetime, timezone
-from models import Task, User, UserRole
-from database import get_async_session
-from schemas import TimingStatsResponse
-from dependencies import get_current_user
+from typing import List, Dict, Any, Awaitable, Callable, Literal, Optional
+from datetime import date, datetime, timedelta, timezone
+from models import Task, TaskArchive, User, UserRole
+from schemas import TimingStatsResponse, AnalyticsResponse, AnalyticsBucket
+from utils import calculate_days_until_deadline_batch
+from dependencies import get_current_user, get_shard_session
+from sharding import shard_router
+from admission import admin_scope_admission
+from rollups import METRICS, fold_buckets, range_statement
+
+# Максимальная длина периода /stats/analytics
+ANALYTICS_MAX_DAYS = 732
 
 router = APIRouter(
     prefix="/stats",
-    tags=["statistics"]
+    tags=["statistics"],
+    # Статистика администратора считается по всем пользователям — ограничиваем параллелизм
+    dependencies=[Depends(admin_scope_admission("heavy"))],
 )
 
 
+async def run_scoped(
+    db: AsyncSession,
+    current_user: User,
+    fn: Callable[[AsyncSession], Awaitable[Any]],
+) -> List[Any]:
+    """Выполняет fn на шарде пользователя или, для администратора, на всех шардах."""
+    if current_user.role == UserRole.ADMIN and shard_router.enabled:
+        return await shard_router.scatter(fn)
+    return [await fn(db)]
+
+
+INCLUDE_ARCHIVED = Query(False, description="Учитывать задачи из архива (tasks_archive)")
+
+
+async def archived_by_quadrant(session: AsyncSession, current_user: User) -> Dict[str, int]:
+    """Число архивных (завершенных) задач по квадрантам."""
+    stmt = select(TaskArchive.quadrant, func.count(TaskArchive.id)).group_by(TaskArchive.quadrant)
+    if current_user.role != UserRole.ADMIN:
+        stmt = stmt.where(TaskArchive.user_id == current_user.id)
+    result = await session.execute(stmt)
+    return {quadrant: count for quadrant, count in result.all()}
+
+
 @router.get("/", response_model=dict)
 async def get_tasks_stats(
-    db: AsyncSession = Depends(get_async_session),
+    include_archived: bool = INCLUDE_ARCHIVED,
+    db: AsyncSession = Depends(get_shard_session),
     current_user: User = Depends(get_current_user),
 ) -> dict:
-    # Общее количество задач
-    # Admins see all; users only their tasks
-    base_stmt = select(func.count(Task.id))
-    if current_user.role != UserRole.ADMIN:
-        base_stmt = select(func.count(Task.id)).where(Task.user_id == current_user.id)
-    total_result = await db.execute(base_stmt)
-    total_tasks = total_result.scalar() or 0
+    async def compute(session: AsyncSession) -> dict:
+        # Общее количество задач
+        # Admins see all; users only their tasks
+        base_stmt = select(func.count(Task.id))
+        if current_user.role != UserRole.ADMIN:
+            base_stmt = select(func.count(Task.id)).where(Task.user_id == current_user.id)
+        total_result = await session.execute(base_stmt)
+        total_tasks = total_result.scalar() or 0
 
-    # Подсчет по квадрантам (одним запросом)
-    stmt = select(Task.quadrant, func.count(Task.id).label('count')).group_by(Task.quadrant)
-    if current_user.role != UserRole.ADMIN:
-        stmt = stmt.where(Task.user_id == current_user.id)
-    quadrant_result = await db.execute(stmt)
-    by_quadrant = {"Q1": 0, "Q2": 0, "Q3": 0, "Q4": 0}
-    for row in quadrant_result:
-        # row is a RowMapping or tuple; try to access attributes
-        try:
-            q = row.quadrant
-            c = row.count
-        except Exception:
-            q, c = row[0], row[1]
-        by_quadrant[q] = c
-
-    # Подсчет по статусу (одним запросом)
-    stat_stmt = select(
-        func.count(case((Task.completed == True, 1))).label('completed'),
-        func.count(case((Task.completed == False, 1))).label('pending')
-    )
-    if current_user.role != UserRole.ADMIN:
-        stat_stmt = stat_stmt.select_from(Task).where(Task.user_id == current_user.id)
-    status_result = await db.execute(stat_stmt)
-    status_row = status_result.one()
-    by_status = {
-        "completed": status_row.completed or 0,
-        "pending": status_row.pending or 0
-    }
+        # Подсчет по квадрантам (одним запросом)
+        stmt = select(Task.quadrant, func.count(Task.id).label('count')).group_by(Task.quadrant)
+        if current_user.role != UserRole.ADMIN:
+            stmt = stmt.where(Task.user_id == current_user.id)
+        quadrant_result = await session.execute(stmt)
+        by_quadrant = {"Q1": 0, "Q2": 0, "Q3": 0, "Q4": 0}
+        for row in quadrant_result:
+            # row is a RowMapping or tuple; try to access attributes
+            try:
+                q = row.quadrant
+                c = row.count
+            except Exception:
+                q, c = row[0], row[1]
+            by_quadrant[q] = c
 
-    return {
-        "total_tasks": total_tasks,
-        "by_quadrant": by_quadrant,
-        "by_status": by_status
-    }
+        # Подсчет по статусу (одним запросом)
+        stat_stmt = select(
+            func.count(case((Task.completed == True, 1))).label('completed'),
+            func.count(case((Task.completed == False, 1))).label('pending')
+        )
+        if current_user.role != UserRole.ADMIN:
+            stat_stmt = stat_stmt.select_from(Task).where(Task.user_id == current_user.id)
+        status_result = await session.execute(stat_stmt)
+        status_row = status_result.one()
+        by_status = {
+            "completed": status_row.completed or 0,
+            "pending": status_row.pending or 0
+        }
+
+        if include_archived:
+            # Архив содержит только завершенные задачи
+            for q, c in (await archived_by_quadrant(session, current_user)).items():
+                by_quadrant[q] = by_quadrant.get(q, 0) + c
+                total_tasks += c
+                by_status["completed"] += c
+
+        return {
+            "total_tasks": total_tasks,
+            "by_quadrant": by_quadrant,
+            "by_status": by_status
+        }
+
+    # Объединяем результаты шардов (для одного шарда — просто один результат)
+    parts = await run_scoped(db, current_user, compute)
+    stats = parts[0]
+    for part in parts[1:]:
+        stats["total_tasks"] += part["total_tasks"]
+        for key in stats["by_quadrant"]:
+            stats["by_quadrant"][key] += part["by_quadrant"].get(key, 0)
+        for key in stats["by_status"]:
+            stats["by_status"][key] += part["by_status"][key]
+    return stats
 
 
 @router.get("/deadlines", response_model=List[Dict[str, Any]])
 async def get_deadlines_stats(
-    db: AsyncSession = Depends(get_async_session),
+    db: AsyncSession = Depends(get_shard_session),
     current_user: User = Depends(get_current_user),
 ):
     """
@@ -75,26 +126,22 @@ async def get_deadlines_stats(
     stmt = select(Task).where(Task.completed == False).order_by(Task.deadline_at)
     if current_user.role != UserRole.ADMIN:
         stmt = stmt.where(Task.user_id == current_user.id)
-    result = await db.execute(stmt)
-    tasks = result.scalars().all()
 
-    stats = []
-    now = datetime.now(timezone.utc)
+    async def fetch(session: AsyncSession) -> List[Task]:
+        result = await session.execute(stmt)
+        return result.scalars().all()
 
-    for task in tasks:
-        days_left = None
-        if task.deadline_at:
-            # Сравниваем в UTC, учитываем возможный tzinfo
-            try:
-                deadline_date = task.deadline_at
-                if deadline_date.tzinfo is None:
-                    # treat as UTC
-                    from datetime import timezone as _tz
-                    deadline_date = deadline_date.replace(tzinfo=_tz.utc)
-                days_left = (deadline_date.date() - now.date()).days
-            except Exception:
-                days_left = None
+    parts = await run_scoped(db, current_user, fetch)
+    tasks = [task for part in parts for task in part]
+    if len(parts) > 1:
+        # Порядок как у ORDER BY deadline_at в PostgreSQL: задачи без дедлайна в конце
+        tasks.sort(key=lambda t: (t.deadline_at is None, t.deadline_at.timestamp() if t.deadline_at else 0))
+
+    # Дни до дедлайна — одним пакетным расчетом с общим опорным временем
+    days = calculate_days_until_deadline_batch([task.deadline_at for task in tasks], calendar=True)
+    stats = []
 
+    for task, days_left in zip(tasks, days):
         stats.append({
             "id": task.id,
             "title": task.title,
@@ -111,7 +158,8 @@ async def get_deadlines_stats(
 
 @router.get("/timing", response_model=TimingStatsResponse)
 async def get_deadline_stats(
-    db: AsyncSession = Depends(get_async_session),
+    include_archived: bool = INCLUDE_ARCHIVED,
+    db: AsyncSession = Depends(get_shard_session),
     current_user: User = Depends(get_current_user),
 ) -> TimingStatsResponse:
     """
@@ -120,6 +168,7 @@ async def get_deadline_stats(
     - completed_late: завершенные поздно
     - on_plan_pending: незавершенные с дедлайном в будущем
     - overtime_pending: незавершенные просроченные
+    С include_archived=true завершенные считаются и по архиву.
     """
     now_utc = datetime.now(timezone.utc)
 
@@ -140,12 +189,71 @@ async def get_deadline_stats(
     if current_user.role != UserRole.ADMIN:
         statement = statement.where(Task.user_id == current_user.id)
 
-    result = await db.execute(statement)
-    stats_row = result.one()
+    archive_statement = select(
+        func.sum(case((TaskArchive.completed_at <= TaskArchive.deadline_at, 1), else_=0)).label("completed_on_time"),
+        func.sum(case((TaskArchive.completed_at > TaskArchive.deadline_at, 1), else_=0)).label("completed_late"),
+    ).select_from(TaskArchive)
+    if current_user.role != UserRole.ADMIN:
+        archive_statement = archive_statement.where(TaskArchive.user_id == current_user.id)
+
+    async def compute(session: AsyncSession):
+        result = await session.execute(statement)
+        row = result.one()
+        if not include_archived:
+            return row, None
+        archived = await session.execute(archive_statement)
+        return row, archived.one()
+
+    parts = await run_scoped(db, current_user, compute)
+    rows = [row for row, _ in parts]
+    archived_rows = [archived for _, archived in parts if archived is not None]
 
     return TimingStatsResponse(
-        completed_on_time=stats_row.completed_on_time or 0,
-        completed_late=stats_row.completed_late or 0,
-        on_plan_pending=stats_row.on_plan_pending or 0,
-        overtime_pending=stats_row.overdue_pending or 0,
-    )
\ No newline at end of file
+        completed_on_time=sum(row.completed_on_time or 0 for row in rows + archived_rows),
+        completed_late=sum(row.completed_late or 0 for row in rows + archived_rows),
+        on_plan_pending=sum(row.on_plan_pending or 0 for row in rows),
+        overtime_pending=sum(row.overdue_pending or 0 for row in rows),
+    )
+
+@router.get("/analytics", response_model=AnalyticsResponse)
+async def get_analytics(
+    granularity: Literal["day", "week", "month"] = Query("day", description="Размер периода"),
+    start: Optional[date] = Query(None, description="Первый день (по умолчанию — 30 дней назад)"),
+    end: Optional[date] = Query(None, description="Последний день (по умолчанию — сегодня, UTC)"),
+    scope: Literal["user", "global"] = Query("user", description="user — свои задачи, global — все пользователи (админ)"),
+    db: AsyncSession = Depends(get_shard_session),
+    current_user: User = Depends(get_current_user),
+) -> AnalyticsResponse:
+    """
+    Динамика по дням, неделям или месяцам: создано, завершено, завершено в срок и с опозданием.
+    Считается по счетчикам task_rollups (rollups.py), без чтения задач.
+    """
+    end = end or datetime.now(timezone.utc).date()
+    start = start or end - timedelta(days=30)
+    if end < start:
+        raise HTTPException(status_code=400, detail="Конец периода раньше начала")
+    if (end - start).days > ANALYTICS_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"Период не должен превышать {ANALYTICS_MAX_DAYS} дней")
+    if scope == "global" and current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Глобальная аналитика доступна только администраторам")
+
+    stmt = range_statement(start, end, None if scope == "global" else current_user.id)
+
+    async def fetch(session: AsyncSession) -> list:
+        result = await session.execute(stmt)
+        return result.all()
+
+    if scope == "global" and shard_router.enabled:
+        parts = await shard_router.scatter(fetch)
+    else:
+        parts = [await fetch(db)]
+    buckets = fold_buckets((row for part in parts for row in part), start, end, granularity)
+
+    return AnalyticsResponse(
+        granularity=granularity,
+        scope=scope,
+        start=start,
+        end=end,
+        totals=AnalyticsBucket(bucket_start=start, **{name: sum(b[name] for b in buckets) for name in METRICS}),
+        buckets=[AnalyticsBucket(**bucket) for bucket in buckets],
+    )
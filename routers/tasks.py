@@ -1,15 +1,25 @@
-from fastapi import APIRouter, HTTPException, Depends, Query, status
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, status, UploadFile, File
 
-from typing import List, Optional
-from datetime import datetime, date
+from typing import List, Literal, Optional
+from datetime import datetime, date, timezone
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
-
-from schemas import TaskCreate, TaskUpdate, TaskResponse
-from models import Task, User, UserRole
+from sqlalchemy import select, func, union_all
+
+from schemas import TaskCreate, TaskUpdate, TaskResponse, TaskImportReport, TrashedTaskResponse
+from models import Task, TaskArchive, User, UserRole
+from utils import calculate_urgency, calculate_days_until_deadline_batch, determine_quadrant
+from dependencies import get_current_user, get_shard_session, get_task_shard_session
+from sharding import shard_router
+from write_coalescer import run_write
+from importer import detect_format, import_tasks as run_import, SUPPORTED_FORMATS
+from admission import admin_scope_admission
 from database import get_async_session
-from utils import calculate_urgency, calculate_days_until_deadline, determine_quadrant
-from dependencies import get_current_user
+from idempotency import get_idempotency_key, request_fingerprint, run_idempotent
+from recurrence import on_task_completed
+from rollups import record_created, record_completed
+from task_query import build_statement, parse_fields, parse_sort, project_rows, sort_rows
+from negotiation import negotiated_response
+from trash import list_trash, purge_at, restore_task as run_restore, soft_delete_task
 
 router = APIRouter(
     prefix="/tasks",
@@ -19,7 +29,7 @@ router = APIRouter(
 
 # ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ вынесены в `utils.py`
 
-def task_to_response(task: Task) -> TaskResponse:
+def task_to_response(task: Task, days_to_deadline: Optional[int] = None) -> TaskResponse:
     """Конвертирует SQLAlchemy модель в Pydantic схему (вычисляемые поля будут добавлены схемой)."""
     return TaskResponse(
         id=task.id,
@@ -30,47 +40,115 @@ def task_to_response(task: Task) -> TaskResponse:
         quadrant=task.quadrant,
         completed=task.completed,
         created_at=task.created_at,
+        days_to_deadline=days_to_deadline,
     )
 
-# GET ВСЕ ЗАДАЧИ
-@router.get("/", response_model=List[TaskResponse])
+def tasks_to_responses(tasks: List[Task]) -> List[TaskResponse]:
+    """Конвертирует список задач; дни до дедлайна считаются одной пачкой с общим опорным временем."""
+    days = calculate_days_until_deadline_batch([task.deadline_at for task in tasks], calendar=True)
+    return [task_to_response(task, days_left) for task, days_left in zip(tasks, days)]
+
+async def fetch_tasks(db: AsyncSession, stmt, current_user: User) -> List[Task]:
+    """Выполняет выборку задач: для администратора — на всех шардах (scatter-gather)."""
+    if current_user.role == UserRole.ADMIN and shard_router.enabled:
+        async def run(session: AsyncSession) -> List[Task]:
+            result = await session.execute(stmt)
+            return result.scalars().all()
+        parts = await shard_router.scatter(run)
+        return [task for part in parts for task in part]
+    result = await db.execute(stmt)
+    return result.scalars().all()
+
+# GET ВСЕ ЗАДАЧИ (фильтры, сортировка, проекция полей)
+@router.get("/", response_model=List[TaskResponse], dependencies=[Depends(admin_scope_admission("heavy"))])
 async def get_all_tasks(
-    db: AsyncSession = Depends(get_async_session),
+    request: Request,
+    quadrant: Optional[List[Literal["Q1", "Q2", "Q3", "Q4"]]] = Query(None, description="Квадрант (можно несколько)"),
+    status: Optional[Literal["completed", "pending"]] = Query(None, description="Статус"),
+    is_important: Optional[bool] = Query(None, description="Важность"),
+    deadline_from: Optional[datetime] = Query(None, description="Дедлайн не раньше"),
+    deadline_to: Optional[datetime] = Query(None, description="Дедлайн не позже"),
+    created_from: Optional[datetime] = Query(None, description="Создана не раньше"),
+    created_to: Optional[datetime] = Query(None, description="Создана не позже"),
+    sort: Optional[str] = Query(None, description="Ключи сортировки через запятую, '-' — по убыванию: -deadline_at,created_at"),
+    fields: Optional[str] = Query(None, description="Поля ответа через запятую: id,title,deadline_at"),
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_shard_session),
     current_user: User = Depends(get_current_user),
 ):
+    """
+    Задачи с комбинируемыми фильтрами (см. task_query.py). Без параметров — все задачи,
+    как раньше. С fields= из БД читаются только нужные колонки, а в ответе есть только
+    запрошенные поля. Формат и сжатие ответа — по Accept/Accept-Encoding (negotiation.py).
+    """
+    try:
+        field_names = parse_fields(fields)
+        sort_keys = parse_sort(sort)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     # Admins see all tasks; regular users see only their tasks
-    if current_user.role == UserRole.ADMIN:
-        result = await db.execute(select(Task))
+    scatter = current_user.role == UserRole.ADMIN and shard_router.enabled
+    stmt = build_statement(
+        None if current_user.role == UserRole.ADMIN else current_user.id,
+        field_names,
+        sort_keys,
+        quadrants=quadrant,
+        status=status,
+        is_important=is_important,
+        deadline_from=deadline_from,
+        deadline_to=deadline_to,
+        created_from=created_from,
+        created_to=created_to,
+        # Со всех шардов берем limit + offset строк, смещение применяем после слияния
+        limit=None if limit is None else limit + offset if scatter else limit,
+    )
+    if not scatter and offset:
+        stmt = stmt.offset(offset)
+
+    async def run(session: AsyncSession) -> list:
+        result = await session.execute(stmt)
+        return result.scalars().all() if field_names is None else result.all()
+
+    if scatter:
+        rows = sort_rows([row for part in await shard_router.scatter(run) for row in part], sort_keys)
+        rows = rows[offset:] if limit is None else rows[offset:offset + limit]
     else:
-        result = await db.execute(select(Task).where(Task.user_id == current_user.id))
-    tasks = result.scalars().all()
-    return [task_to_response(task) for task in tasks]
+        rows = await run(db)
+
+    if field_names is None:
+        content = [response.model_dump(mode="json") for response in tasks_to_responses(rows)]
+    else:
+        content = project_rows(rows, field_names)
+    return await negotiated_response(request, content)
 
 
 # GET ЗАДАЧИ ПО КВАДРАНТУ
 @router.get("/quadrant/{quadrant}", response_model=List[TaskResponse])
 async def get_tasks_by_quadrant(
     quadrant: str,
-    db: AsyncSession = Depends(get_async_session),
+    db: AsyncSession = Depends(get_shard_session),
     current_user: User = Depends(get_current_user),
 ):
     if quadrant not in ["Q1", "Q2", "Q3", "Q4"]:
         raise HTTPException(status_code=400, detail="Неверный квадрант. Используйте: Q1, Q2, Q3, Q4")
     
     if current_user.role == UserRole.ADMIN:
-        result = await db.execute(select(Task).where(Task.quadrant == quadrant))
+        tasks = await fetch_tasks(db, select(Task).where(Task.quadrant == quadrant), current_user)
     else:
-        result = await db.execute(
-            select(Task).where((Task.quadrant == quadrant) & (Task.user_id == current_user.id))
+        tasks = await fetch_tasks(
+            db,
+            select(Task).where((Task.quadrant == quadrant) & (Task.user_id == current_user.id)),
+            current_user,
         )
-    tasks = result.scalars().all()
-    return [task_to_response(task) for task in tasks]
+    return tasks_to_responses(tasks)
 
 # ПОИСК ЗАДАЧ
 @router.get("/search", response_model=List[TaskResponse])
 async def search_tasks(
     q: str = Query(..., min_length=2),
-    db: AsyncSession = Depends(get_async_session),
+    db: AsyncSession = Depends(get_shard_session),
     current_user: User = Depends(get_current_user),
 ):
     keyword = f"%{q.lower()}%"
@@ -79,19 +157,18 @@ async def search_tasks(
     )
     if current_user.role != UserRole.ADMIN:
         stmt = stmt.where(Task.user_id == current_user.id)
-    result = await db.execute(stmt)
-    tasks = result.scalars().all()
+    tasks = await fetch_tasks(db, stmt, current_user)
     
     if not tasks:
         raise HTTPException(status_code=404, detail="По данному запросу ничего не найдено")
     
-    return [task_to_response(task) for task in tasks]
+    return tasks_to_responses(tasks)
 
 
 # GET ЗАДАЧИ, срок которых истекает сегодня
 @router.get("/today", response_model=List[TaskResponse])
 async def get_tasks_due_today(
-    db: AsyncSession = Depends(get_async_session),
+    db: AsyncSession = Depends(get_shard_session),
     current_user: User = Depends(get_current_user),
 ):
     """Возвращает задачи, у которых дедлайн — сегодня (по дате)."""
@@ -99,15 +176,36 @@ async def get_tasks_due_today(
     stmt = select(Task).where(func.date(Task.deadline_at) == today)
     if current_user.role != UserRole.ADMIN:
         stmt = stmt.where(Task.user_id == current_user.id)
+    tasks = await fetch_tasks(db, stmt, current_user)
+    return tasks_to_responses(tasks)
+
+# GET TOP-K ЗАДАЧ "ЧТО ДЕЛАТЬ ДАЛЬШЕ"
+@router.get("/next", response_model=List[TaskResponse])
+async def get_next_tasks(
+    k: int = Query(5, ge=1, le=100, description="Количество задач"),
+    db: AsyncSession = Depends(get_shard_session),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Возвращает K незавершенных задач текущего пользователя в порядке приоритета:
+    квадрант (Q1 → Q4, т.е. важность и срочность), затем ближайший дедлайн.
+    Порядок совпадает с индексом ix_tasks_user_next, поэтому БД читает только K строк.
+    """
+    stmt = (
+        select(Task)
+        .where((Task.user_id == current_user.id) & (Task.completed == False))
+        .order_by(Task.quadrant, Task.deadline_at.asc().nulls_last(), Task.id)
+        .limit(k)
+    )
     result = await db.execute(stmt)
     tasks = result.scalars().all()
-    return [task_to_response(task) for task in tasks]
+    return tasks_to_responses(tasks)
 
 # GET ЗАДАЧИ ПО СТАТУСУ
 @router.get("/status/{status}", response_model=List[TaskResponse])
 async def get_tasks_by_status(
     status: str,
-    db: AsyncSession = Depends(get_async_session),
+    db: AsyncSession = Depends(get_shard_session),
     current_user: User = Depends(get_current_user),
 ):
     if status not in ["completed", "pending"]:
@@ -117,15 +215,68 @@ async def get_tasks_by_status(
     stmt = select(Task).where(Task.completed == is_completed)
     if current_user.role != UserRole.ADMIN:
         stmt = stmt.where(Task.user_id == current_user.id)
-    result = await db.execute(stmt)
-    tasks = result.scalars().all()
-    return [task_to_response(task) for task in tasks]
+    tasks = await fetch_tasks(db, stmt, current_user)
+    return tasks_to_responses(tasks)
+
+# GET ИСТОРИЯ ЗАВЕРШЕННЫХ ЗАДАЧ
+@router.get("/history", response_model=List[TaskResponse])
+async def get_task_history(
+    request: Request,
+    limit: int = Query(50, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+    include_archived: bool = Query(False, description="Включить задачи из архива (tasks_archive)"),
+    db: AsyncSession = Depends(get_shard_session),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Завершенные задачи текущего пользователя, последние завершенные — первыми.
+    Задачи, завершенные больше ARCHIVE_AFTER_DAYS дней назад, лежат в архиве
+    и попадают в выборку только с include_archived=true.
+    """
+    fields = ("id", "title", "description", "is_important", "deadline_at", "quadrant", "completed", "created_at", "completed_at")
+    stmt = select(*(getattr(Task, name) for name in fields)).where(
+        Task.user_id == current_user.id,
+        Task.completed == True,
+    )
+    if include_archived:
+        archived = select(*(getattr(TaskArchive, name) for name in fields)).where(
+            TaskArchive.user_id == current_user.id
+        )
+        history = union_all(stmt, archived).subquery()
+        stmt = select(history).order_by(history.c.completed_at.desc().nulls_last(), history.c.id.desc())
+    else:
+        stmt = stmt.order_by(Task.completed_at.desc().nulls_last(), Task.id.desc())
+
+    result = await db.execute(stmt.limit(limit).offset(offset))
+    return await negotiated_response(request, [response.model_dump(mode="json") for response in tasks_to_responses(result.all())])
+
+# GET КОРЗИНА
+@router.get("/trash", response_model=List[TrashedTaskResponse])
+async def get_trash(
+    limit: int = Query(50, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_shard_session),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Удаленные задачи текущего пользователя, последние удаленные — первыми.
+    До purge_at задачу можно восстановить: POST /tasks/{task_id}/restore.
+    """
+    tasks = await list_trash(db, current_user.id, limit, offset)
+    return [
+        TrashedTaskResponse(
+            **response.model_dump(exclude={"status_message"}),
+            deleted_at=task.deleted_at,
+            purge_at=purge_at(task.deleted_at),
+        )
+        for task, response in zip(tasks, tasks_to_responses(tasks))
+    ]
 
 # GET ЗАДАЧА ПО ID
 @router.get("/{task_id}", response_model=TaskResponse)
 async def get_task_by_id(
     task_id: int,
-    db: AsyncSession = Depends(get_async_session),
+    db: AsyncSession = Depends(get_task_shard_session),
     current_user: User = Depends(get_current_user),
 ):
     result = await db.execute(select(Task).where(Task.id == task_id))
@@ -144,106 +295,205 @@ async def get_task_by_id(
 @router.post("/", response_model=TaskResponse, status_code=status.HTTP_201_CREATED)
 async def create_task(
     task: TaskCreate,
-    db: AsyncSession = Depends(get_async_session),
+    db: AsyncSession = Depends(get_shard_session),
+    primary_db: AsyncSession = Depends(get_async_session),
     current_user: User = Depends(get_current_user),
+    idempotency_key: Optional[str] = Depends(get_idempotency_key),
 ):
-    # Определяем квадрант на основе важности и дедлайна
-    quadrant = determine_quadrant(task.is_important, task.deadline_at)
-    # Обновим флаг срочности в модели для консистентности
-    is_urgent = calculate_urgency(task.deadline_at)
-    
-    new_task = Task(
-        title=task.title,
-        description=task.description,
-        is_important=task.is_important,
-        is_urgent=is_urgent,
-        deadline_at=task.deadline_at,
-        quadrant=quadrant,
-        completed=False,
-        user_id=current_user.id,
+    async def create() -> TaskResponse:
+        # Срочность по дедлайну, квадрант — по важности и срочности
+        is_urgent = calculate_urgency(task.deadline_at)
+        quadrant = determine_quadrant(task.is_important, is_urgent)
+
+        new_task = Task(
+            title=task.title,
+            description=task.description,
+            is_important=task.is_important,
+            is_urgent=is_urgent,
+            deadline_at=task.deadline_at,
+            quadrant=quadrant,
+            completed=False,
+            user_id=current_user.id,
+        )
+
+        db.add(new_task)
+        await record_created(db, current_user.id)
+        if idempotency_key and db is primary_db:
+            # На шарде 0 (та же сессия) задача фиксируется вместе с сохраненным ответом:
+            # сбой между двумя COMMIT оставил бы задачу без ответа, и повтор создал бы ее снова
+            await db.flush()
+        else:
+            await db.commit()
+        await db.refresh(new_task)
+
+        return task_to_response(new_task)
+
+    # Повтор с тем же Idempotency-Key получает сохраненный ответ, задача не создается повторно
+    return await run_idempotent(
+        primary_db,
+        current_user.id,
+        idempotency_key,
+        request_fingerprint("POST /tasks/", task.model_dump(mode="json")),
+        create,
+        status_code=status.HTTP_201_CREATED,
+    )
+
+# POST - МАССОВЫЙ ИМПОРТ ЗАДАЧ (CSV / NDJSON)
+@router.post("/import", response_model=TaskImportReport)
+async def import_tasks(
+    file: UploadFile = File(..., description="Файл CSV или NDJSON с задачами"),
+    format: Optional[str] = Query(None, description="Формат файла: csv или ndjson"),
+    db: AsyncSession = Depends(get_shard_session),
+    primary_db: AsyncSession = Depends(get_async_session),
+    current_user: User = Depends(get_current_user),
+    idempotency_key: Optional[str] = Depends(get_idempotency_key),
+):
+    """
+    Импорт задач из файла. Колонки/ключи: title, description, is_important, deadline_at.
+    Строки с ошибками пропускаются и попадают в отчет.
+    С заголовком Idempotency-Key повторная отправка того же файла вернет первый отчет.
+    """
+    fmt = detect_format(file, format)
+    if fmt not in SUPPORTED_FORMATS:
+        raise HTTPException(status_code=400, detail="Неизвестный формат файла. Используйте: csv или ndjson")
+
+    async def run() -> TaskImportReport:
+        # С ключом импорт атомарный: при сбое ключ освобождается, и повтор не вставит
+        # уже зафиксированные пачки второй раз
+        report = await run_import(db, file, fmt, current_user.id, atomic=idempotency_key is not None)
+        if idempotency_key and db is not primary_db:
+            # На шарде 0 (та же сессия) задачи фиксируются вместе с сохраненным ответом
+            await db.commit()
+        return TaskImportReport(**report)
+
+    # Файл не читается целиком ради отпечатка: достаточно имени, размера и формата
+    return await run_idempotent(
+        primary_db,
+        current_user.id,
+        idempotency_key,
+        request_fingerprint("POST /tasks/import", [file.filename, file.size, fmt]),
+        run,
     )
-    
-    db.add(new_task)
-    await db.commit()
-    await db.refresh(new_task)
-    
-    return task_to_response(new_task)
 
 # PUT - ОБНОВЛЕНИЕ ЗАДАЧИ
 @router.put("/{task_id}", response_model=TaskResponse)
 async def update_task(
     task_id: int,
     task_update: TaskUpdate,
-    db: AsyncSession = Depends(get_async_session),
+    db: AsyncSession = Depends(get_task_shard_session),
     current_user: User = Depends(get_current_user),
 ):
-    # Находим задачу
-    result = await db.execute(select(Task).where(Task.id == task_id))
-    task = result.scalar_one_or_none()
-
-    if not task:
-        raise HTTPException(status_code=404, detail="Задача не найдена")
-
-    if current_user.role != UserRole.ADMIN and task.user_id != current_user.id:
-        raise HTTPException(status_code=404, detail="Задача не найдена")
-
     # Обновляем только переданные поля
     update_data = task_update.model_dump(exclude_unset=True)
 
-    for field, value in update_data.items():
-        setattr(task, field, value)
-
-    # Пересчитываем квадрант/срочность если изменилась важность или дедлайн
-    if "is_important" in update_data or "deadline_at" in update_data:
-        task.quadrant = determine_quadrant(task.is_important, task.deadline_at)
-        task.is_urgent = calculate_urgency(task.deadline_at)
-
-    await db.commit()
-    await db.refresh(task)
-    
-    return task_to_response(task)
+    async def apply(session: AsyncSession) -> TaskResponse:
+        # Находим задачу
+        result = await session.execute(select(Task).where(Task.id == task_id))
+        task = result.scalar_one_or_none()
+
+        if not task:
+            raise HTTPException(status_code=404, detail="Задача не найдена")
+
+        if current_user.role != UserRole.ADMIN and task.user_id != current_user.id:
+            raise HTTPException(status_code=404, detail="Задача не найдена")
+
+        was_completed = task.completed
+        # Смена дедлайна завершенной задачи меняет ее учет "в срок"/"с опозданием":
+        # завершение снимается со счетчиков по старому дедлайну и учитывается по новому
+        redeadlined = was_completed and "deadline_at" in update_data
+        if redeadlined:
+            await record_completed(session, task, sign=-1)
+
+        for field, value in update_data.items():
+            setattr(task, field, value)
+
+        # Смена статуса через PUT учитывается в счетчиках аналитики так же, как /complete
+        if task.completed and not was_completed:
+            task.completed_at = datetime.now(timezone.utc)
+            await record_completed(session, task)
+        elif was_completed and not task.completed:
+            if not redeadlined:
+                await record_completed(session, task, sign=-1)
+            # Повторное завершение учитывается в свой день, а не в день прежнего завершения
+            task.completed_at = None
+        elif redeadlined:
+            await record_completed(session, task)
+
+        # Пересчитываем квадрант/срочность если изменилась важность или дедлайн
+        if "is_important" in update_data or "deadline_at" in update_data:
+            task.is_urgent = calculate_urgency(task.deadline_at)
+            task.quadrant = determine_quadrant(task.is_important, task.is_urgent)
+
+        await session.flush()
+        return task_to_response(task)
+
+    # При GROUP_COMMIT_ENABLED изменение фиксируется вместе с параллельными записями
+    return await run_write(db, apply)
 
 # PATCH - ОТМЕТИТЬ ЗАДАЧУ ВЫПОЛНЕННОЙ
 @router.patch("/{task_id}/complete", response_model=TaskResponse)
 async def complete_task(
     task_id: int,
-    db: AsyncSession = Depends(get_async_session),
+    db: AsyncSession = Depends(get_task_shard_session),
     current_user: User = Depends(get_current_user),
 ):
-    result = await db.execute(select(Task).where(Task.id == task_id))
-    task = result.scalar_one_or_none()
+    async def apply(session: AsyncSession) -> TaskResponse:
+        result = await session.execute(select(Task).where(Task.id == task_id))
+        task = result.scalar_one_or_none()
 
-    if not task:
-        raise HTTPException(status_code=404, detail="Задача не найдена")
+        if not task:
+            raise HTTPException(status_code=404, detail="Задача не найдена")
 
-    if current_user.role != UserRole.ADMIN and task.user_id != current_user.id:
-        raise HTTPException(status_code=404, detail="Задача не найдена")
+        if current_user.role != UserRole.ADMIN and task.user_id != current_user.id:
+            raise HTTPException(status_code=404, detail="Задача не найдена")
 
-    task.completed = True
-    task.completed_at = datetime.now()
+        if not task.completed:
+            task.completed = True
+            task.completed_at = datetime.now(timezone.utc)
+            await record_completed(session, task)
+        # Для повторяющейся задачи создаем следующее вхождение (если оно в окне срочности)
+        await on_task_completed(session, task)
 
-    await db.commit()
-    await db.refresh(task)
+        await session.flush()
+        return task_to_response(task)
 
-    return task_to_response(task)
+    return await run_write(db, apply)
+
+# POST - ВОССТАНОВЛЕНИЕ ЗАДАЧИ ИЗ КОРЗИНЫ
+@router.post("/{task_id}/restore", response_model=TaskResponse)
+async def restore_task(
+    task_id: int,
+    db: AsyncSession = Depends(get_task_shard_session),
+    current_user: User = Depends(get_current_user),
+):
+    owner_id = None if current_user.role == UserRole.ADMIN else current_user.id
 
-# DELETE - УДАЛЕНИЕ ЗАДАЧИ
+    async def apply(session: AsyncSession) -> TaskResponse:
+        task = await run_restore(session, task_id, owner_id)
+        if task is None:
+            raise HTTPException(status_code=404, detail="Задача не найдена в корзине")
+        return task_to_response(task)
+
+    return await run_write(db, apply)
+
+# DELETE - УДАЛЕНИЕ ЗАДАЧИ (в корзину)
 @router.delete("/{task_id}", status_code=status.HTTP_200_OK)
 async def delete_task(
     task_id: int,
-    db: AsyncSession = Depends(get_async_session),
+    db: AsyncSession = Depends(get_task_shard_session),
     current_user: User = Depends(get_current_user),
 ):
-    result = await db.execute(select(Task).where(Task.id == task_id))
-    task = result.scalar_one_or_none()
-    if not task:
-        raise HTTPException(status_code=404, detail="Задача не найдена")
+    """
+    Перемещает задачу в корзину одним UPDATE, без загрузки задачи. Окончательно задача
+    удаляется фоновым заданием purge_trash через TRASH_RETENTION_DAYS дней.
+    """
+    owner_id = None if current_user.role == UserRole.ADMIN else current_user.id
 
-    if current_user.role != UserRole.ADMIN and task.user_id != current_user.id:
-        raise HTTPException(status_code=404, detail="Задача не найдена")
+    async def apply(session: AsyncSession) -> bool:
+        return await soft_delete_task(session, task_id, owner_id)
 
-    await db.delete(task)
-    await db.commit()
+    if not await run_write(db, apply):
+        raise HTTPException(status_code=404, detail="Задача не найдена")
 
     return {
         "message": "Задача успешно удалена",
@@ -1,41 +1,128 @@
+import asyncio
+import os
+import tempfile
+from datetime import timezone
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from sqlalchemy import select
-from database import AsyncSessionLocal
+from dotenv import load_dotenv
+from sqlalchemy import select, text
+from database import AsyncSessionLocal, engine
 from models import Task
-from utils import calculate_urgency, determine_quadrant
-from datetime import datetime
+from sharding import shard_router
+from utils import calculate_urgency_batch, determine_quadrant_batch
+import jobs
+from digest import DIGEST_HOUR
+from app_logging import get_logger
 
+try:
+    import fcntl
+except ImportError:  # Windows: блокировка файла недоступна, планировщик запускается в каждом процессе
+    fcntl = None
 
-async def update_task_urgency():
-    print(f"[{datetime.now()}] Запуск автоматического обновления срочности задач...")
+load_dotenv()
+log = get_logger(__name__)
+
+# Планировщик работает в одном процессе из всех воркеров: в том, кто захватил
+# блокировку (pg_advisory_lock в PostgreSQL, flock файла SCHEDULER_LOCK_FILE для SQLite).
+# Остальные раз в SCHEDULER_LEADER_RETRY_SECONDS пробуют захватить ее снова.
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "true").lower() in ("1", "true", "yes")
+SCHEDULER_LOCK_FILE = os.getenv("SCHEDULER_LOCK_FILE", os.path.join(tempfile.gettempdir(), "todo-scheduler.lock"))
+SCHEDULER_LEADER_RETRY_SECONDS = float(os.getenv("SCHEDULER_LEADER_RETRY_SECONDS", "30"))
+SCHEDULER_LOCK_KEY = 7_310_041
+
+
+async def _update_shard_urgency(db) -> tuple:
+    """Пересчитывает срочность на одном шарде. Возвращает (проверено, обновлено)."""
+    try:
+        result = await db.execute(select(Task).where(Task.completed == False))
+        tasks = result.scalars().all()
+        # Срочность и квадранты всей выборки — одним пакетным расчетом с общим опорным временем
+        urgency = calculate_urgency_batch([task.deadline_at for task in tasks])
+        quadrants = determine_quadrant_batch([task.is_important for task in tasks], urgency)
+        updated_count = 0
+        for task, new_urgency, new_quadrant in zip(tasks, urgency, quadrants):
+            if task.is_urgent != new_urgency or task.quadrant != new_quadrant:
+                task.is_urgent = new_urgency
+                task.quadrant = new_quadrant
+                updated_count += 1
+        if updated_count > 0:
+            await db.commit()
+        return len(tasks), updated_count
+    except Exception as e:
+        log.exception("Ошибка при обновлении срочности: %s", e)
+        await db.rollback()
+        raise
+
+
+async def update_task_urgency() -> dict:
+    log.info("Запуск автоматического обновления срочности задач...")
+    checked = updated = 0
+    for session_maker in shard_router.sessionmakers:
+        async with session_maker() as db:
+            shard_checked, shard_updated = await _update_shard_urgency(db)
+        checked += shard_checked
+        updated += shard_updated
+    if updated > 0:
+        log.info(
+            "Обновлено задач: %s из %s", updated, checked,
+            extra={"fields": {"updated": updated, "checked": checked}},
+        )
+    else:
+        log.info(
+            "Изменений не требуется. Проверено задач: %s", checked,
+            extra={"fields": {"updated": 0, "checked": checked}},
+        )
+    return {"checked": checked, "updated": updated}
+
+
+async def enqueue_urgency_update():
+    """Ставит пересчет срочности в очередь фоновых заданий (выполняет пул воркеров)."""
     async with AsyncSessionLocal() as db:
-        try:
-            result = await db.execute(select(Task).where(Task.completed == False))
-            tasks = result.scalars().all()
-            updated_count = 0
-            for task in tasks:
-                new_urgency = calculate_urgency(task.deadline_at)
-                new_quadrant = determine_quadrant(task.is_important, new_urgency)
-                if task.is_urgent != new_urgency or task.quadrant != new_quadrant:
-                    task.is_urgent = new_urgency
-                    task.quadrant = new_quadrant
-                    updated_count += 1
-            if updated_count > 0:
-                await db.commit()
-                print(f"Обновлено задач: {updated_count} из {len(tasks)}")
-            else:
-                print(f"Изменений не требуется. Проверено задач: {len(tasks)}")
-        except Exception as e:
-            print(f"Ошибка при обновлении срочности: {e}")
-            await db.rollback()
+        await jobs.enqueue(db, "recompute_urgency", unique=True)
+
+
+async def enqueue_idempotency_purge():
+    """Ставит удаление просроченных ключей идемпотентности в очередь фоновых заданий."""
+    async with AsyncSessionLocal() as db:
+        await jobs.enqueue(db, "purge_idempotency_keys", unique=True)
+
+
+async def enqueue_recurrence_materialization():
+    """Ставит создание вхождений повторяющихся задач в очередь фоновых заданий."""
+    async with AsyncSessionLocal() as db:
+        await jobs.enqueue(db, "materialize_recurrences", unique=True)
+
+
+async def enqueue_digest_build():
+    """Ставит сборку ежедневных дайджестов в очередь фоновых заданий."""
+    async with AsyncSessionLocal() as db:
+        await jobs.enqueue(db, "build_digests", unique=True)
+
+
+async def enqueue_digest_delivery():
+    """Повторная отправка дайджестов, не отправленных с первого раза."""
+    async with AsyncSessionLocal() as db:
+        await jobs.enqueue(db, "deliver_digests", unique=True)
+
+
+async def enqueue_task_archival():
+    """Ставит перенос давно завершенных задач в архив в очередь фоновых заданий."""
+    async with AsyncSessionLocal() as db:
+        await jobs.enqueue(db, "archive_tasks", unique=True)
+
+
+async def enqueue_trash_purge():
+    """Ставит окончательное удаление задач из корзины в очередь фоновых заданий."""
+    async with AsyncSessionLocal() as db:
+        await jobs.enqueue(db, "purge_trash", unique=True)
 
 
 def start_scheduler():
     """Запускает планировщик задач и возвращает объект-планировщик."""
-    scheduler = AsyncIOScheduler()
+    # Время cron-заданий (DIGEST_HOUR, архив в 03:00, корзина в 03:30) — UTC, независимо от часового пояса сервера
+    scheduler = AsyncIOScheduler(timezone=timezone.utc)
     # Ежедневно в 09:00 UTC (можно настроить в локальном времени при необходимости)
     scheduler.add_job(
-        update_task_urgency,
+        enqueue_urgency_update,
         trigger='cron',
         hour=9,
         minute=0,
@@ -46,7 +133,7 @@ def start_scheduler():
 
     # Для тестирования (каждые 5 минут) можно раскомментировать
     scheduler.add_job(
-        update_task_urgency,
+        enqueue_urgency_update,
         trigger='interval',
         minutes=5,
         id='update_urgency_test',
@@ -54,6 +141,163 @@ def start_scheduler():
         replace_existing=True
     )
 
+    # Вхождения повторяющихся задач создаются по мере входа в окно срочности
+    scheduler.add_job(
+        enqueue_recurrence_materialization,
+        trigger='interval',
+        minutes=15,
+        id='materialize_recurrences',
+        name='Создание вхождений повторяющихся задач',
+        replace_existing=True
+    )
+
+    # Ежедневный дайджест дедлайнов: сборка одним проходом, отправка — отдельным заданием
+    scheduler.add_job(
+        enqueue_digest_build,
+        trigger='cron',
+        hour=DIGEST_HOUR,
+        minute=0,
+        id='build_digests',
+        name='Сборка ежедневных дайджестов',
+        replace_existing=True
+    )
+    scheduler.add_job(
+        enqueue_digest_delivery,
+        trigger='interval',
+        minutes=30,
+        id='deliver_digests',
+        name='Отправка дайджестов',
+        replace_existing=True
+    )
+
+    # Ежедневно переносим давно завершенные задачи в архив (ночью, вне пиковой нагрузки)
+    scheduler.add_job(
+        enqueue_task_archival,
+        trigger='cron',
+        hour=3,
+        minute=0,
+        id='archive_tasks',
+        name='Перенос завершенных задач в архив',
+        replace_existing=True
+    )
+
+    # Ежедневно очищаем корзину от задач старше TRASH_RETENTION_DAYS (после переноса в архив)
+    scheduler.add_job(
+        enqueue_trash_purge,
+        trigger='cron',
+        hour=3,
+        minute=30,
+        id='purge_trash',
+        name='Очистка корзины задач',
+        replace_existing=True
+    )
+
+    # Ежечасно удаляем просроченные ключи идемпотентности
+    scheduler.add_job(
+        enqueue_idempotency_purge,
+        trigger='interval',
+        hours=1,
+        id='purge_idempotency_keys',
+        name='Удаление просроченных ключей идемпотентности',
+        replace_existing=True
+    )
+
     scheduler.start()
-    print("Планировщик задач запущен")
+    log.info("Планировщик задач запущен")
     return scheduler
+
+
+class _PostgresLock:
+    """Сессионный advisory lock; держит соединение из пула, пока процесс — ведущий."""
+
+    def __init__(self):
+        self.conn = None
+
+    async def acquire(self) -> bool:
+        conn = await engine.connect()
+        try:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            locked = (await conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": SCHEDULER_LOCK_KEY})).scalar()
+        except Exception:
+            await conn.close()
+            raise
+        if not locked:
+            await conn.close()
+            return False
+        self.conn = conn
+        return True
+
+    async def check(self) -> None:
+        # Соединение оборвалось — блокировку мог захватить другой процесс
+        await self.conn.execute(text("SELECT 1"))
+
+    async def release(self) -> None:
+        conn, self.conn = self.conn, None
+        if conn is None:
+            return
+        try:
+            await conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": SCHEDULER_LOCK_KEY})
+        finally:
+            await conn.close()
+
+
+class _FileLock:
+    """flock файла: снимается и при падении процесса (воркеры на одной машине)."""
+
+    def __init__(self):
+        self.file = None
+
+    async def acquire(self) -> bool:
+        if fcntl is None:
+            return True
+        file = open(SCHEDULER_LOCK_FILE, "a")
+        try:
+            fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            file.close()
+            return False
+        self.file = file
+        return True
+
+    async def check(self) -> None:
+        pass
+
+    async def release(self) -> None:
+        file, self.file = self.file, None
+        if file is not None:
+            file.close()
+
+
+async def lead_scheduler() -> None:
+    """
+    Запускает планировщик, если этот процесс стал ведущим, и держит блокировку до
+    отмены задачи (остановка приложения). Так cron-задания срабатывают один раз,
+    а не в каждом воркере uvicorn.
+    """
+    if not SCHEDULER_ENABLED:
+        log.info("Планировщик отключен (SCHEDULER_ENABLED=false)")
+        return
+    lock = _PostgresLock() if engine.dialect.name == "postgresql" else _FileLock()
+    scheduler = None
+    try:
+        while True:
+            try:
+                if scheduler is None:
+                    if await lock.acquire():
+                        scheduler = start_scheduler()
+                else:
+                    await lock.check()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.exception("Ошибка блокировки планировщика: %s", e)
+                if scheduler is not None:
+                    scheduler.shutdown(wait=False)
+                    scheduler = None
+                    log.warning("Планировщик остановлен: блокировка потеряна")
+                await lock.release()
+            await asyncio.sleep(SCHEDULER_LEADER_RETRY_SECONDS)
+    finally:
+        if scheduler is not None:
+            scheduler.shutdown(wait=False)
+        await lock.release()
@@ -1,6 +1,7 @@
-from pydantic import BaseModel, Field, computed_field
-from typing import Optional
-from datetime import datetime
+from pydantic import BaseModel, Field, computed_field, model_validator
+from typing import Any, Dict, List, Literal, Optional
+from datetime import date, datetime
+from utils import calculate_days_until_deadline_batch
 
 # Базовая схема для Task
 class TaskBase(BaseModel):
@@ -75,19 +76,17 @@ class TaskResponse(TaskBase):
         description="Дата и время создания задачи"
     )
     
-    @computed_field(return_type=Optional[int])
-    def days_to_deadline(self) -> Optional[int]:
-        """Расчет количества полных дней от текущего UTC-времени до дедлайна."""
-        if not self.deadline_at:
-            return None
-        # Если deadline_at — datetime без tzinfo, считаем его в UTC
-        try:
-            tz = self.deadline_at.tzinfo
-        except Exception:
-            tz = None
-        now = datetime.now(tz) if tz else datetime.utcnow()
-        delta = self.deadline_at.date() - now.date()
-        return delta.days
+    days_to_deadline: Optional[int] = Field(
+        None,
+        description="Календарных дней до дедлайна (отрицательное — просрочен)"
+    )
+
+    @model_validator(mode="after")
+    def fill_days_to_deadline(self) -> "TaskResponse":
+        """Дни до дедлайна, если они не переданы (для списков считаются пачкой, см. routers.tasks.tasks_to_responses)."""
+        if self.days_to_deadline is None and self.deadline_at is not None:
+            self.days_to_deadline = calculate_days_until_deadline_batch([self.deadline_at], calendar=True)[0]
+        return self
 
     @computed_field(return_type=Optional[str])
     def status_message(self) -> Optional[str]:
@@ -101,6 +100,17 @@ class TaskResponse(TaskBase):
         from_attributes = True
 
 
+class TrashedTaskResponse(TaskResponse):
+    deleted_at: datetime = Field(
+        ...,
+        description="Когда задача перемещена в корзину"
+    )
+    purge_at: datetime = Field(
+        ...,
+        description="Когда задача будет удалена окончательно"
+    )
+
+
 class TimingStatsResponse(BaseModel):
     completed_on_time: int = Field(
         ...,
@@ -121,3 +131,229 @@ class TimingStatsResponse(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+class AnalyticsBucket(BaseModel):
+    bucket_start: date = Field(
+        ...,
+        description="Начало периода (день; понедельник для недель; 1-е число для месяцев)"
+    )
+    created: int = Field(0, description="Создано задач")
+    completed: int = Field(0, description="Завершено задач")
+    completed_on_time: int = Field(0, description="Завершено не позже дедлайна")
+    completed_late: int = Field(0, description="Завершено после дедлайна")
+
+
+class AnalyticsResponse(BaseModel):
+    granularity: Literal["day", "week", "month"]
+    scope: Literal["user", "global"]
+    start: date
+    end: date
+    totals: AnalyticsBucket = Field(
+        ...,
+        description="Суммы за весь период (bucket_start — начало периода)"
+    )
+    buckets: List[AnalyticsBucket]
+
+
+class TaskImportError(BaseModel):
+    row: int = Field(
+        ...,
+        description="Номер строки в исходном файле"
+    )
+    error: str = Field(
+        ...,
+        description="Описание ошибки валидации"
+    )
+
+
+class TaskImportReport(BaseModel):
+    format: str = Field(
+        ...,
+        description="Формат файла (csv или ndjson)"
+    )
+    method: Optional[str] = Field(
+        None,
+        description="Способ записи: copy (PostgreSQL COPY) или insert"
+    )
+    total_rows: int = Field(
+        ...,
+        description="Количество обработанных строк"
+    )
+    imported: int = Field(
+        ...,
+        description="Количество импортированных задач"
+    )
+    failed: int = Field(
+        ...,
+        description="Количество строк с ошибками"
+    )
+    errors: List[TaskImportError] = Field(
+        default_factory=list,
+        description="Ошибки по строкам (ограниченный список)"
+    )
+    duration_seconds: float = Field(
+        ...,
+        description="Длительность импорта в секундах"
+    )
+    rows_per_second: float = Field(
+        ...,
+        description="Скорость импорта, импортированных задач в секунду"
+    )
+
+
+class JobCreate(BaseModel):
+    kind: str = Field(
+        ...,
+        description="Тип задания (например, export_tasks, recompute_urgency)",
+        examples=["export_tasks"]
+    )
+    payload: Dict[str, Any] = Field(
+        default_factory=dict,
+        description="Параметры задания"
+    )
+
+
+class JobResponse(BaseModel):
+    id: int = Field(
+        ...,
+        description="Идентификатор задания"
+    )
+    kind: str = Field(
+        ...,
+        description="Тип задания"
+    )
+    status: str = Field(
+        ...,
+        description="Статус: queued, running, succeeded, failed"
+    )
+    attempts: int = Field(
+        ...,
+        description="Количество выполненных попыток"
+    )
+    max_attempts: int = Field(
+        ...,
+        description="Максимальное количество попыток"
+    )
+    last_error: Optional[str] = Field(
+        None,
+        description="Текст последней ошибки"
+    )
+    result: Optional[Any] = Field(
+        None,
+        description="Результат выполнения"
+    )
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
+class RecurrenceCreate(BaseModel):
+    title: str = Field(
+        ...,
+        min_length=3,
+        max_length=100,
+        description="Название задачи для каждого вхождения"
+    )
+    description: Optional[str] = Field(
+        None,
+        max_length=500,
+        description="Описание задачи"
+    )
+    is_important: bool = Field(
+        ...,
+        description="Важность задачи"
+    )
+    frequency: Literal["daily", "weekly", "monthly", "rrule"] = Field(
+        ...,
+        description="Частота повторения; rrule — произвольное правило RFC 5545",
+        examples=["weekly"]
+    )
+    interval: int = Field(
+        1,
+        ge=1,
+        le=366,
+        description="Повторять каждые N периодов (для daily/weekly/monthly)"
+    )
+    rrule: Optional[str] = Field(
+        None,
+        max_length=500,
+        description="Правило RRULE для frequency=rrule (требует python-dateutil)",
+        examples=["FREQ=WEEKLY;BYDAY=MO,WE,FR"]
+    )
+    dtstart: datetime = Field(
+        ...,
+        description="Дедлайн первого вхождения"
+    )
+    until: Optional[datetime] = Field(
+        None,
+        description="Повторять до этой даты (включительно)"
+    )
+
+
+class RecurrenceResponse(BaseModel):
+    id: int
+    title: str
+    description: Optional[str] = None
+    is_important: bool
+    frequency: str
+    interval: int
+    rrule: Optional[str] = None
+    dtstart: datetime
+    until: Optional[datetime] = None
+    next_occurrence_at: Optional[datetime] = Field(
+        None,
+        description="Дедлайн следующего еще не созданного вхождения"
+    )
+    current_task_id: Optional[int] = Field(
+        None,
+        description="Задача текущего вхождения"
+    )
+    active: bool
+
+    class Config:
+        from_attributes = True
+
+
+class OccurrenceResponse(BaseModel):
+    recurrence_id: int
+    title: str
+    is_important: bool
+    deadline_at: datetime = Field(
+        ...,
+        description="Дедлайн вхождения"
+    )
+    task_id: Optional[int] = Field(
+        None,
+        description="Задача вхождения, если оно уже создано"
+    )
+    completed: bool = False
+
+
+class DashboardResponse(BaseModel):
+    tasks: List[TaskResponse] = Field(
+        default_factory=list,
+        description="Страница задач пользователя (новые первыми)"
+    )
+    total_tasks: int = Field(
+        ...,
+        description="Всего задач пользователя"
+    )
+    limit: int
+    offset: int
+    by_quadrant: Dict[str, int] = Field(
+        ...,
+        description="Количество задач по квадрантам"
+    )
+    by_status: Dict[str, int] = Field(
+        ...,
+        description="Количество завершенных и незавершенных задач"
+    )
+    timing: TimingStatsResponse
+    upcoming_deadlines: List[TaskResponse] = Field(
+        default_factory=list,
+        description="Незавершенные задачи с ближайшими дедлайнами"
+    )
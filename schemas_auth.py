@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, EmailStr
-from typing import Optional
+from typing import List, Optional
 from models.user import UserRole
 # Схема регистрации нового пользователя
 class UserCreate(BaseModel):
@@ -42,4 +42,13 @@ class TokenData(BaseModel):
 
 class ChangePassword(BaseModel):
     old_password: str = Field(..., min_length=1, description="Текущий пароль")
-    new_password: str = Field(..., min_length=6, description="Новый пароль")
\ No newline at end of file
+    new_password: str = Field(..., min_length=6, description="Новый пароль")
+
+class BulkUserConflict(BaseModel):
+    nickname: str
+    email: str
+
+
+class BulkUsersResponse(BaseModel):
+    created: List[UserResponse] = Field(default_factory=list, description="Созданные пользователи")
+    conflicts: List[BulkUserConflict] = Field(default_factory=list, description="Пропущенные: email или никнейм заняты")
@@ -0,0 +1,103 @@
+"""
+Запуск API в production.
+
+    python serve.py
+
+- Число воркеров: WEB_CONCURRENCY или по числу доступных процессорных ядер; для SQLite
+  по умолчанию один (один писатель на файл БД).
+- uvloop и httptools используются, если установлены (pip install uvloop httptools),
+  иначе стандартные asyncio и h11.
+- Пул соединений: на каждый воркер выделяется равная доля DB_MAX_CONNECTIONS за
+  вычетом DB_RESERVED_CONNECTIONS (миграции, psql, worker.py). Доля делится на
+  DB_POOL_SIZE и DB_MAX_OVERFLOW и передается воркерам через окружение, поэтому
+  воркеры × пул не превышают лимит соединений БД. Явно заданные DB_POOL_SIZE/
+  DB_MAX_OVERFLOW не переопределяются. Если воркеров больше, чем соединений,
+  число воркеров уменьшается.
+- Остановка: по SIGTERM сервер перестает принимать соединения и до
+  SERVER_GRACEFUL_TIMEOUT секунд дожидается текущих запросов, затем выполняется
+  lifespan (остановка пула заданий).
+"""
+import importlib.util
+import os
+from typing import Dict
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8000"))
+# Лимит соединений сервера БД (max_connections в PostgreSQL, лимит пула Supabase/pgbouncer)
+DB_MAX_CONNECTIONS = int(os.getenv("DB_MAX_CONNECTIONS", "60"))
+DB_RESERVED_CONNECTIONS = int(os.getenv("DB_RESERVED_CONNECTIONS", "10"))
+SERVER_GRACEFUL_TIMEOUT = int(os.getenv("SERVER_GRACEFUL_TIMEOUT", "30"))
+SERVER_KEEPALIVE_TIMEOUT = int(os.getenv("SERVER_KEEPALIVE_TIMEOUT", "5"))
+# Access log uvicorn дублирует структурированные логи приложения и стоит заметной доли пропускной способности
+SERVER_ACCESS_LOG = os.getenv("SERVER_ACCESS_LOG", "false").lower() in ("1", "true", "yes")
+
+
+def available_cores() -> int:
+    # Учитываем ограничение по CPU affinity (контейнеры, taskset)
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def is_installed(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def plan_workers_and_pool(cores: int) -> Dict[str, int]:
+    """Число воркеров и размер пула на воркер в пределах лимита соединений БД."""
+    if os.getenv("DATABASE_URL", "sqlite").startswith("sqlite"):
+        cores = 1
+    workers = int(os.getenv("WEB_CONCURRENCY", str(cores)))
+    budget = max(1, DB_MAX_CONNECTIONS - DB_RESERVED_CONNECTIONS)
+    workers = max(1, min(workers, budget))
+    per_worker = budget // workers
+    # Две трети — постоянный пул, остальное — временные соединения при пиках
+    pool_size = int(os.getenv("DB_POOL_SIZE", str(max(1, per_worker * 2 // 3))))
+    max_overflow = int(os.getenv("DB_MAX_OVERFLOW", str(max(0, per_worker - pool_size))))
+    return {
+        "workers": workers,
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "connections": workers * (pool_size + max_overflow),
+    }
+
+
+def main() -> None:
+    import uvicorn
+
+    plan = plan_workers_and_pool(available_cores())
+    # Воркеры uvicorn — отдельные процессы: настройки пула передаются через окружение
+    os.environ["DB_POOL_SIZE"] = str(plan["pool_size"])
+    os.environ["DB_MAX_OVERFLOW"] = str(plan["max_overflow"])
+
+    loop = "uvloop" if is_installed("uvloop") else "asyncio"
+    http = "httptools" if is_installed("httptools") else "h11"
+    print(
+        f"Запуск: {plan['workers']} воркеров, loop={loop}, http={http}, "
+        f"пул {plan['pool_size']}+{plan['max_overflow']} на воркер "
+        f"(до {plan['connections']} из {DB_MAX_CONNECTIONS} соединений БД)"
+    )
+    if plan["connections"] > DB_MAX_CONNECTIONS - DB_RESERVED_CONNECTIONS:
+        print("Внимание: заданные DB_POOL_SIZE/DB_MAX_OVERFLOW превышают лимит соединений БД")
+
+    uvicorn.run(
+        "main:app",
+        host=HOST,
+        port=PORT,
+        workers=plan["workers"],
+        loop=loop,
+        http=http,
+        timeout_graceful_shutdown=SERVER_GRACEFUL_TIMEOUT,
+        timeout_keep_alive=SERVER_KEEPALIVE_TIMEOUT,
+        access_log=SERVER_ACCESS_LOG,
+        proxy_headers=True,
+    )
+
+
+if __name__ == "__main__":
+    main()
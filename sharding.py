@@ -0,0 +1,172 @@
+"""
+Горизонтальное шардирование задач по user_id.
+
+Шард 0 — основная база (DATABASE_URL): в ней живут пользователи, задания и все
+глобальные таблицы. Дополнительные базы перечисляются в SHARD_DATABASE_URLS через
+запятую. Задачи пользователя хранятся на шарде user_id % N; чтобы работал внешний
+ключ tasks.user_id, на шард копируется "скелет" строки пользователя (без пароля) —
+при регистрации, а если это не удалось, при первом запросе к задачам (ensure_user).
+Пользователей, существовавших до подключения шардов, и их задачи переносит миграция 0012.
+
+Эндпоинты администратора по всем пользователям выполняют запрос на всех шардах
+параллельно (scatter) и объединяют результат (gather).
+
+id задач уникальны во всех шардах (задачу администратора ищет find_task_shard):
+в PostgreSQL последовательность шарда k выдает k+1, k+1+SHARD_ID_STRIDE, ...,
+в SQLite шард k получает диапазон AUTOINCREMENT от k * SQLITE_SHARD_ID_SPAN.
+Распределение настраивает миграция 0011 (python -m migrations) один раз, а не при старте.
+
+Локально можно проверить на нескольких SQLite:
+    DATABASE_URL=sqlite+aiosqlite:///./shard0.db
+    SHARD_DATABASE_URLS=sqlite+aiosqlite:///./shard1.db,sqlite+aiosqlite:///./shard2.db
+"""
+import asyncio
+import os
+from typing import Any, Awaitable, Callable, List, Optional, TypeVar
+
+from dotenv import load_dotenv
+from sqlalchemy import inspect, select, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from database import AsyncSessionLocal, Base, engine, read_engine, dialect_insert, make_engine, make_read_engine, make_sessionmaker
+from models import Task, User
+from app_logging import get_logger
+
+load_dotenv()
+log = get_logger(__name__)
+
+SHARD_DATABASE_URLS = [u.strip() for u in os.getenv("SHARD_DATABASE_URLS", "").split(",") if u.strip()]
+
+# Шаг последовательности id задач в PostgreSQL — наибольшее число шардов
+SHARD_ID_STRIDE = 16
+# Размер диапазона id задач одного шарда в SQLite
+SQLITE_SHARD_ID_SPAN = 10 ** 12
+# Версия миграции, после которой базы готовы к шардированию
+SHARD_LAYOUT_VERSION = 12
+
+# Сколько id пользователей, уже скопированных на шарды, помнит процесс
+SHARD_USER_CACHE_SIZE = 100_000
+
+T = TypeVar("T")
+
+
+def shard_user_row(user: Any) -> dict:
+    """"Скелет" строки пользователя для шарда: id, nickname, email, role."""
+    return {
+        "id": user.id,
+        "nickname": user.nickname,
+        "email": user.email,
+        # Пароль на шардах не нужен и не хранится
+        "hashed_password": "!",
+        "role": user.role,
+    }
+
+
+class ShardRouter:
+    """Сопоставляет user_id шарду и выполняет запросы на всех шардах."""
+
+    def __init__(self, extra_urls: List[str]):
+        self.engines = [engine] + [make_engine(url) for url in extra_urls]
+        # Соединения только для чтения (SQLite); для PostgreSQL — None
+        self.read_engines = [read_engine] + [make_read_engine(url) for url in extra_urls]
+        self.sessionmakers = [AsyncSessionLocal] + [
+            make_sessionmaker(e, r) for e, r in zip(self.engines[1:], self.read_engines[1:])
+        ]
+        self._copied_users: set = set()
+
+    @property
+    def count(self) -> int:
+        return len(self.engines)
+
+    @property
+    def enabled(self) -> bool:
+        return self.count > 1
+
+    def shard_for_user(self, user_id: int) -> int:
+        return user_id % self.count
+
+    def sessionmaker_for_user(self, user_id: int) -> async_sessionmaker:
+        return self.sessionmakers[self.shard_for_user(user_id)]
+
+    async def scatter(self, fn: Callable[[AsyncSession], Awaitable[T]]) -> List[T]:
+        """Выполняет fn(session) на каждом шарде параллельно (отдельная сессия на шард)."""
+        async def run(maker: async_sessionmaker) -> T:
+            async with maker() as session:
+                return await fn(session)
+        return list(await asyncio.gather(*(run(maker) for maker in self.sessionmakers)))
+
+    async def init_shards(self) -> None:
+        """Создает таблицы на дополнительных шардах и проверяет, что распределение id применено."""
+        for index, shard_engine in enumerate(self.engines):
+            if index > 0:
+                async with shard_engine.begin() as conn:
+                    await conn.run_sync(Base.metadata.create_all)
+        if not self.enabled:
+            return
+        if self.count > SHARD_ID_STRIDE:
+            raise RuntimeError(f"Шардов больше {SHARD_ID_STRIDE}: id задач не будут уникальны")
+        for index, shard_engine in enumerate(self.engines):
+            if await self._schema_version(shard_engine) < SHARD_LAYOUT_VERSION:
+                # Без миграции шарды выдавали бы одинаковые id задач
+                raise RuntimeError(f"Шард {index} не подготовлен к шардированию: выполните python -m migrations")
+        log.info("Шардирование включено: %s шардов", self.count, extra={"fields": {"shards": self.count}})
+
+    @staticmethod
+    async def _schema_version(shard_engine) -> int:
+        async with shard_engine.connect() as conn:
+            if not await conn.run_sync(lambda sync_conn: inspect(sync_conn).has_table("schema_migrations")):
+                return 0
+            return (await conn.execute(text("SELECT MAX(version) FROM schema_migrations"))).scalar() or 0
+
+    async def _copy_users(self, shard: int, users: List[Any]) -> None:
+        async with self.sessionmakers[shard]() as session:
+            rows = [shard_user_row(user) for user in users]
+            await session.execute(dialect_insert(session, User).values(rows).on_conflict_do_nothing())
+            await session.commit()
+        if len(self._copied_users) >= SHARD_USER_CACHE_SIZE:
+            self._copied_users.clear()
+        self._copied_users.update(user.id for user in users)
+
+    async def ensure_users(self, users: List[Any]) -> None:
+        """
+        Копирует строки новых пользователей на их шарды. Ошибка только логируется:
+        регистрация уже зафиксирована, а копию создаст ensure_user при первом запросе.
+        """
+        if not self.enabled:
+            return
+        by_shard: dict = {}
+        for user in users:
+            shard = self.shard_for_user(user.id)
+            if shard != 0:
+                by_shard.setdefault(shard, []).append(user)
+        for shard, shard_users in by_shard.items():
+            try:
+                await self._copy_users(shard, shard_users)
+            except Exception as e:
+                log.warning(
+                    "Не удалось скопировать пользователей на шард %s: %s", shard, e,
+                    extra={"fields": {"shard": shard, "user_ids": [user.id for user in shard_users]}},
+                )
+
+    async def ensure_user(self, user: Any) -> None:
+        """Копия пользователя на его шарде; проверяется один раз на процесс (перед работой с задачами)."""
+        shard = self.shard_for_user(user.id)
+        if shard == 0 or user.id in self._copied_users:
+            return
+        await self._copy_users(shard, [user])
+
+    async def find_task_shard(self, task_id: int) -> Optional[int]:
+        """Шард задачи для администратора (задачи других пользователей)."""
+        async def lookup(session: AsyncSession) -> bool:
+            # Задачи в корзине тоже ищем: их нужно найти для восстановления
+            result = await session.execute(
+                select(Task.id).where(Task.id == task_id).execution_options(include_deleted=True)
+            )
+            return result.first() is not None
+        found = [index for index, hit in enumerate(await self.scatter(lookup)) if hit]
+        if len(found) > 1:
+            log.warning("Задача %s найдена на нескольких шардах", task_id, extra={"fields": {"shards": found}})
+        return found[0] if len(found) == 1 else None
+
+
+shard_router = ShardRouter(SHARD_DATABASE_URLS)
@@ -0,0 +1,155 @@
+"""
+Построение выборки задач для GET /tasks/: фильтры, сортировка и проекция полей.
+
+Фильтры комбинируются через AND. Сортировка — список ключей через запятую,
+"-" перед ключом — по убыванию; NULL всегда в конце, последний ключ — id.
+С fields= из БД читаются только колонки, нужные для запрошенных полей и
+сортировки, а ответ собирается без модели TaskResponse.
+
+Комбинации фильтров покрываются частичными составными индексами tasks (без задач
+в корзине, см. models/task.py):
+(user_id, completed, quadrant, deadline_at, id), (user_id, deadline_at, id),
+(user_id, created_at, id).
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from pydantic_core import to_jsonable_python
+from sqlalchemy import select
+
+from models import Task
+from utils import calculate_days_until_deadline_batch
+
+# Поля ответа (как в TaskResponse) и колонки, из которых они получаются
+FIELD_COLUMNS: Dict[str, Tuple[str, ...]] = {
+    "id": ("id",),
+    "title": ("title",),
+    "description": ("description",),
+    "is_important": ("is_important",),
+    "deadline_at": ("deadline_at",),
+    "quadrant": ("quadrant",),
+    "completed": ("completed",),
+    "created_at": ("created_at",),
+    "days_to_deadline": ("deadline_at",),
+    "status_message": ("deadline_at",),
+}
+SORT_KEYS = ("id", "created_at", "deadline_at", "quadrant", "title", "completed_at")
+DEFAULT_SORT = "id"
+
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Список полей из "a,b,c". None — полный ответ. Бросает ValueError для неизвестных полей."""
+    if not fields:
+        return None
+    names = list(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    unknown = [name for name in names if name not in FIELD_COLUMNS]
+    if unknown:
+        raise ValueError(f"Неизвестные поля: {', '.join(unknown)}. Доступны: {', '.join(FIELD_COLUMNS)}")
+    return names or None
+
+
+def parse_sort(sort: Optional[str]) -> List[Tuple[str, bool]]:
+    """Ключи сортировки [(колонка, по убыванию)], id — последним. Бросает ValueError."""
+    keys: List[Tuple[str, bool]] = []
+    for item in (sort or DEFAULT_SORT).split(","):
+        item = item.strip()
+        if not item:
+            continue
+        descending = item.startswith("-")
+        name = item.lstrip("-+")
+        if name not in SORT_KEYS:
+            raise ValueError(f"Неизвестный ключ сортировки: {name}. Доступны: {', '.join(SORT_KEYS)}")
+        if name not in (key for key, _ in keys):
+            keys.append((name, descending))
+    if "id" not in (key for key, _ in keys):
+        keys.append(("id", False))
+    return keys
+
+
+def build_statement(
+    user_id: Optional[int],
+    fields: Optional[List[str]],
+    sort_keys: List[Tuple[str, bool]],
+    quadrants: Optional[Sequence[str]] = None,
+    status: Optional[str] = None,
+    is_important: Optional[bool] = None,
+    deadline_from: Optional[datetime] = None,
+    deadline_to: Optional[datetime] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    limit: Optional[int] = None,
+):
+    """SELECT задач с фильтрами и сортировкой. user_id=None — все пользователи (админ)."""
+    if fields is None:
+        stmt = select(Task)
+    else:
+        names = {column for name in fields for column in FIELD_COLUMNS[name]}
+        # Колонки сортировки нужны для слияния результатов шардов
+        names.update(key for key, _ in sort_keys)
+        stmt = select(*(getattr(Task, name) for name in sorted(names)))
+
+    conditions = []
+    if user_id is not None:
+        conditions.append(Task.user_id == user_id)
+    if status is not None:
+        conditions.append(Task.completed == (status == "completed"))
+    if quadrants:
+        conditions.append(Task.quadrant.in_(quadrants))
+    if is_important is not None:
+        conditions.append(Task.is_important == is_important)
+    if deadline_from is not None:
+        conditions.append(Task.deadline_at >= deadline_from)
+    if deadline_to is not None:
+        conditions.append(Task.deadline_at <= deadline_to)
+    if created_from is not None:
+        conditions.append(Task.created_at >= created_from)
+    if created_to is not None:
+        conditions.append(Task.created_at <= created_to)
+    if conditions:
+        stmt = stmt.where(*conditions)
+
+    stmt = stmt.order_by(*(
+        (getattr(Task, key).desc() if descending else getattr(Task, key).asc()).nulls_last()
+        for key, descending in sort_keys
+    ))
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return stmt
+
+
+def _sort_value(value: Any) -> Any:
+    # Datetime с разных шардов сравниваются по моменту времени
+    return value.timestamp() if isinstance(value, datetime) else value
+
+
+def sort_rows(rows: List[Any], sort_keys: List[Tuple[str, bool]]) -> List[Any]:
+    """Сортирует объединенные результаты шардов так же, как ORDER BY в build_statement."""
+    for key, descending in reversed(sort_keys):
+        rows.sort(
+            key=lambda row: (getattr(row, key) is None, _sort_value(getattr(row, key)) if getattr(row, key) is not None else 0),
+            reverse=descending,
+        )
+        if descending:
+            # При обратной сортировке NULL оказались в начале — возвращаем их в конец (сортировка устойчива)
+            rows.sort(key=lambda row: getattr(row, key) is None)
+    return rows
+
+
+def project_rows(rows: Sequence[Any], fields: List[str]) -> List[Dict[str, Any]]:
+    """Строки выборки в словари только с запрошенными полями (значения — как в model_dump(mode="json"))."""
+    days: Optional[List[Optional[int]]] = None
+    if "days_to_deadline" in fields or "status_message" in fields:
+        days = calculate_days_until_deadline_batch([row.deadline_at for row in rows], calendar=True)
+
+    items = []
+    for i, row in enumerate(rows):
+        item = {}
+        for name in fields:
+            if name == "days_to_deadline":
+                item[name] = days[i]
+            elif name == "status_message":
+                item[name] = None if days[i] is None else ("overdue" if days[i] < 0 else "on time")
+            else:
+                item[name] = to_jsonable_python(getattr(row, name))
+        items.append(item)
+    return items
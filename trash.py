@@ -0,0 +1,118 @@
+"""
+Корзина задач: мягкое удаление, восстановление и очистка.
+
+DELETE /tasks/{id} не удаляет строку, а одним UPDATE заполняет deleted_at. Такие
+задачи не видны ни одному SELECT (см. _skip_deleted в models/task.py) и не
+попадают в частичные индексы выборок. В течение TRASH_RETENTION_DAYS дней задачу
+можно восстановить; после этого фоновое задание purge_trash удаляет ее
+окончательно пачками по TRASH_PURGE_BATCH строк на каждом шарде, каждая пачка —
+отдельная короткая транзакция, между пачками пауза TRASH_PURGE_PAUSE_SECONDS.
+"""
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import Task
+from sharding import shard_router
+from app_logging import get_logger
+
+load_dotenv()
+log = get_logger(__name__)
+
+TRASH_RETENTION_DAYS = int(os.getenv("TRASH_RETENTION_DAYS", "30"))
+TRASH_PURGE_BATCH = int(os.getenv("TRASH_PURGE_BATCH", "1000"))
+TRASH_PURGE_PAUSE_SECONDS = float(os.getenv("TRASH_PURGE_PAUSE_SECONDS", "0.01"))
+
+
+def _owned(stmt, task_id: int, user_id: Optional[int]):
+    stmt = stmt.where(Task.id == task_id)
+    # user_id=None — администратор (любая задача)
+    return stmt if user_id is None else stmt.where(Task.user_id == user_id)
+
+
+async def soft_delete_task(db: AsyncSession, task_id: int, user_id: Optional[int]) -> bool:
+    """Перемещает задачу в корзину одним UPDATE. Изменения не фиксируются: COMMIT делает вызывающий."""
+    stmt = _owned(update(Task), task_id, user_id).where(Task.deleted_at.is_(None))
+    result = await db.execute(stmt.values(deleted_at=datetime.now(timezone.utc)).returning(Task.id))
+    return result.first() is not None
+
+
+async def restore_task(db: AsyncSession, task_id: int, user_id: Optional[int]) -> Optional[Task]:
+    """Возвращает задачу из корзины. None — задачи нет в корзине."""
+    stmt = _owned(update(Task), task_id, user_id).where(Task.deleted_at.is_not(None))
+    result = await db.execute(
+        stmt.values(deleted_at=None).returning(Task).execution_options(populate_existing=True)
+    )
+    return result.scalar_one_or_none()
+
+
+async def list_trash(db: AsyncSession, user_id: int, limit: int, offset: int) -> List[Task]:
+    """Задачи пользователя в корзине, последние удаленные — первыми (индекс ix_tasks_trash)."""
+    stmt = (
+        select(Task)
+        .where(Task.user_id == user_id, Task.deleted_at.is_not(None))
+        .order_by(Task.deleted_at.desc(), Task.id.desc())
+        .limit(limit)
+        .offset(offset)
+        .execution_options(include_deleted=True)
+    )
+    result = await db.execute(stmt)
+    return result.scalars().all()
+
+
+def purge_at(deleted_at: datetime) -> datetime:
+    """Когда задача будет удалена окончательно."""
+    return deleted_at + timedelta(days=TRASH_RETENTION_DAYS)
+
+
+async def _purge_batch(session: AsyncSession, cutoff: datetime) -> int:
+    """Удаляет одну пачку и фиксирует ее. Возвращает число удаленных задач."""
+    ids = (
+        select(Task.id)
+        .where(Task.deleted_at < cutoff)
+        .order_by(Task.deleted_at)
+        .limit(TRASH_PURGE_BATCH)
+    )
+    if session.bind.dialect.name == "postgresql":
+        # Строки, заблокированные восстановлением, пропускаем до следующего запуска
+        ids = ids.with_for_update(skip_locked=True)
+    result = await session.execute(delete(Task).where(Task.id.in_(ids.scalar_subquery())))
+    await session.commit()
+    return result.rowcount or 0
+
+
+async def purge_shard(session: AsyncSession, cutoff: datetime) -> int:
+    purged = 0
+    while True:
+        count = await _purge_batch(session, cutoff)
+        purged += count
+        if count < TRASH_PURGE_BATCH:
+            return purged
+        # Даем пройти конкурирующим транзакциям
+        await asyncio.sleep(TRASH_PURGE_PAUSE_SECONDS)
+
+
+async def purge_trash(older_than_days: Optional[int] = None) -> Dict[str, Any]:
+    """Окончательно удаляет задачи, лежащие в корзине дольше older_than_days дней (на всех шардах)."""
+    days = TRASH_RETENTION_DAYS if older_than_days is None else older_than_days
+    cutoff = datetime.now(timezone.utc) - timedelta(days=days)
+    started = time.perf_counter()
+    purged = 0
+    for session_maker in shard_router.sessionmakers:
+        async with session_maker() as session:
+            purged += await purge_shard(session, cutoff)
+
+    report = {
+        "purged": purged,
+        "cutoff": cutoff.isoformat(),
+        "duration_seconds": round(time.perf_counter() - started, 3),
+    }
+    if purged:
+        log.info("Окончательно удалено задач из корзины: %s", purged, extra={"fields": report})
+    return report
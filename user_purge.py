@@ -0,0 +1,74 @@
+"""
+Удаление пользователей без загрузки их задач в память.
+
+Задачи удаляются пачками по USER_PURGE_BATCH строк на шарде пользователя, каждая
+пачка — отдельная короткая транзакция, между пачками пауза USER_PURGE_PAUSE_SECONDS.
+Так удаление пользователя со 100k задач идет с постоянной памятью и не держит
+блокировки долго. Затем строка пользователя удаляется одним DELETE на шарде и в
+основной базе; остальные зависимые строки удаляет ON DELETE CASCADE.
+"""
+import asyncio
+import os
+from typing import Any, Dict, Iterable
+
+from dotenv import load_dotenv
+from sqlalchemy import delete, select
+
+from models import Task, TaskArchive, TaskRecurrence, TaskRollup, User
+from sharding import shard_router
+from app_logging import get_logger
+
+load_dotenv()
+log = get_logger(__name__)
+
+USER_PURGE_BATCH = int(os.getenv("USER_PURGE_BATCH", "5000"))
+USER_PURGE_PAUSE_SECONDS = float(os.getenv("USER_PURGE_PAUSE_SECONDS", "0.01"))
+
+
+async def _delete_in_batches(session, model, user_id: int) -> int:
+    deleted = 0
+    while True:
+        ids = select(model.id).where(model.user_id == user_id).limit(USER_PURGE_BATCH).scalar_subquery()
+        result = await session.execute(delete(model).where(model.id.in_(ids)))
+        await session.commit()
+        count = result.rowcount or 0
+        deleted += count
+        if count < USER_PURGE_BATCH:
+            return deleted
+        # Даем пройти конкурирующим транзакциям
+        await asyncio.sleep(USER_PURGE_PAUSE_SECONDS)
+
+
+async def purge_user(user_id: int) -> Dict[str, Any]:
+    """Удаляет задачи пользователя пачками, затем самого пользователя. Повторный запуск безопасен."""
+    shard = shard_router.shard_for_user(user_id)
+    async with shard_router.sessionmakers[shard]() as session:
+        tasks_deleted = await _delete_in_batches(session, Task, user_id)
+        tasks_deleted += await _delete_in_batches(session, TaskArchive, user_id)
+        await _delete_in_batches(session, TaskRecurrence, user_id)
+        # Счетчиков — не больше строки на день, удаляются одним запросом
+        await session.execute(delete(TaskRollup).where(TaskRollup.user_id == user_id))
+        await session.commit()
+        if shard != 0:
+            # Копия строки пользователя на шарде
+            await session.execute(delete(User).where(User.id == user_id))
+            await session.commit()
+
+    async with shard_router.sessionmakers[0]() as session:
+        result = await session.execute(delete(User).where(User.id == user_id))
+        await session.commit()
+
+    log.info(
+        "Пользователь %s удален, задач удалено: %s", user_id, tasks_deleted,
+        extra={"fields": {"user_id": user_id, "tasks_deleted": tasks_deleted, "shard": shard}},
+    )
+    return {"user_id": user_id, "tasks_deleted": tasks_deleted, "user_deleted": bool(result.rowcount)}
+
+
+async def purge_users(user_ids: Iterable[int]) -> Dict[str, Any]:
+    results = [await purge_user(user_id) for user_id in user_ids]
+    return {
+        "users_deleted": sum(1 for r in results if r["user_deleted"]),
+        "tasks_deleted": sum(r["tasks_deleted"] for r in results),
+        "users": results,
+    }
@@ -1,23 +1,37 @@
+import math
 from datetime import datetime, timezone
-from typing import Optional
+from typing import List, Optional, Sequence, Tuple
 
+try:
+    import numpy as np
+except ImportError:  # NumPy не установлен — пакетные функции работают на чистом Python
+    np = None
 
-def calculate_urgency(deadline_at: Optional[datetime]) -> bool:
+# Порог срочности: до дедлайна не больше стольких полных дней
+URGENCY_DAYS = 3
+SECONDS_PER_DAY = 86400
+# На маленьких пачках преобразование в массивы NumPy дороже самого расчета
+NUMPY_MIN_BATCH = 256
+
+
+def calculate_urgency(deadline_at: Optional[datetime], now: Optional[datetime] = None) -> bool:
     """Определяет срочность: True если до дедлайна <= 3 дня (UTC).
 
-    Если deadline_at is None — возвращает False.
+    Если deadline_at is None — возвращает False. Параметр now позволяет
+    передать одно опорное время для пачки задач.
     """
     if deadline_at is None:
         return False
 
-    now = datetime.now(timezone.utc)
+    if now is None:
+        now = datetime.now(timezone.utc)
     # Если deadline_at не содержит tzinfo, считаем его в UTC
     if deadline_at.tzinfo is None:
         deadline_at = deadline_at.replace(tzinfo=timezone.utc)
 
     time_difference = deadline_at - now
     days_until_deadline = time_difference.days
-    return days_until_deadline <= 3
+    return days_until_deadline <= URGENCY_DAYS
 
 
 def calculate_days_until_deadline(deadline_at: Optional[datetime]) -> Optional[int]:
@@ -46,3 +60,113 @@ def determine_quadrant(is_important: bool, is_urgent: bool) -> str:
         return "Q3"
     else:
         return "Q4"
+
+
+
+# ПАКЕТНЫЕ ВАРИАНТЫ: одно опорное время на всю пачку, NumPy при наличии.
+# Результаты совпадают с поэлементными функциями выше.
+
+_QUADRANTS = ("Q1", "Q2", "Q3", "Q4")
+
+
+def _timestamps(deadlines: Sequence[Optional[datetime]]) -> List[float]:
+    """Секунды UTC; NaN, если дедлайна нет. Дедлайн без tzinfo считаем в UTC."""
+    nan = math.nan
+    utc = timezone.utc
+    return [
+        nan if d is None else (d.timestamp() if d.tzinfo is not None else d.replace(tzinfo=utc).timestamp())
+        for d in deadlines
+    ]
+
+
+def _utc_offsets(deadlines: Sequence[Optional[datetime]]) -> List[float]:
+    return [
+        d.utcoffset().total_seconds() if d is not None and d.tzinfo is not None else 0.0
+        for d in deadlines
+    ]
+
+
+def _days_left(timestamps: List[float], now_ts: float, offsets: Optional[List[float]]):
+    """Дни до дедлайна (float, NaN без дедлайна): массив NumPy или список."""
+    if np is not None and len(timestamps) >= NUMPY_MIN_BATCH:
+        ts = np.asarray(timestamps, dtype=np.float64)
+        if offsets is None:
+            return np.floor((ts - now_ts) / SECONDS_PER_DAY)
+        off = np.asarray(offsets, dtype=np.float64)
+        return np.floor((ts + off) / SECONDS_PER_DAY) - np.floor((now_ts + off) / SECONDS_PER_DAY)
+    if offsets is None:
+        return [(ts - now_ts) // SECONDS_PER_DAY for ts in timestamps]
+    return [(ts + off) // SECONDS_PER_DAY - (now_ts + off) // SECONDS_PER_DAY for ts, off in zip(timestamps, offsets)]
+
+
+def _urgency(full_days) -> List[bool]:
+    # NaN (нет дедлайна) дает False в сравнении
+    if np is not None and isinstance(full_days, np.ndarray):
+        return (full_days <= URGENCY_DAYS).tolist()
+    return [days <= URGENCY_DAYS for days in full_days]
+
+
+def _days_list(days) -> List[Optional[int]]:
+    if np is not None and isinstance(days, np.ndarray):
+        missing = np.isnan(days)
+        values = np.where(missing, 0, days).astype(np.int64).tolist()
+        return [None if m else v for v, m in zip(values, missing.tolist())]
+    return [None if d != d else int(d) for d in days]
+
+
+def calculate_urgency_batch(
+    deadlines: Sequence[Optional[datetime]],
+    now: Optional[datetime] = None,
+) -> List[bool]:
+    """Срочность для пачки задач: как calculate_urgency, но с одним опорным временем."""
+    now = now or datetime.now(timezone.utc)
+    return _urgency(_days_left(_timestamps(deadlines), now.timestamp(), None))
+
+
+def calculate_days_until_deadline_batch(
+    deadlines: Sequence[Optional[datetime]],
+    now: Optional[datetime] = None,
+    calendar: bool = False,
+) -> List[Optional[int]]:
+    """Дни до дедлайна для пачки задач (None, если дедлайна нет).
+
+    calendar=False — полные дни, как calculate_days_until_deadline;
+    calendar=True — разница календарных дат в часовом поясе дедлайна,
+    как TaskResponse.days_to_deadline.
+    """
+    now = now or datetime.now(timezone.utc)
+    offsets = _utc_offsets(deadlines) if calendar else None
+    return _days_list(_days_left(_timestamps(deadlines), now.timestamp(), offsets))
+
+
+def determine_quadrant_batch(
+    is_important: Sequence[bool],
+    is_urgent: Sequence[bool],
+) -> List[str]:
+    """Квадранты для пачки задач: как determine_quadrant."""
+    if np is not None and len(is_important) >= NUMPY_MIN_BATCH:
+        important = np.asarray(is_important, dtype=bool)
+        urgent = np.asarray(is_urgent, dtype=bool)
+        # Q1=0, Q2=1, Q3=2, Q4=3
+        codes = (~important).astype(np.int8) * 2 + (~urgent).astype(np.int8)
+        return np.asarray(_QUADRANTS)[codes].tolist()
+
+    return [
+        _QUADRANTS[(not important) * 2 + (not urgent)]
+        for important, urgent in zip(is_important, is_urgent)
+    ]
+
+
+def calculate_deadline_fields_batch(
+    deadlines: Sequence[Optional[datetime]],
+    is_important: Sequence[bool],
+    now: Optional[datetime] = None,
+) -> Tuple[List[bool], List[Optional[int]], List[str]]:
+    """Срочность, полные дни до дедлайна и квадрант за один проход по пачке.
+
+    Дедлайны переводятся в секунды один раз; дальше расчет векторный.
+    """
+    now = now or datetime.now(timezone.utc)
+    full_days = _days_left(_timestamps(deadlines), now.timestamp(), None)
+    urgency = _urgency(full_days)
+    return urgency, _days_list(full_days), determine_quadrant_batch(is_important, urgency)
@@ -0,0 +1,24 @@
+"""
+Отдельный процесс для фоновых заданий (без веб-сервера).
+
+Запуск: python worker.py
+Веб-процессы при этом можно запускать с JOB_WORKERS=0.
+"""
+import asyncio
+import job_handlers  # noqa: F401  регистрация обработчиков
+from jobs import worker_pool
+
+
+async def main():
+    worker_pool.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await worker_pool.stop()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,153 @@
+"""
+Групповая фиксация (group commit) мелких записей.
+
+При GROUP_COMMIT_ENABLED=true однострочные изменения (update_task, complete_task)
+не коммитятся каждое отдельно: операции, пришедшие в течение GROUP_COMMIT_WINDOW_MS,
+выполняются в одной транзакции и фиксируются одним COMMIT. Каждая операция
+выполняется внутри SAVEPOINT, поэтому ошибка одной (например, 404) не откатывает
+остальные, и каждый вызывающий получает свой результат или исключение.
+"""
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from dotenv import load_dotenv
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app_logging import get_logger
+
+load_dotenv()
+log = get_logger(__name__)
+
+GROUP_COMMIT_ENABLED = os.getenv("GROUP_COMMIT_ENABLED", "false").lower() in ("1", "true", "yes")
+GROUP_COMMIT_WINDOW_MS = float(os.getenv("GROUP_COMMIT_WINDOW_MS", "2"))
+GROUP_COMMIT_MAX_BATCH = int(os.getenv("GROUP_COMMIT_MAX_BATCH", "64"))
+
+T = TypeVar("T")
+WriteOp = Callable[[AsyncSession], Awaitable[Any]]
+
+
+class WriteCoalescer:
+    """Собирает операции записи в пачки и фиксирует каждую пачку одной транзакцией."""
+
+    def __init__(
+        self,
+        session_maker: async_sessionmaker,
+        window_ms: float = GROUP_COMMIT_WINDOW_MS,
+        max_batch: int = GROUP_COMMIT_MAX_BATCH,
+    ):
+        self.session_maker = session_maker
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._pending: List[Tuple[WriteOp, asyncio.Future, float]] = []
+        self._runner: Optional[asyncio.Task] = None
+        self._started_at = time.monotonic()
+        self.ops = 0
+        self.batches = 0
+        self.commits = 0
+        self.failed_commits = 0
+        self.max_batch_seen = 0
+        self.total_wait_ms = 0.0
+        self.total_commit_ms = 0.0
+
+    async def submit(self, op: WriteOp) -> Any:
+        """Ставит операцию в текущую пачку и ждет фиксации. Возвращает результат op."""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((op, future, time.monotonic()))
+        if self._runner is None:
+            self._runner = asyncio.create_task(self._run())
+        return await future
+
+    async def _run(self) -> None:
+        try:
+            while self._pending:
+                # Пока пачка не заполнена, ждем окно, чтобы собрать параллельные записи
+                if len(self._pending) < self.max_batch:
+                    await asyncio.sleep(self.window)
+                batch = self._pending[:self.max_batch]
+                del self._pending[:self.max_batch]
+                await self._flush(batch)
+        finally:
+            self._runner = None
+
+    async def _flush(self, batch: List[Tuple[WriteOp, asyncio.Future, float]]) -> None:
+        started = time.monotonic()
+        self.batches += 1
+        self.ops += len(batch)
+        self.max_batch_seen = max(self.max_batch_seen, len(batch))
+        self.total_wait_ms += sum(started - enqueued for _, _, enqueued in batch) * 1000
+
+        outcomes = []
+        try:
+            async with self.session_maker() as session:
+                for op, future, _ in batch:
+                    try:
+                        async with session.begin_nested():
+                            outcomes.append((future, await op(session), None))
+                    except Exception as e:
+                        outcomes.append((future, None, e))
+                await session.commit()
+        except Exception as e:
+            # Ошибка COMMIT — ни одна операция пачки не зафиксирована
+            self.failed_commits += 1
+            log.exception("Ошибка групповой фиксации пачки из %s операций", len(batch))
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.commits += 1
+        self.total_commit_ms += (time.monotonic() - started) * 1000
+        for future, result, error in outcomes:
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        uptime = time.monotonic() - self._started_at
+        return {
+            "ops": self.ops,
+            "batches": self.batches,
+            "commits": self.commits,
+            "failed_commits": self.failed_commits,
+            "avg_batch_size": round(self.ops / self.batches, 2) if self.batches else 0.0,
+            "max_batch_size": self.max_batch_seen,
+            "avg_added_latency_ms": round(self.total_wait_ms / self.ops, 3) if self.ops else 0.0,
+            "avg_commit_ms": round(self.total_commit_ms / self.commits, 3) if self.commits else 0.0,
+            "commits_per_second": round(self.commits / uptime, 3) if uptime > 0 else 0.0,
+        }
+
+
+# Отдельный коалесцер на каждую базу (шард), ключ — engine сессии
+_coalescers: Dict[int, WriteCoalescer] = {}
+
+
+def get_coalescer(db: AsyncSession) -> WriteCoalescer:
+    bind = db.bind
+    coalescer = _coalescers.get(id(bind))
+    if coalescer is None:
+        coalescer = WriteCoalescer(async_sessionmaker(bind=bind, autoflush=False, expire_on_commit=False))
+        _coalescers[id(bind)] = coalescer
+    return coalescer
+
+
+async def run_write(db: AsyncSession, op: WriteOp) -> Any:
+    """Выполняет операцию записи: через групповую фиксацию или в сессии запроса с отдельным COMMIT."""
+    if GROUP_COMMIT_ENABLED:
+        return await get_coalescer(db).submit(op)
+    result = await op(db)
+    await db.commit()
+    return result
+
+
+def group_commit_stats() -> Dict[str, Any]:
+    return {
+        "enabled": GROUP_COMMIT_ENABLED,
+        "window_ms": GROUP_COMMIT_WINDOW_MS,
+        "max_batch": GROUP_COMMIT_MAX_BATCH,
+        "databases": [c.stats() for c in _coalescers.values()],
+    }